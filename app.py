@@ -1,9 +1,11 @@
 import os
+import re
+import json
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from sendgrid.helpers.mail import Mail, Personalization, To, Substitution
 from jinja2 import Template
 
 # Load environment variables (works locally; Render uses dashboard env vars)
@@ -16,8 +18,153 @@ SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 if not SENDGRID_API_KEY or not SENDER_EMAIL:
     logging.warning("SENDGRID_API_KEY or SENDER_EMAIL not set")
 
+# SendGrid accepts at most 1000 personalizations per /mail/send call
+MAX_PERSONALIZATIONS = 1000
+
+# Placeholder rendered into the shared batch body and substituted per recipient
+NAME_SUBSTITUTION_TAG = "-name-"
+
+# Addresses SendGrid accepts: a dot-atom local part and a dotted hostname. One
+# address it rejects fails the whole API call, so batch entries are checked first.
+EMAIL_PATTERN = re.compile(
+    r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@([A-Za-z0-9]([A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}"
+)
+
 app = Flask(__name__)
 
+
+def load_email_template():
+    """Load the HTML email template, or return None if it is missing."""
+    try:
+        with open("templates/email_template.html", "r", encoding="utf-8") as f:
+            return Template(f.read())
+    except FileNotFoundError:
+        return None
+
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+
+
+def is_ndjson_request():
+    return (request.content_type or "").split(";")[0].strip() in NDJSON_TYPES
+
+
+def read_batch_payload():
+    """
+    Read the recipients of a batch request.
+
+    Accepts either a JSON array (or {"recipients": [...]}) or an NDJSON
+    stream with one {email, name} object per line. NDJSON bodies are
+    consumed line by line as the entries are iterated, rather than
+    buffered as one document; unparseable lines come through as None.
+
+    Returns:
+        tuple: (iterable of raw recipient entries, error_message)
+    """
+    if is_ndjson_request():
+        def lines():
+            for line in request.stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+        return lines(), None
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("recipients")
+    if not isinstance(data, list):
+        return None, "Expected a JSON array of {email, name} objects or an NDJSON body"
+    return data, None
+
+
+def is_valid_email(address):
+    """Whether an address is well-formed enough for SendGrid to accept it."""
+    return (isinstance(address, str) and len(address) <= 254
+            and len(address.split("@")[0]) <= 64 and EMAIL_PATTERN.fullmatch(address) is not None)
+
+
+def build_personalization(entry):
+    """
+    Validate one batch entry and build its SendGrid personalization.
+
+    Returns:
+        Personalization: The recipient's personalization; raises ValueError if the entry is invalid
+    """
+    if not isinstance(entry, dict):
+        raise ValueError("Entry is not a JSON object")
+    recipient = entry.get("email")
+    name = entry.get("name")
+    if not recipient or not name:
+        raise ValueError("Missing email or name")
+    if not isinstance(recipient, str) or not is_valid_email(recipient.strip()):
+        raise ValueError("Invalid email")
+    if not isinstance(name, (str, int, float)):
+        raise ValueError("Invalid name")
+
+    personalization = Personalization()
+    personalization.add_to(To(recipient.strip()))
+    personalization.add_substitution(Substitution(NAME_SUBSTITUTION_TAG, str(name)))
+    return personalization
+
+
+def send_batch(entries, sg, html_content, stats):
+    """
+    Send batch entries in chunks of up to MAX_PERSONALIZATIONS per API call.
+
+    Yields the result of every entry in input order, a chunk at a time, as
+    soon as its API call finishes. One bad entry only rejects that entry.
+    """
+    chunk = []
+
+    def flush():
+        message = Mail(
+            from_email=SENDER_EMAIL,
+            subject="Personalized Email",
+            html_content=html_content
+        )
+        for _, personalization in chunk:
+            message.add_personalization(personalization)
+
+        stats["api_calls"] += 1
+        try:
+            response = sg.send(message)
+            for result, _ in chunk:
+                result["status"] = "accepted"
+                result["provider_status"] = response.status_code
+        except Exception:
+            logging.exception("SendGrid batch error")
+            for result, _ in chunk:
+                result["status"] = "failed"
+                result["error"] = "Failed to send email"
+
+    pending = []
+    for index, entry in enumerate(entries):
+        email = entry.get("email") if isinstance(entry, dict) else None
+        result = {"index": index, "email": email if isinstance(email, str) else None}
+        pending.append(result)
+        try:
+            personalization = build_personalization(entry)
+        except Exception as e:
+            result.update(status="rejected", error=str(e) if isinstance(e, ValueError) else "Invalid entry")
+            continue
+
+        result["status"] = "pending"
+        chunk.append((result, personalization))
+        if len(chunk) == MAX_PERSONALIZATIONS:
+            flush()
+            yield from pending
+            chunk, pending = [], []
+
+    if chunk:
+        flush()
+    yield from pending
+
+
 # Health check
 @app.route("/ping", methods=["GET"])
 def ping():
@@ -36,10 +183,8 @@ def send_email():
         return jsonify({"error": "Missing email or name"}), 400
 
     # Load HTML email template
-    try:
-        with open("templates/email_template.html", "r", encoding="utf-8") as f:
-            template = Template(f.read())
-    except FileNotFoundError:
+    template = load_email_template()
+    if template is None:
         return jsonify({"error": "Email template not found"}), 500
 
     html_content = template.render(name=name)
@@ -69,6 +214,66 @@ def send_email():
         return jsonify({"error": "Failed to send email"}), 500
 
 
+# Batch send endpoint
+@app.route("/send-email/batch", methods=["POST"])
+def send_email_batch():
+    """
+    Send the email template to many recipients with as few SendGrid calls
+    as possible.
+
+    The template is rendered once with a substitution tag in place of the
+    name, and each recipient becomes one personalization carrying its own
+    name substitution. Up to MAX_PERSONALIZATIONS recipients share a single
+    API call. The response lists a result for every input entry, in order.
+    """
+    entries, error = read_batch_payload()
+    if error:
+        return jsonify({"error": error}), 400
+
+    if not SENDGRID_API_KEY:
+        return jsonify({"error": "SendGrid API key not configured"}), 500
+
+    template = load_email_template()
+    if template is None:
+        return jsonify({"error": "Email template not found"}), 500
+
+    html_content = template.render(name=NAME_SUBSTITUTION_TAG)
+    sg = SendGridAPIClient(SENDGRID_API_KEY)
+    stats = {"api_calls": 0}
+
+    def summarize(results):
+        return {
+            "message": "Batch processed",
+            "total": len(results),
+            "accepted": sum(1 for r in results if r["status"] == "accepted"),
+            "rejected": sum(1 for r in results if r["status"] == "rejected"),
+            "failed": sum(1 for r in results if r["status"] == "failed"),
+            "api_calls": stats["api_calls"],
+        }
+
+    if is_ndjson_request():
+        # NDJSON in, NDJSON out: one result line per entry as each API call
+        # finishes, then a summary line
+        def stream():
+            counts = {"total": 0, "accepted": 0, "rejected": 0, "failed": 0}
+            for result in send_batch(entries, sg, html_content, stats):
+                counts["total"] += 1
+                counts[result["status"]] += 1
+                yield json.dumps(result) + "\n"
+            yield json.dumps({"summary": dict(counts, message="Batch processed", api_calls=stats["api_calls"])}) + "\n"
+
+        return Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+
+    results = list(send_batch(entries, sg, html_content, stats))
+    summary = dict(summarize(results), results=results)
+
+    if not stats["api_calls"]:
+        return jsonify(summary), 400
+    if not summary["accepted"]:
+        return jsonify(summary), 502
+    return jsonify(summary), 202
+
+
 # Local run only (Render ignores this)
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
@@ -1,3 +1,4 @@
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 import os
@@ -8,98 +9,216 @@ db = SQLAlchemy()
 # Global scheduler instance
 scheduler = None
 
-def create_app():
-    app = Flask(__name__)
-    
-    # Configuration
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-please-change-in-production')
-    
+def get_database_uri():
+    """
+    Database URI from DATABASE_URL, defaulting to a local SQLite file.
+    """
     # Handle Render PostgreSQL URI (which starts with postgres:// but SQLAlchemy needs postgresql://)
     database_url = os.environ.get('DATABASE_URL')
     if database_url and database_url.startswith('postgres://'):
         database_url = database_url.replace('postgres://', 'postgresql://', 1)
-        
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url or 'sqlite:///app.db'
+    return database_url or 'sqlite:///app.db'
+
+def load_database_config(app):
+    """
+    Database URI and engine settings shared by the main app and the
+    standalone tracking app (see app/database.py).
+    """
+    from .database import engine_options
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = get_database_uri()
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Connection pool (PostgreSQL): per-worker size and overflow, seconds to wait for a connection,
+    # seconds before a connection is replaced, and a liveness check on checkout
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    # SQLite: WAL journal, fsync level, seconds to wait on a locked database, in-process writer queue
+    app.config['SQLITE_WAL'] = os.environ.get('SQLITE_WAL', 'true').lower() == 'true'
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    app.config['SQLITE_BUSY_TIMEOUT'] = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 30))
+    app.config['SQLITE_WRITE_LOCK'] = os.environ.get('SQLITE_WRITE_LOCK', 'true').lower() == 'true'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config)
+
+def create_app(start_scheduler=True):
+    """
+    Build the dashboard app.
+
+    Args:
+        start_scheduler: Start the background jobs (APScheduler and the tracking
+            flush thread); off for one-off commands such as migrate, e.g.
+            `flask --app "app:create_app(start_scheduler=False)" migrate`
+    """
+    app = Flask(__name__)
+    
+    # Configuration
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-please-change-in-production')
+    
+    load_database_config(app)
+
+    # Mail transport: smtp (default), sendgrid, memory or sink (see app/transport.py)
+    app.config['MAIL_TRANSPORT'] = os.environ.get('MAIL_TRANSPORT', 'smtp')
+    app.config['SMTP_HOST'] = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+    app.config['SMTP_PORT'] = int(os.environ.get('SMTP_PORT', 587))
+    app.config['SMTP_USE_TLS'] = os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true'
+    app.config['SINK_HOST'] = os.environ.get('SINK_HOST', '127.0.0.1')
+    app.config['SINK_PORT'] = int(os.environ.get('SINK_PORT', 1025))
+    app.config['SENDGRID_API_KEY'] = os.environ.get('SENDGRID_API_KEY')
+
+    # Adaptive send pacing (messages/sec); SEND_RATE_INITIAL=0 disables pacing, e.g. for benchmarks
+    app.config['SEND_RATE_INITIAL'] = float(os.environ.get('SEND_RATE_INITIAL', 1.0))
+    app.config['SEND_RATE_MIN'] = float(os.environ.get('SEND_RATE_MIN', 0.1))
+    app.config['SEND_RATE_MAX'] = float(os.environ.get('SEND_RATE_MAX', 10.0))
+    app.config['SEND_RATE_STEP'] = float(os.environ.get('SEND_RATE_STEP', 0.1))
+    app.config['SEND_MAX_RETRIES'] = int(os.environ.get('SEND_MAX_RETRIES', 5))
+    app.config['SEND_BACKOFF_BASE'] = float(os.environ.get('SEND_BACKOFF_BASE', 2.0))
+    app.config['SEND_BACKOFF_MAX'] = float(os.environ.get('SEND_BACKOFF_MAX', 300.0))
+    # Pending recipients read per query by the send loop
+    app.config['SEND_CHUNK_SIZE'] = int(os.environ.get('SEND_CHUNK_SIZE', 1000))
+
+    # Delivery scheduling: 'serial' (one ordered loop) or 'domain' (grouped by recipient domain)
+    app.config['DELIVERY_MODE'] = os.environ.get('DELIVERY_MODE', 'serial')
+    app.config['DOMAIN_LIMITS'] = os.environ.get('DOMAIN_LIMITS')  # JSON, see app/domain_scheduler.py
+    app.config['DOMAIN_DEFAULT_CONCURRENCY'] = int(os.environ.get('DOMAIN_DEFAULT_CONCURRENCY', 2))
+    app.config['DOMAIN_DEFAULT_RATE'] = float(os.environ.get('DOMAIN_DEFAULT_RATE', 0))
+    app.config['DOMAIN_BATCH_SIZE'] = int(os.environ.get('DOMAIN_BATCH_SIZE', 50))
+    app.config['DOMAIN_WORKERS'] = int(os.environ.get('DOMAIN_WORKERS', 8))
+    # Open-tracking pixel; without it (and without per-recipient links) same-domain recipients share one message
+    app.config['TRACK_OPENS'] = os.environ.get('TRACK_OPENS', 'true').lower() == 'true'
+
+    # Sender account pools: consecutive failures before an account cools down, and for how long
+    app.config['SENDER_FAILURE_THRESHOLD'] = int(os.environ.get('SENDER_FAILURE_THRESHOLD', 5))
+    app.config['SENDER_COOLDOWN_MINUTES'] = float(os.environ.get('SENDER_COOLDOWN_MINUTES', 15))
+
+    # Create/upgrade tables on startup (default outside production; run the migrate command otherwise)
+    app.config['AUTO_MIGRATE'] = os.environ.get(
+        'AUTO_MIGRATE', 'false' if os.environ.get('FLASK_ENV') == 'production' else 'true').lower() == 'true'
+
+    # Recipient uploads: pyarrow/streaming readers (false = pandas only) and processes for large XLSX sheets
+    # (1 = parse in the web worker; more spawns a pool per upload, capped at 4)
+    app.config['RECIPIENT_FAST_PARSE'] = os.environ.get('RECIPIENT_FAST_PARSE', 'true').lower() == 'true'
+    app.config['RECIPIENT_PARSE_WORKERS'] = int(os.environ.get('RECIPIENT_PARSE_WORKERS', 1))
+
+    # Birthday emails: local send hour, fallback timezone (unset = server time), hours each local slot is
+    # spread over, the dispatcher's interval, emails per run and how late a planned email may still go, and
+    # minutes after which a claim left in Sending (the process died mid-send) is taken back
+    app.config['BIRTHDAY_SEND_HOUR'] = int(os.environ.get('BIRTHDAY_SEND_HOUR', 9))
+    app.config['BIRTHDAY_DEFAULT_TIMEZONE'] = os.environ.get('BIRTHDAY_DEFAULT_TIMEZONE')
+    app.config['BIRTHDAY_SEND_WINDOW_HOURS'] = float(os.environ.get('BIRTHDAY_SEND_WINDOW_HOURS', 8))
+    app.config['BIRTHDAY_DISPATCH_SECONDS'] = int(os.environ.get('BIRTHDAY_DISPATCH_SECONDS', 60))
+    app.config['BIRTHDAY_DISPATCH_BATCH'] = int(os.environ.get('BIRTHDAY_DISPATCH_BATCH', 100))
+    app.config['BIRTHDAY_MAX_DELAY_HOURS'] = float(os.environ.get('BIRTHDAY_MAX_DELAY_HOURS', 12))
+    app.config['BIRTHDAY_CLAIM_TIMEOUT_MINUTES'] = float(os.environ.get('BIRTHDAY_CLAIM_TIMEOUT_MINUTES', 15))
+
+    # Completed campaigns older than this many days move to Parquet files in ARCHIVE_DIR (0 = never)
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_AFTER_DAYS', 0))
+    app.config['ARCHIVE_DIR'] = os.environ.get('ARCHIVE_DIR', os.path.join(app.instance_path, 'archive'))
+    app.config['ARCHIVE_ROW_GROUP_SIZE'] = int(os.environ.get('ARCHIVE_ROW_GROUP_SIZE', 10000))
+
+    load_tracking_config(app)
 
     # Initialize extensions
     db.init_app(app)
 
+    from . import database
+    database.init_app(app, db)
+
+    from . import metrics
+    metrics.init_app(app, db)
+
+    from . import tracking
+    tracking.init_app(app, start=start_scheduler)
+
     with app.app_context():
         # Import parts of our application
         from . import routes, models
         from .routes import main_bp
+        from .tracking import tracking_bp
+        from .webhooks import webhooks_bp
         app.register_blueprint(main_bp)
+        app.register_blueprint(tracking_bp)
+        app.register_blueprint(webhooks_bp)
+
+        # Schema setup is a one-time step (the migrate command); local
+        # runs do it on startup unless AUTO_MIGRATE=false
+        if app.config['AUTO_MIGRATE']:
+            from .schema import migrate
+            migrate(app)
+
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Create or upgrade the database schema."""
+        from .schema import migrate
+        migrate(app)
 
-        # Create database tables
-        db.create_all()
-
-        # Database migration logic
-        # We wrap this in a check to ensure we only run it when needed
-        try:
-            # Check if we are using SQLite or PostgreSQL
-            engine_name = db.engine.name
-            
-            if engine_name == 'sqlite':
-                # SQLite PRAGMA check
-                with db.engine.begin() as conn:
-                    result = conn.execute(db.text("PRAGMA table_info(campaign)"))
-                    cols = [row[1] for row in result.fetchall()]
-                    
-                    if 'scheduled_at' not in cols:
-                        conn.execute(db.text("ALTER TABLE campaign ADD COLUMN scheduled_at DATETIME"))
-                    if 'sender_email' not in cols:
-                        conn.execute(db.text("ALTER TABLE campaign ADD COLUMN sender_email VARCHAR(120)"))
-                    if 'sender_password' not in cols:
-                        conn.execute(db.text("ALTER TABLE campaign ADD COLUMN sender_password VARCHAR(255)"))
-                    if 'batch_size' not in cols:
-                        conn.execute(db.text("ALTER TABLE campaign ADD COLUMN batch_size INTEGER DEFAULT 50"))
-                    if 'batch_delay' not in cols:
-                        conn.execute(db.text("ALTER TABLE campaign ADD COLUMN batch_delay INTEGER DEFAULT 5"))
-                    
-                    result = conn.execute(db.text("PRAGMA table_info(recipient)"))
-                    recipient_cols = [row[1] for row in result.fetchall()]
-                    if 'name' not in recipient_cols:
-                        conn.execute(db.text("ALTER TABLE recipient ADD COLUMN name VARCHAR(100)"))
-                    if 'dob' not in recipient_cols:
-                        conn.execute(db.text("ALTER TABLE recipient ADD COLUMN dob DATE"))
-            else:
-                # Basic PostgreSQL column check (generic SQL)
-                # Note: For production, using Flask-Migrate is better, but this handles simple additions
-                with db.engine.begin() as conn:
-                    # Check for Campaign columns
-                    for col_name, col_type in [
-                        ('scheduled_at', 'TIMESTAMP'),
-                        ('sender_email', 'VARCHAR(120)'),
-                        ('sender_password', 'VARCHAR(255)'),
-                        ('batch_size', 'INTEGER DEFAULT 50'),
-                        ('batch_delay', 'INTEGER DEFAULT 5')
-                    ]:
-                        try:
-                            conn.execute(db.text(f"ALTER TABLE campaign ADD COLUMN {col_name} {col_type}"))
-                        except Exception:
-                            pass # Column likely exists
-                            
-                    # Check for Recipient columns
-                    for col_name, col_type in [
-                        ('name', 'VARCHAR(100)'),
-                        ('dob', 'DATE')
-                    ]:
-                        try:
-                            conn.execute(db.text(f"ALTER TABLE recipient ADD COLUMN {col_name} {col_type}"))
-                        except Exception:
-                            pass
-        except Exception as e:
-            print(f"⚠️  Database migration skipped: {e}")
+    @app.cli.command('archive')
+    @click.option('--days', type=int, default=None, help='Archive completed campaigns last sent more than this many days ago (default ARCHIVE_AFTER_DAYS)')
+    @click.option('--campaign', 'campaign_id', type=int, default=None, help='Archive one completed campaign now')
+    def archive_command(days, campaign_id):
+        """Move old completed campaigns' recipients and events to Parquet files."""
+        from .archive import archive_campaign, archive_completed
+        directory = app.config['ARCHIVE_DIR']
+        row_group_size = app.config['ARCHIVE_ROW_GROUP_SIZE']
+        if campaign_id:
+            archived = [archive_campaign(campaign_id, directory, row_group_size)]
+        else:
+            days = app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+            if days <= 0:
+                print("ℹ️  Set ARCHIVE_AFTER_DAYS or pass --days to archive campaigns")
+                return
+            archived = archive_completed(days, directory, row_group_size)
+        for item in archived:
+            print(f"🗄️  Campaign {item.campaign_id}: {item.recipients} recipients, {item.events} events, "
+                  f"{item.size_bytes / 1024:.1f} KB in {item.path}")
+        if archived:
+            print(f"✅ Archived {len(archived)} campaign(s)")
+        else:
+            print("ℹ️  No campaigns to archive")
     
     # Setup APScheduler for automatic birthday wishes
-    setup_scheduler(app)
+    if start_scheduler:
+        setup_scheduler(app)
 
     return app
 
+def load_tracking_config(app):
+    """
+    Settings shared by the main app and the standalone tracking app.
+    """
+    # Public origin used in tracking links (pixel and verify button), e.g. https://t.example.com
+    app.config['TRACKING_BASE_URL'] = os.environ.get('TRACKING_BASE_URL', 'http://127.0.0.1:5002').rstrip('/')
+    # Tracking hits are buffered and written in batches (interval 0 = write each hit immediately).
+    # Bare numeric ids from emails sent before signed tokens keep working up to the last recipient id
+    # recorded by the first migrate after the upgrade (TRACKING_LEGACY_MAX_ID overrides it; 0 = none);
+    # TRACKING_LEGACY_IDS=false rejects them all
+    app.config['TRACKING_FLUSH_INTERVAL'] = float(os.environ.get('TRACKING_FLUSH_INTERVAL', 1.0))
+    app.config['TRACKING_FLUSH_SIZE'] = int(os.environ.get('TRACKING_FLUSH_SIZE', 500))
+    app.config['TRACKING_LEGACY_IDS'] = os.environ.get('TRACKING_LEGACY_IDS', 'true').lower() == 'true'
+    legacy_max_id = os.environ.get('TRACKING_LEGACY_MAX_ID')
+    app.config['TRACKING_LEGACY_MAX_ID'] = int(legacy_max_id) if legacy_max_id else None
+    # Raw tracking events older than this many days are rolled up into daily counts (0 = keep forever,
+    # the default: retention deletes data, so it only runs once an operator sets a window)
+    app.config['TRACKING_RETENTION_DAYS'] = int(os.environ.get('TRACKING_RETENTION_DAYS', 0))
+    # Monthly tracking_event partitions created ahead of time (PostgreSQL)
+    app.config['TRACKING_PARTITIONS_AHEAD'] = int(os.environ.get('TRACKING_PARTITIONS_AHEAD', 3))
+    # Minutes between incremental engagement rollup updates (time-series analytics)
+    app.config['ENGAGEMENT_ROLLUP_MINUTES'] = float(os.environ.get('ENGAGEMENT_ROLLUP_MINUTES', 5))
+    # Browser/CDN cache lifetime of the open pixel in seconds (0 = no caching, every open hits the server)
+    app.config['TRACKING_PIXEL_MAX_AGE'] = int(os.environ.get('TRACKING_PIXEL_MAX_AGE', 86400))
+    # Verification key of SendGrid's signed event webhook; without it every post is rejected
+    # unless SENDGRID_WEBHOOK_ALLOW_UNSIGNED=true (local testing only: anyone could suppress addresses)
+    app.config['SENDGRID_WEBHOOK_PUBLIC_KEY'] = os.environ.get('SENDGRID_WEBHOOK_PUBLIC_KEY')
+    app.config['SENDGRID_WEBHOOK_ALLOW_UNSIGNED'] = os.environ.get('SENDGRID_WEBHOOK_ALLOW_UNSIGNED', 'false').lower() == 'true'
+    # Seconds a signed webhook timestamp may differ from now before the post is rejected as a replay (0 = no limit)
+    app.config['SENDGRID_WEBHOOK_MAX_AGE'] = int(os.environ.get('SENDGRID_WEBHOOK_MAX_AGE', 300))
+    app.config['WEBHOOK_MAX_BYTES'] = int(os.environ.get('WEBHOOK_MAX_BYTES', 5 * 1024 * 1024))
+
 def setup_scheduler(app):
     """
-    Set up APScheduler to run daily birthday checks.
+    Set up APScheduler to plan birthday emails daily and send them through the day.
     """
     global scheduler
     
@@ -122,31 +241,71 @@ def setup_scheduler(app):
 
         scheduler = BackgroundScheduler(daemon=True)
         
-        # Schedule daily birthday check
+        # Plan each day's birthday emails at midnight (and now, in case today isn't planned yet),
+        # then send them as their local send times come due
+        from datetime import datetime
+        from .birthday_scheduler import run_dispatcher, run_planner
         scheduler.add_job(
-            func=lambda: check_and_send_birthday_emails_wrapper(app),
+            func=lambda: run_planner(app),
             trigger='cron',
-            hour=9,   # Run at 9:00 AM
+            hour=0,
             minute=0,
-            id='birthday_check',
-            name='Daily Birthday Check',
+            next_run_time=datetime.now(),
+            id='birthday_plan',
+            name='Daily Birthday Planner',
+            replace_existing=True
+        )
+        scheduler.add_job(
+            func=lambda: run_dispatcher(app),
+            trigger='interval',
+            seconds=app.config['BIRTHDAY_DISPATCH_SECONDS'],
+            id='birthday_dispatch',
+            name='Birthday Dispatcher',
             replace_existing=True
         )
         
+        # Daily tracking storage maintenance: upcoming partitions and retention
+        from .tracking_storage import run_maintenance
+        scheduler.add_job(
+            func=lambda: run_maintenance(app),
+            trigger='cron',
+            hour=3,
+            minute=30,
+            id='tracking_maintenance',
+            name='Tracking Storage Maintenance',
+            replace_existing=True
+        )
+        
+        # Incremental engagement rollups for the analytics time series
+        from .engagement import run_update
+        scheduler.add_job(
+            func=lambda: run_update(app),
+            trigger='interval',
+            minutes=app.config['ENGAGEMENT_ROLLUP_MINUTES'],
+            id='engagement_rollup',
+            name='Engagement Rollup',
+            replace_existing=True
+        )
+        
+        # Nightly cold archival of old completed campaigns
+        if app.config['ARCHIVE_AFTER_DAYS'] > 0:
+            from .archive import run_archive
+            scheduler.add_job(
+                func=lambda: run_archive(app),
+                trigger='cron',
+                hour=4,
+                minute=0,
+                id='campaign_archive',
+                name='Campaign Archive',
+                replace_existing=True
+            )
+        
         scheduler.start()
-        print(f"✅ Birthday scheduler started - daily checks at 09:00 AM")
+        print(f"✅ Birthday scheduler started - emails at {app.config['BIRTHDAY_SEND_HOUR']:02d}:00 in each recipient's timezone")
         
         atexit.register(lambda: scheduler.shutdown() if scheduler else None)
         
     except Exception as e:
         print(f"⚠️  Failed to start birthday scheduler: {e}")
 
-def check_and_send_birthday_emails_wrapper(app):
-    """
-    Wrapper function to ensure Flask app context is available.
-    """
-    with app.app_context():
-        from .birthday_scheduler import check_and_send_birthday_emails
-        check_and_send_birthday_emails()
-
 
@@ -0,0 +1,332 @@
+"""
+Campaign Archive
+
+Completed campaigns whose last email went out more than
+ARCHIVE_AFTER_DAYS ago have their Recipient and TrackingEvent rows moved
+out of the hot tables into two zstd-compressed Parquet files per
+campaign under ARCHIVE_DIR:
+
+- recipients.parquet: one row per recipient with its email, status,
+  sent time, open/reply counts and first reply time
+- events.parquet: the raw tracking events
+
+The Campaign row stays, with a CampaignArchive summary (totals, file
+location), and its engagement rollups are kept, so the dashboard, the
+analytics series and campaign_detail's stats never touch the files.
+Recipient pages and report exports read the Parquet files memory-mapped
+and only the columns and row groups they need; unsubscribe links in
+emails already sent resolve their recipient through the file too.
+
+A campaign is archived only once none of its members has a birthday email
+logged this year (the yearly dedupe needs those events, as in retention).
+Contacts stay in the shared contact table; birthday emails go to contacts
+that still belong to a campaign in the database.
+
+pyarrow is imported only by the archive job, archived-campaign views and
+archived unsubscribe links.
+"""
+
+import os
+import shutil
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from .models import db, Campaign, CampaignArchive, Contact, Recipient, TrackingEvent
+
+ROW_GROUP_SIZE = 10000
+IN_CLAUSE_CHUNK = 500
+
+ArchivedRow = namedtuple('ArchivedRow', 'id email status sent_at replied_at')
+
+
+def _schemas():
+    import pyarrow as pa
+
+    recipients = pa.schema([
+        ('recipient_id', pa.int64()),
+        ('contact_id', pa.int64()),
+        ('email', pa.string()),
+        ('status', pa.string()),
+        ('sent_at', pa.timestamp('us')),
+        ('opens', pa.int32()),
+        ('replies', pa.int32()),
+        ('replied_at', pa.timestamp('us')),
+    ])
+    events = pa.schema([
+        ('recipient_id', pa.int64()),
+        ('type', pa.string()),
+        ('timestamp', pa.timestamp('us')),
+    ])
+    return recipients, events
+
+
+def campaign_dir(directory, campaign_id):
+    return os.path.join(directory, f'campaign_{campaign_id}')
+
+
+def _chunks(values, size=IN_CLAUSE_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def archivable_campaigns(older_than_days, now=None):
+    """
+    Ids of completed, not yet archived campaigns whose last email was sent
+    more than `older_than_days` ago (creation time if nothing was sent),
+    without birthday emails logged this year.
+    """
+    now = now or datetime.now()
+    last_sent = db.session.query(
+        Recipient.campaign_id, db.func.max(Recipient.sent_at).label('sent_at')
+    ).group_by(Recipient.campaign_id).subquery()
+    birthday_this_year = db.session.query(Recipient.campaign_id).join(
+        TrackingEvent, TrackingEvent.recipient_id == Recipient.id
+    ).filter(
+        TrackingEvent.type == 'birthday_sent',
+        TrackingEvent.timestamp >= datetime(now.year, 1, 1)
+    )
+    return [row[0] for row in db.session.query(Campaign.id).outerjoin(
+        CampaignArchive, CampaignArchive.campaign_id == Campaign.id
+    ).outerjoin(
+        last_sent, last_sent.c.campaign_id == Campaign.id
+    ).filter(
+        Campaign.status == 'Completed',
+        db.func.coalesce(last_sent.c.sent_at, Campaign.created_at) < now - timedelta(days=older_than_days),
+        CampaignArchive.campaign_id.is_(None),
+        Campaign.id.notin_(birthday_this_year)
+    ).order_by(Campaign.id)]
+
+
+def _write_files(campaign_id, path, row_group_size):
+    """
+    Stream the campaign's recipients and events into Parquet files in
+    `path`, one row group per keyset chunk of recipients.
+
+    Returns:
+        dict: recipients, sent, opened, replied and events counts
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    recipient_schema, event_schema = _schemas()
+    totals = {'recipients': 0, 'sent': 0, 'opened': 0, 'replied': 0, 'events': 0}
+    recipients_tmp = os.path.join(path, 'recipients.parquet.tmp')
+    events_tmp = os.path.join(path, 'events.parquet.tmp')
+
+    with pq.ParquetWriter(recipients_tmp, recipient_schema, compression='zstd') as recipient_writer, \
+            pq.ParquetWriter(events_tmp, event_schema, compression='zstd') as event_writer:
+        last_id = 0
+        while True:
+            rows = db.session.query(
+                Recipient.id, Recipient.contact_id, Contact.email, Recipient.status, Recipient.sent_at
+            ).join(Contact, Contact.id == Recipient.contact_id).filter(
+                Recipient.campaign_id == campaign_id, Recipient.id > last_id
+            ).order_by(Recipient.id).limit(row_group_size).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            events = {'recipient_id': [], 'type': [], 'timestamp': []}
+            opens, replies, replied_at = {}, {}, {}
+            for chunk in _chunks(row[0] for row in rows):
+                for recipient_id, event_type, timestamp in db.session.query(
+                        TrackingEvent.recipient_id, TrackingEvent.type, TrackingEvent.timestamp).filter(
+                        TrackingEvent.recipient_id.in_(chunk)).order_by(TrackingEvent.id):
+                    events['recipient_id'].append(recipient_id)
+                    events['type'].append(event_type)
+                    events['timestamp'].append(timestamp)
+                    if event_type == 'open':
+                        opens[recipient_id] = opens.get(recipient_id, 0) + 1
+                    elif event_type == 'replied':
+                        replies[recipient_id] = replies.get(recipient_id, 0) + 1
+                        if recipient_id not in replied_at or timestamp < replied_at[recipient_id]:
+                            replied_at[recipient_id] = timestamp
+
+            recipient_writer.write_table(pa.table({
+                'recipient_id': [row[0] for row in rows],
+                'contact_id': [row[1] for row in rows],
+                'email': [row[2] for row in rows],
+                'status': [row[3] for row in rows],
+                'sent_at': [row[4] for row in rows],
+                'opens': [opens.get(row[0], 0) for row in rows],
+                'replies': [replies.get(row[0], 0) for row in rows],
+                'replied_at': [replied_at.get(row[0]) for row in rows],
+            }, schema=recipient_schema))
+            if events['recipient_id']:
+                event_writer.write_table(pa.table(events, schema=event_schema))
+
+            totals['recipients'] += len(rows)
+            totals['sent'] += sum(1 for row in rows if row[3] == 'Sent')
+            totals['opened'] += len(opens)
+            totals['replied'] += len(replies)
+            totals['events'] += len(events['recipient_id'])
+            db.session.expunge_all()
+
+    os.replace(recipients_tmp, os.path.join(path, 'recipients.parquet'))
+    os.replace(events_tmp, os.path.join(path, 'events.parquet'))
+    return totals
+
+
+def archive_campaign(campaign_id, directory, row_group_size=ROW_GROUP_SIZE):
+    """
+    Move one campaign's recipients and tracking events to Parquet files
+    and replace them with a CampaignArchive summary row.
+
+    Returns:
+        CampaignArchive: The summary row
+    """
+    if db.session.get(Campaign, campaign_id) is None:
+        raise ValueError(f"Campaign {campaign_id} not found")
+    path = campaign_dir(directory, campaign_id)
+    os.makedirs(path, exist_ok=True)
+
+    totals = _write_files(campaign_id, path, row_group_size)
+
+    # Rows leave the hot tables only after both files are complete
+    try:
+        recipient_ids = [row[0] for row in db.session.query(Recipient.id).filter_by(campaign_id=campaign_id)]
+        for chunk in _chunks(recipient_ids):
+            TrackingEvent.query.filter(TrackingEvent.recipient_id.in_(chunk)).delete(synchronize_session=False)
+        Recipient.query.filter_by(campaign_id=campaign_id).delete(synchronize_session=False)
+
+        campaign = db.session.get(Campaign, campaign_id)
+        archive = CampaignArchive(
+            campaign_id=campaign_id,
+            path=path,
+            archived_at=datetime.now(),
+            recipients=totals['recipients'],
+            sent=totals['sent'],
+            opened=totals['opened'] + campaign.rolled_up('open'),
+            replied=totals['replied'] + campaign.rolled_up('replied'),
+            events=totals['events'],
+            size_bytes=sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)),
+        )
+        db.session.add(archive)
+        db.session.commit()
+        return archive
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def archive_completed(older_than_days, directory, row_group_size=ROW_GROUP_SIZE):
+    """
+    Archive every eligible campaign (see archivable_campaigns).
+
+    Returns:
+        list: CampaignArchive rows created
+    """
+    archived = []
+    for campaign_id in archivable_campaigns(older_than_days):
+        try:
+            archived.append(archive_campaign(campaign_id, directory, row_group_size))
+        except Exception as e:
+            print(f"❌ Archiving campaign {campaign_id} failed: {e}")
+    return archived
+
+
+def remove_files(archive):
+    """Delete a campaign's archive directory (when the campaign is deleted)."""
+    if archive is not None:
+        shutil.rmtree(archive.path, ignore_errors=True)
+
+
+# --- Reads ---
+
+def _recipients_file(archive):
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(os.path.join(archive.path, 'recipients.parquet'), memory_map=True)
+
+
+def _row(record):
+    return ArchivedRow(record['recipient_id'], record['email'], record['status'],
+                       record['sent_at'], record['replied_at'])
+
+
+def archived_email(archive, recipient_id):
+    """
+    Email of one archived recipient, or None. Recipient ids are written in
+    ascending order, so row-group statistics limit the read to one group.
+    """
+    import pyarrow.parquet as pq
+
+    try:
+        table = pq.read_table(os.path.join(archive.path, 'recipients.parquet'), columns=['email'],
+                              filters=[('recipient_id', '=', int(recipient_id))], memory_map=True)
+    except OSError:
+        return None
+    return table['email'][0].as_py() if table.num_rows else None
+
+
+def replied_count(archive):
+    """Number of archived recipients with at least one reply event."""
+    import pyarrow.compute as pc
+
+    replies = _recipients_file(archive).read(columns=['replies'])['replies']
+    return pc.sum(pc.greater(replies, 0).cast('int64')).as_py() or 0
+
+
+def recipient_rows(archive, page, total, per_page, replied_only=False):
+    """
+    One page of an archived campaign's recipients, like routes.recipient_rows.
+    Plain pages read only the row groups that overlap the page.
+
+    Returns:
+        tuple: (rows, page actually shown, number of pages)
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    pages = max((total + per_page - 1) // per_page, 1)
+    page = min(max(page, 1), pages)
+    offset = (page - 1) * per_page
+    columns = ['recipient_id', 'email', 'status', 'sent_at', 'replied_at']
+    parquet = _recipients_file(archive)
+
+    if replied_only:
+        table = parquet.read(columns=columns + ['replies'])
+        table = table.filter(pc.greater(table['replies'], 0)).sort_by(
+            [('replied_at', 'descending'), ('recipient_id', 'ascending')])
+        return [_row(record) for record in table.slice(offset, per_page).to_pylist()], page, pages
+
+    groups = []
+    skipped = start = 0
+    for index in range(parquet.num_row_groups):
+        rows = parquet.metadata.row_group(index).num_rows
+        if start + rows <= offset:
+            skipped += rows
+        elif start < offset + per_page:
+            groups.append(index)
+        start += rows
+    if not groups:
+        return [], page, pages
+
+    table = pa.concat_tables([parquet.read_row_group(index, columns=columns) for index in groups])
+    return [_row(record) for record in table.slice(offset - skipped, per_page).to_pylist()], page, pages
+
+
+def report_rows(archive):
+    """
+    Per-recipient export rows of an archived campaign.
+
+    Yields:
+        dict: email, status, sent_at, opens and replies of one recipient
+    """
+    parquet = _recipients_file(archive)
+    for batch in parquet.iter_batches(columns=['email', 'status', 'sent_at', 'opens', 'replies']):
+        yield from batch.to_pylist()
+
+
+def run_archive(app):
+    """Scheduler job wrapper."""
+    with app.app_context():
+        try:
+            archived = archive_completed(app.config['ARCHIVE_AFTER_DAYS'], app.config['ARCHIVE_DIR'],
+                                         app.config['ARCHIVE_ROW_GROUP_SIZE'])
+            if archived:
+                print(f"🗄️  Archived {len(archived)} campaign(s): "
+                      f"{sum(a.recipients for a in archived)} recipients, {sum(a.events for a in archived)} events")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Campaign archive failed: {e}")
@@ -1,28 +1,302 @@
 """
 Birthday Scheduler Module
 
-Automatically checks for recipients with birthdays today and sends birthday emails.
+Sends birthday emails at BIRTHDAY_SEND_HOUR in each contact's own timezone
+(the contact's, else its latest campaign's, else BIRTHDAY_DEFAULT_TIMEZONE,
+else server time), spread over the day instead of in one burst:
+
+- The planner (plan_birthdays) runs at midnight and on startup. It finds
+  every contact whose local send time falls on the current server day and
+  adds a BirthdaySchedule row with its send time in server time. Contacts
+  sharing one local slot are spaced evenly over the BIRTHDAY_SEND_WINDOW_HOURS
+  after it, so a list in one timezone does not go out as an hourly burst.
+  Planners racing on several processes skip rows another one inserted.
+- The dispatcher (dispatch_birthdays) runs every BIRTHDAY_DISPATCH_SECONDS
+  and sends at most BIRTHDAY_DISPATCH_BATCH due rows, oldest first, so
+  SMTP and database load stays flat. Each row is claimed (status 'Sending')
+  before it is sent; a claim released by an error goes back to Pending, and
+  one left by a crashed process is taken back after
+  BIRTHDAY_CLAIM_TIMEOUT_MINUTES.
+
 Prevents duplicate sends by tracking the last year a birthday email was sent.
+check_and_send_birthday_emails still sends all of today's birthdays at once
+for manual runs.
 """
 
-from datetime import datetime, date
-from .models import db, Recipient, TrackingEvent
+from collections import Counter
+from datetime import datetime, date, time as day_time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from sqlalchemy import and_, extract, func, or_
+from .models import db, BirthdaySchedule, Campaign, Contact, Recipient, TrackingEvent
 from .sender import send_birthday_email
+from .suppression import get_suppressions
+from .metrics import BIRTHDAY_EMAILS, BIRTHDAY_PENDING, BIRTHDAY_RUN_SECONDS, TRACKING_EVENTS
 import os
+import time
+
+IN_CLAUSE_CHUNK = 500
+# Finished schedule rows are kept this long for inspection
+SCHEDULE_KEEP_DAYS = 30
+
+
+def _chunks(values, size=IN_CLAUSE_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _zone(name):
+    """ZoneInfo for a timezone name, or None for server time (or an unknown name)."""
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        print(f"⚠️  Unknown timezone {name!r}, using server time")
+        return None
+
+
+def local_send_time(day, hour, zone):
+    """
+    Server-local (naive) time of `hour`:00 on `day` in `zone`.
+    Nonexistent or repeated wall times around DST changes resolve like zoneinfo's fold=0.
+    """
+    slot = datetime.combine(day, day_time(hour))
+    if zone is None:
+        return slot
+    return slot.replace(tzinfo=zone).astimezone().replace(tzinfo=None)
+
+
+def _insert_schedule(rows):
+    """
+    Insert BirthdaySchedule rows, skipping contacts a concurrent planner has
+    already planned for that birthday.
+    
+    Returns:
+        int: Number of rows inserted
+    """
+    if db.engine.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    inserted = 0
+    for chunk in _chunks(rows):
+        # One multi-row statement per chunk, so rowcount counts what was inserted
+        inserted += db.session.execute(insert(BirthdaySchedule).values(chunk).on_conflict_do_nothing(
+            index_elements=['contact_id', 'day'])).rowcount
+    return inserted
+
+
+def plan_birthdays(now=None, send_hour=9, window_hours=8, default_timezone=None):
+    """
+    Add BirthdaySchedule rows for every contact whose birthday send time in
+    their own timezone falls on the current server day. Safe to run
+    repeatedly: contacts already planned for that birthday are skipped.
+    
+    Args:
+        now: Current server time (defaults to now)
+        send_hour: Local hour birthday emails are sent at
+        window_hours: Hours after each local slot its contacts are spread over
+        default_timezone: Timezone of contacts and campaigns without one (None = server time)
+        
+    Returns:
+        int: Number of birthday emails planned
+    """
+    now = now or datetime.now()
+    day_start = datetime.combine(now.date(), day_time())
+    day_end = day_start + timedelta(days=1)
+    # A local birthday can be yesterday, today or tomorrow on the server's calendar
+    nearby = [now.date() + timedelta(days=offset) for offset in (-1, 0, 1)]
+    
+    rows = db.session.query(Contact.id, Contact.dob, Contact.timezone, Campaign.timezone).join(
+        Recipient, Recipient.contact_id == Contact.id
+    ).join(
+        Campaign, Campaign.id == Recipient.campaign_id
+    ).filter(
+        Contact.dob.isnot(None),
+        or_(*(and_(extract('month', Contact.dob) == day.month, extract('day', Contact.dob) == day.day)
+              for day in nearby))
+    ).order_by(Contact.id, Recipient.id)
+    
+    # The contact's own timezone, else that of its latest campaign with one
+    contacts = {}
+    for contact_id, dob, contact_tz, campaign_tz in rows:
+        previous = contacts.get(contact_id, (None, None))[1]
+        contacts[contact_id] = (dob, contact_tz or campaign_tz or previous)
+    
+    planned = set()
+    for chunk in _chunks(contacts):
+        planned.update(db.session.query(BirthdaySchedule.contact_id, BirthdaySchedule.day).filter(
+            BirthdaySchedule.contact_id.in_(chunk), BirthdaySchedule.day.in_(nearby)))
+    
+    zones = {}
+    slots = {}
+    for contact_id, (dob, tz_name) in contacts.items():
+        tz_name = tz_name or default_timezone
+        if tz_name not in zones:
+            zones[tz_name] = _zone(tz_name)
+        zone = zones[tz_name]
+        for day in nearby:
+            if (day.month, day.day) != (dob.month, dob.day) or (contact_id, day) in planned:
+                continue
+            send_at = local_send_time(day, send_hour, zone)
+            if day_start <= send_at < day_end:
+                slots.setdefault(send_at, []).append((contact_id, day, tz_name if zone else None))
+    
+    # Contacts sharing a slot (one timezone) are spaced evenly over the sending
+    # window, keeping the dispatch rate flat instead of all going at hh:00
+    schedule = []
+    created_at = datetime.now()
+    for send_at, members in slots.items():
+        step = timedelta(hours=window_hours) / len(members)
+        for position, (contact_id, day, tz_name) in enumerate(members):
+            schedule.append({'contact_id': contact_id, 'day': day, 'timezone': tz_name,
+                             'send_at': send_at + step * position, 'status': 'Pending', 'created_at': created_at})
+    planned_count = _insert_schedule(schedule)
+    
+    BirthdaySchedule.query.filter(
+        BirthdaySchedule.status != 'Pending',
+        BirthdaySchedule.send_at < day_start - timedelta(days=SCHEDULE_KEEP_DAYS)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return planned_count
+
+
+def dispatch_birthdays(now=None, limit=100, max_delay_hours=12, claim_timeout_minutes=15):
+    """
+    Send the due planned birthday emails, oldest first, at most `limit` per
+    call; the rest wait for the next call. Rows more than `max_delay_hours`
+    overdue (e.g. the app was down) are marked 'Missed' instead of sent late.
+    Rows claimed more than `claim_timeout_minutes` ago and still 'Sending'
+    (the process died mid-send) are returned to 'Pending' first; the
+    birthday_sent check skips them if the email did go out.
+    
+    Returns:
+        collections.Counter: Rows handled per resulting status
+    """
+    now = now or datetime.now()
+    counts = Counter()
+    
+    sender_email = os.environ.get('BIRTHDAY_SENDER_EMAIL')
+    sender_password = os.environ.get('BIRTHDAY_SENDER_PASSWORD')
+    if not sender_email or not sender_password:
+        return counts
+    
+    reclaimed = BirthdaySchedule.query.filter(
+        BirthdaySchedule.status == 'Sending',
+        or_(BirthdaySchedule.claimed_at.is_(None),
+            BirthdaySchedule.claimed_at < now - timedelta(minutes=claim_timeout_minutes))
+    ).update({'status': 'Pending', 'claimed_at': None}, synchronize_session=False)
+    if reclaimed:
+        print(f"⚠️  Took back {reclaimed} birthday email(s) left in Sending by a stopped dispatcher")
+    
+    counts['Missed'] = BirthdaySchedule.query.filter(
+        BirthdaySchedule.status == 'Pending',
+        BirthdaySchedule.send_at < now - timedelta(hours=max_delay_hours)
+    ).update({'status': 'Missed'}, synchronize_session=False)
+    db.session.commit()
+    
+    due = BirthdaySchedule.query.filter(
+        BirthdaySchedule.status == 'Pending',
+        BirthdaySchedule.send_at <= now
+    ).order_by(BirthdaySchedule.send_at, BirthdaySchedule.id).limit(limit).all()
+    
+    if due:
+        contact_ids = [row.contact_id for row in due]
+        # One of each contact's memberships carries the birthday_sent event
+        memberships = dict(db.session.query(Recipient.contact_id, func.max(Recipient.id)).filter(
+            Recipient.contact_id.in_(contact_ids)).group_by(Recipient.contact_id).all())
+        already_sent = contacts_sent_this_year(contact_ids, now.year)
+        suppressions = get_suppressions()
+        
+        for row in due:
+            # Claim the row so a second scheduler process cannot send it too
+            claimed = db.session.execute(db.update(BirthdaySchedule).where(
+                BirthdaySchedule.id == row.id, BirthdaySchedule.status == 'Pending'
+            ).values(status='Sending', claimed_at=datetime.now())).rowcount
+            db.session.commit()
+            if not claimed:
+                continue
+            
+            contact = row.contact
+            recipient_id = memberships.get(contact.id)
+            try:
+                if recipient_id is None or contact.id in already_sent or contact.email in suppressions:
+                    status = 'Skipped'
+                elif send_birthday_email(contact, sender_email, sender_password):
+                    status = 'Sent'
+                    log_birthday_sent_for_email(recipient_id, contact.email, now.year)
+                else:
+                    status = 'Failed'
+                    print(f"❌ Failed to send birthday email to {contact.email}")
+            except Exception:
+                # Release the claim so the next run retries it instead of leaving it Sending
+                db.session.rollback()
+                db.session.execute(db.update(BirthdaySchedule).where(
+                    BirthdaySchedule.id == row.id, BirthdaySchedule.status == 'Sending'
+                ).values(status='Pending', claimed_at=None))
+                db.session.commit()
+                raise
+            
+            db.session.execute(db.update(BirthdaySchedule).where(BirthdaySchedule.id == row.id).values(
+                status=status, sent_at=datetime.now() if status == 'Sent' else None))
+            db.session.commit()
+            counts[status] += 1
+    
+    for status, count in counts.items():
+        if count:
+            BIRTHDAY_EMAILS.inc(count, status=status)
+    BIRTHDAY_PENDING.set(BirthdaySchedule.query.filter_by(status='Pending').count())
+    return +counts
+
+
+def run_planner(app):
+    """Scheduler job wrapper: plan the current day's birthday emails."""
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            if not os.environ.get('BIRTHDAY_SENDER_EMAIL') or not os.environ.get('BIRTHDAY_SENDER_PASSWORD'):
+                print("⚠️  Birthday sender credentials not configured. Birthday emails will not be sent.")
+            planned = plan_birthdays(
+                send_hour=app.config['BIRTHDAY_SEND_HOUR'],
+                window_hours=app.config['BIRTHDAY_SEND_WINDOW_HOURS'],
+                default_timezone=app.config['BIRTHDAY_DEFAULT_TIMEZONE']
+            )
+            print(f"🎂 Planned {planned} birthday email(s) for today")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Birthday planning failed: {e}")
+        finally:
+            BIRTHDAY_RUN_SECONDS.observe(time.perf_counter() - started)
+
+
+def run_dispatcher(app):
+    """Scheduler job wrapper: send the due planned birthday emails."""
+    with app.app_context():
+        try:
+            counts = dispatch_birthdays(limit=app.config['BIRTHDAY_DISPATCH_BATCH'],
+                                        max_delay_hours=app.config['BIRTHDAY_MAX_DELAY_HOURS'],
+                                        claim_timeout_minutes=app.config['BIRTHDAY_CLAIM_TIMEOUT_MINUTES'])
+            if counts:
+                print("🎂 Birthday dispatch: " + ", ".join(f"{count} {status.lower()}" for status, count in sorted(counts.items())))
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Birthday dispatch failed: {e}")
 
 def check_and_send_birthday_emails():
     """
-    Main function to check for today's birthdays and send birthday emails.
+    Send all of today's birthday emails at once, in server time (manual runs;
+    the scheduler uses plan_birthdays and dispatch_birthdays instead).
     
     This function:
-    1. Queries all recipients with a birthday today (month and day match)
-    2. Filters out recipients who already received a birthday email this year
-    3. Sends birthday emails to eligible recipients
+    1. Queries all contacts with a birthday today (month and day match)
+    2. Filters out contacts who already received a birthday email this year
+    3. Sends birthday emails to eligible contacts
     4. Logs the send event to prevent duplicates
     
-    Should be called daily by the scheduler.
-    Note: Requires Flask app context (handled by wrapper function)
+    Note: Requires Flask app context
     """
+    started = time.perf_counter()
     try:
         today = date.today()
         current_year = today.year
@@ -35,44 +309,50 @@ def check_and_send_birthday_emails():
             print("⚠️  Birthday sender credentials not configured. Skipping birthday check.")
             return
         
-        # Find all recipients whose birthday is today (month and day match)
-        # Filter recipients who have a DOB set
-        recipients_with_birthdays = Recipient.query.filter(
-            Recipient.dob.isnot(None)
-        ).all()
-        
-        # Filter to only those with birthday today
-        birthday_recipients = []
-        for recipient in recipients_with_birthdays:
-            if recipient.dob.month == today.month and recipient.dob.day == today.day:
-                birthday_recipients.append(recipient)
+        # Contacts born today (month and day match) who are in at least one campaign;
+        # each person is checked once however many campaigns they belong to
+        birthday_contacts = db.session.query(Contact, func.max(Recipient.id)).join(
+            Recipient, Recipient.contact_id == Contact.id
+        ).filter(
+            Contact.dob.isnot(None),
+            extract('month', Contact.dob) == today.month,
+            extract('day', Contact.dob) == today.day
+        ).group_by(Contact.id).all()
         
-        if not birthday_recipients:
+        if not birthday_contacts:
             print(f"ℹ️  No birthdays today ({today.strftime('%B %d, %Y')})")
             return
         
-        print(f"🎂 Found {len(birthday_recipients)} birthday(s) today!")
+        print(f"🎂 Found {len(birthday_contacts)} birthday(s) today!")
+        
+        already_sent = contacts_sent_this_year([contact.id for contact, _ in birthday_contacts], current_year)
+        suppressions = get_suppressions()
         
         sent_count = 0
         skipped_count = 0
         
-        for recipient in birthday_recipients:
-            # Check if birthday email was already sent this year to this EMAIL
-            if already_sent_this_year_to_email(recipient.email, current_year):
-                print(f"⏭️  Skipped {recipient.email} - already sent this year")
+        for contact, recipient_id in birthday_contacts:
+            # Check if birthday email was already sent this year to this person
+            if contact.id in already_sent:
+                print(f"⏭️  Skipped {contact.email} - already sent this year")
+                skipped_count += 1
+                continue
+            
+            if contact.email in suppressions:
+                print(f"⏭️  Skipped {contact.email} - on the suppression list")
                 skipped_count += 1
                 continue
             
             # Send birthday email
-            success = send_birthday_email(recipient, sender_email, sender_password)
+            success = send_birthday_email(contact, sender_email, sender_password)
             
             if success:
-                # Log the birthday_sent event for this email
-                log_birthday_sent_for_email(recipient.id, recipient.email, current_year)
+                # Log the birthday_sent event on one of the contact's memberships
+                log_birthday_sent_for_email(recipient_id, contact.email, current_year)
                 sent_count += 1
-                print(f"✅ Sent birthday email to {recipient.email} ({recipient.name or 'Friend'})")
+                print(f"✅ Sent birthday email to {contact.email} ({contact.name or 'Friend'})")
             else:
-                print(f"❌ Failed to send birthday email to {recipient.email}")
+                print(f"❌ Failed to send birthday email to {contact.email}")
         
         print(f"📊 Summary: {sent_count} sent, {skipped_count} skipped")
         
@@ -81,11 +361,29 @@ def check_and_send_birthday_emails():
         print(f"❌ Error in birthday check: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        BIRTHDAY_RUN_SECONDS.observe(time.perf_counter() - started)
+
+def contacts_sent_this_year(contact_ids, year):
+    """
+    Return the subset of `contact_ids` that already received a birthday
+    email this year, from any of their campaign memberships.
+    """
+    year_start = datetime(year, 1, 1)
+    year_end = datetime(year, 12, 31, 23, 59, 59)
+    
+    rows = db.session.query(Recipient.contact_id).join(TrackingEvent).filter(
+        Recipient.contact_id.in_(contact_ids),
+        TrackingEvent.type == 'birthday_sent',
+        TrackingEvent.timestamp >= year_start,
+        TrackingEvent.timestamp <= year_end
+    ).distinct()
+    
+    return {row[0] for row in rows}
 
 def already_sent_this_year_to_email(email, year):
     """
     Check if a birthday email was already sent to this EMAIL ADDRESS this year.
-    This prevents duplicate sends when the same email exists in multiple campaigns.
     
     Args:
         email: Email address to check
@@ -94,19 +392,9 @@ def already_sent_this_year_to_email(email, year):
     Returns:
         True if already sent this year, False otherwise
     """
-    # Check for a birthday_sent event this year for ANY recipient with this email
-    year_start = datetime(year, 1, 1)
-    year_end = datetime(year, 12, 31, 23, 59, 59)
-    
-    # Join TrackingEvent with Recipient to check by email
-    event = db.session.query(TrackingEvent).join(Recipient).filter(
-        Recipient.email == email,
-        TrackingEvent.type == 'birthday_sent',
-        TrackingEvent.timestamp >= year_start,
-        TrackingEvent.timestamp <= year_end
-    ).first()
-    
-    return event is not None
+    from .contacts import normalize_email
+    contact = Contact.query.filter_by(email=normalize_email(email)).first()
+    return contact is not None and contact.id in contacts_sent_this_year([contact.id], year)
 
 def log_birthday_sent_for_email(recipient_id, email, year):
     """
@@ -125,3 +413,4 @@ def log_birthday_sent_for_email(recipient_id, email, year):
     )
     db.session.add(event)
     db.session.commit()
+    TRACKING_EVENTS.inc(type='birthday_sent')
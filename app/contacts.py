@@ -0,0 +1,132 @@
+"""
+Contact Store
+
+Every person is one Contact row (unique on the normalized email) holding
+name, date of birth and timezone; a campaign's Recipient rows only link contacts to
+the campaign and track delivery status. Importing a list upserts its
+contacts in bulk, so re-importing a known list only adds the memberships.
+"""
+
+from datetime import datetime
+
+from .models import db, Contact, Recipient
+
+IN_CLAUSE_CHUNK = 500
+
+
+def normalize_email(email):
+    return str(email).strip().lower()
+
+
+def _chunks(values, size=IN_CLAUSE_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def upsert_contacts(rows):
+    """
+    Insert new contacts and fill in name/DOB/timezone of existing ones.
+
+    Args:
+        rows: Dicts with 'email' and optional 'name', 'dob' and 'timezone'
+
+    Returns:
+        dict: normalized email -> contact id, in first-seen order
+    """
+    incoming = {}
+    for row in rows:
+        email = normalize_email(row['email'])
+        current = incoming.setdefault(email, {'email': email, 'name': None, 'dob': None, 'timezone': None})
+        current['name'] = row.get('name') or current['name']
+        current['dob'] = row.get('dob') or current['dob']
+        current['timezone'] = row.get('timezone') or current['timezone']
+
+    ids = {}
+    updates = []
+    for chunk in _chunks(incoming):
+        for contact_id, email, name, dob, timezone in db.session.query(
+                Contact.id, Contact.email, Contact.name, Contact.dob, Contact.timezone).filter(Contact.email.in_(chunk)):
+            ids[email] = contact_id
+            new = incoming[email]
+            changed = {}
+            if new['name'] and new['name'] != name:
+                changed['name'] = new['name']
+            if new['dob'] and new['dob'] != dob:
+                changed['dob'] = new['dob']
+            if new['timezone'] and new['timezone'] != timezone:
+                changed['timezone'] = new['timezone']
+            if changed:
+                updates.append(dict(changed, id=contact_id))
+
+    missing = [dict(values, created_at=datetime.now()) for email, values in incoming.items() if email not in ids]
+    if missing:
+        db.session.execute(db.insert(Contact), missing)
+    for update in updates:
+        db.session.execute(db.update(Contact).where(Contact.id == update.pop('id')).values(**update))
+
+    if missing:
+        for chunk in _chunks(row['email'] for row in missing):
+            ids.update(db.session.query(Contact.email, Contact.id).filter(Contact.email.in_(chunk)))
+
+    return {email: ids[email] for email in incoming}
+
+
+def add_recipients(campaign_id, rows):
+    """
+    Upsert the contacts in `rows` and add each one to the campaign once.
+
+    Returns:
+        int: Number of recipients added
+    """
+    contact_ids = upsert_contacts(rows)
+
+    existing = set()
+    for chunk in _chunks(contact_ids.values()):
+        existing.update(row[0] for row in db.session.query(Recipient.contact_id).filter(
+            Recipient.campaign_id == campaign_id, Recipient.contact_id.in_(chunk)))
+
+    members = [{'campaign_id': campaign_id, 'contact_id': contact_id, 'status': 'Pending'}
+               for contact_id in dict.fromkeys(contact_ids.values()) if contact_id not in existing]
+    if members:
+        db.session.execute(db.insert(Recipient), members)
+    db.session.commit()
+    return len(members)
+
+
+def migrate_recipients():
+    """
+    One-time conversion of recipient tables from before the contact store:
+    create a contact per distinct normalized email (keeping a name and DOB
+    found for it), point each recipient at its contact and drop the old
+    per-recipient email, name and dob columns.
+    """
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('recipient')}
+    if 'email' not in columns:
+        return
+
+    print("🔄 Moving recipient emails, names and birthdays into contacts...")
+    normalized = 'lower(trim(recipient.email))'
+    name = 'max(recipient.name)' if 'name' in columns else 'NULL'
+    dob = 'max(recipient.dob)' if 'dob' in columns else 'NULL'
+    with db.engine.begin() as conn:
+        if 'contact_id' not in columns:
+            conn.execute(db.text('ALTER TABLE recipient ADD COLUMN contact_id INTEGER REFERENCES contact (id)'))
+        conn.execute(db.text(f'''
+            INSERT INTO contact (email, name, dob, created_at)
+            SELECT {normalized}, {name}, {dob}, CURRENT_TIMESTAMP FROM recipient
+            WHERE {normalized} NOT IN (SELECT email FROM contact)
+            GROUP BY {normalized}
+        '''))
+        conn.execute(db.text(f'''
+            UPDATE recipient SET contact_id = (SELECT contact.id FROM contact WHERE contact.email = {normalized})
+            WHERE contact_id IS NULL
+        '''))
+        for column in ('email', 'name', 'dob'):
+            if column in columns:
+                conn.execute(db.text(f'ALTER TABLE recipient DROP COLUMN {column}'))
+        conn.execute(db.text(
+            'CREATE INDEX IF NOT EXISTS ix_recipient_campaign_contact ON recipient (campaign_id, contact_id)'))
+        conn.execute(db.text('CREATE INDEX IF NOT EXISTS ix_recipient_contact ON recipient (contact_id)'))
+        total = conn.execute(db.text('SELECT count(*) FROM contact')).scalar()
+    print(f"✅ Recipients now reference {total} shared contacts")
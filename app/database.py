@@ -0,0 +1,132 @@
+"""
+Database Engine Tuning
+
+Engine options come from the environment (see load_database_config in
+app/__init__.py):
+
+- PostgreSQL: connection pool size, overflow, pre-ping and recycle, so
+  workers reuse a bounded set of connections and drop ones the server
+  closed.
+- SQLite: every connection switches to WAL with synchronous=NORMAL and a
+  busy timeout, so readers (dashboard, pixel lookups) no longer block on
+  the sender's writes and a briefly held lock is waited for instead of
+  failing with "database is locked".
+
+SQLite still allows one writer at a time, and a writer that loses the race
+while its transaction holds a read snapshot fails immediately regardless
+of the busy timeout. Within a process, SQLITE_WRITE_LOCK therefore queues
+writers (sender thread, birthday job, tracking flushes) on one lock that
+is taken before a transaction's first write and released once its COMMIT
+or ROLLBACK has run (the session's after_commit/after_rollback, or the
+connection's return to the pool), not when the commit starts. Loops that
+do network I/O between writes (the sharded sender) turn off autoflush, so
+their writes, and the lock, are confined to flush and commit. Other
+processes are covered by the busy timeout.
+"""
+
+import threading
+
+from sqlalchemy import event
+
+_LOCK_KEY = 'sqlite_write_lock'
+_WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+
+def engine_options(uri, config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the given database URI.
+    """
+    if uri.startswith('sqlite'):
+        return {
+            'pool_pre_ping': config['DB_POOL_PRE_PING'],
+            'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT']},
+        }
+
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if uri.startswith('postgresql') and config.get('DB_STATEMENT_TIMEOUT_MS'):
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+
+class WriterQueue:
+    """
+    Serializes SQLite write transactions within the process.
+
+    The lock is re-entrant per thread, so a thread that already writes on
+    one connection can open another; a writer that waits longer than
+    `timeout` seconds goes ahead and relies on SQLite's busy timeout.
+    """
+
+    def __init__(self, engine, timeout):
+        self.engine = engine
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self.session_key = (_LOCK_KEY, id(self))
+
+    def before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if _LOCK_KEY in conn.info or not statement.lstrip().upper().startswith(_WRITE_PREFIXES):
+            return
+        conn.info[_LOCK_KEY] = self.lock if self.lock.acquire(timeout=self.timeout) else None
+
+    @staticmethod
+    def release(info):
+        lock = info.pop(_LOCK_KEY, None)
+        if lock is not None:
+            try:
+                lock.release()
+            except RuntimeError:
+                # Released from a thread other than the writer (pool cleanup); the owner is gone
+                pass
+
+    def after_begin(self, session, transaction, connection):
+        # Remember the session's connections; their lock is released after the COMMIT itself
+        if connection.engine is self.engine:
+            session.info.setdefault(self.session_key, []).append(connection.info)
+
+    def after_end(self, session):
+        for info in session.info.pop(self.session_key, []):
+            self.release(info)
+
+    def after_reset(self, dbapi_connection, connection_record, reset_state):
+        # Core connections (engine.begin()) and anything a session left: released at checkin
+        self.release(connection_record.info)
+
+
+def _sqlite_pragmas(config):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if config['SQLITE_WAL']:
+            cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+        cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'] * 1000)}")
+        cursor.close()
+    return on_connect
+
+
+def init_app(app, db):
+    """
+    Attach the SQLite pragmas and writer queue to the app's engine.
+    Must run after db.init_app(app) and before the first connection.
+    """
+    with app.app_context():
+        engine = db.engine
+        if engine.name != 'sqlite':
+            return
+
+        event.listen(engine, 'connect', _sqlite_pragmas(app.config))
+
+        if app.config['SQLITE_WRITE_LOCK']:
+            queue = WriterQueue(engine, app.config['SQLITE_BUSY_TIMEOUT'])
+            event.listen(engine, 'before_cursor_execute', queue.before_execute)
+            # The engine's commit/rollback events fire before the statement runs; these fire after it
+            event.listen(db.session, 'after_begin', queue.after_begin)
+            event.listen(db.session, 'after_commit', queue.after_end)
+            event.listen(db.session, 'after_rollback', queue.after_end)
+            event.listen(engine.pool, 'reset', queue.after_reset)
+            app.extensions['sqlite_writer_queue'] = queue
@@ -0,0 +1,305 @@
+"""
+Domain-Aware Scheduling
+
+Alternative to the serial send loop (DELIVERY_MODE=domain). Pending
+recipients are grouped by destination domain and sent in per-domain
+batches, each batch over its own relay connection:
+
+- Per-domain concurrency and rate caps (DOMAIN_LIMITS), so throttling by
+  one provider (e.g. Gmail) slows only that provider's recipients instead
+  of stalling the whole campaign.
+- Each domain has its own adaptive rate controller.
+- When the message is identical for every recipient (open tracking off
+  and no per-recipient links), recipients of the same domain share one
+  SMTP transaction with multiple RCPT TO. Addresses the server refuses
+  are handled by their own reply code: 5xx fails (or bounces) them, 4xx
+  puts them back in their domain's queue after a backoff, up to
+  SEND_MAX_RETRIES times.
+- Pending recipients are read in SEND_CHUNK_SIZE keyset chunks and the
+  domain queues are topped up as they drain, so at most about two chunks
+  are held in memory however large the campaign is.
+
+Delivery still goes through the configured relay transport; direct-to-MX
+delivery is not implemented.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import smtplib
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from .models import db, Campaign, Recipient
+from .transport import get_transport
+from .tokens import get_signer
+from .ratecontrol import AdaptiveRateController, THROTTLE_CODES
+from .metrics import MESSAGES_SENT, MESSAGES_FAILED, SEND_QUEUE_DEPTH, SEND_RATE
+
+logger = logging.getLogger(__name__)
+
+# Domains served by the same provider share one concurrency/rate budget
+DOMAIN_GROUPS = {
+    'gmail.com': 'gmail',
+    'googlemail.com': 'gmail',
+    'outlook.com': 'microsoft',
+    'hotmail.com': 'microsoft',
+    'live.com': 'microsoft',
+    'msn.com': 'microsoft',
+    'yahoo.com': 'yahoo',
+    'ymail.com': 'yahoo',
+}
+
+# Conservative defaults per provider group; anything else uses DOMAIN_DEFAULT_*
+DEFAULT_DOMAIN_LIMITS = {
+    'gmail': {'concurrency': 2, 'rate': 5.0},
+    'microsoft': {'concurrency': 1, 'rate': 2.0},
+    'yahoo': {'concurrency': 1, 'rate': 2.0},
+}
+
+
+def domain_key(email):
+    """Return the scheduling bucket for an address (provider group or domain)."""
+    domain = email.rsplit('@', 1)[-1].strip().lower()
+    return DOMAIN_GROUPS.get(domain, domain)
+
+
+def load_domain_limits(config):
+    """
+    Merge DEFAULT_DOMAIN_LIMITS with the DOMAIN_LIMITS setting, a JSON object
+    (or dict) like {"gmail": {"concurrency": 3, "rate": 10}, "example.com": {"rate": 1}}.
+    """
+    limits = {key: dict(value) for key, value in DEFAULT_DOMAIN_LIMITS.items()}
+    overrides = config.get('DOMAIN_LIMITS') or {}
+    if isinstance(overrides, str):
+        overrides = json.loads(overrides)
+    for key, value in overrides.items():
+        limits.setdefault(key.lower(), {}).update(value)
+    return limits
+
+
+def send_by_domain(app, campaign_id, sender_email, sender_password):
+    """
+    Send a campaign's pending recipients grouped by destination domain.
+    Requires an app context (called from send_async).
+    """
+    from .sender import build_campaign_template, is_personalized, iter_pending_recipients
+    from .suppression import get_suppressions, is_hard_bounce, mark_bounced, mark_suppressed
+
+    config = app.config
+    campaign = Campaign.query.get(campaign_id)
+    track_opens = config.get('TRACK_OPENS', True)
+    personalized = is_personalized(campaign.body_content, track_opens)
+    limits = load_domain_limits(config)
+    default_concurrency = int(config.get('DOMAIN_DEFAULT_CONCURRENCY', 2))
+    default_rate = float(config.get('DOMAIN_DEFAULT_RATE', 0)) or float(config.get('SEND_RATE_INITIAL', 1.0))
+    batch_size = int(config.get('DOMAIN_BATCH_SIZE', 50))
+    max_workers = int(config.get('DOMAIN_WORKERS', 8))
+    max_retries = int(config.get('SEND_MAX_RETRIES', 5))
+    chunk_size = int(config.get('SEND_CHUNK_SIZE', 1000))
+    base_url = config['TRACKING_BASE_URL']
+
+    template = build_campaign_template(sender_email, campaign.subject, campaign.body_content, base_url, track_opens)
+    signer = get_signer(app)
+    # A batch size of 0 (or none) means no pauses, as in the serial sender
+    pause_every = campaign.batch_size or float('inf')
+    pause_minutes = campaign.batch_delay or 0
+
+    suppressions = get_suppressions(app)
+    SEND_QUEUE_DEPTH.set(
+        Recipient.query.filter_by(campaign_id=campaign_id, status='Pending').count(), campaign=campaign_id
+    )
+
+    def concurrency(key):
+        return int(limits.get(key, {}).get('concurrency', default_concurrency))
+
+    queues = {}       # domain key -> deque of (attempt, batch)
+    controllers = {}
+    busy = {}
+    queued = 0        # recipients waiting in queues
+
+    def enqueue(chunk):
+        """
+        Add one chunk of pending recipients to their domain queues, leaving
+        out suppressed addresses and domains capped at zero concurrency
+        (those stay Pending for a restart).
+        """
+        nonlocal queued
+        suppressed = []
+        for recipient_id, email in chunk:
+            if email in suppressions:
+                suppressed.append(recipient_id)
+                continue
+            key = domain_key(email)
+            if concurrency(key) <= 0:
+                continue
+            if key not in queues:
+                queues[key] = deque()
+                controllers[key] = new_controller(key)
+                busy[key] = 0
+            queue = queues[key]
+            # Only fill fresh batches; a retried batch at the tail keeps its own attempt count
+            if not queue or queue[-1][0] or len(queue[-1][1]) >= batch_size:
+                queue.append((0, []))
+            queue[-1][1].append((recipient_id, email))
+            queued += 1
+        if suppressed:
+            mark_suppressed(suppressed)
+            SEND_QUEUE_DEPTH.dec(len(suppressed), campaign=campaign_id)
+        # Don't keep a read transaction open while the batches are sent
+        db.session.commit()
+
+    def new_controller(key):
+        limit = limits.get(key, {})
+        rate = float(limit.get('rate', default_rate))
+        return AdaptiveRateController(
+            initial_rate=rate,
+            min_rate=float(config.get('SEND_RATE_MIN', 0.1)),
+            max_rate=float(limit.get('max_rate', max(rate, float(config.get('SEND_RATE_MAX', 10.0))))),
+            step=float(config.get('SEND_RATE_STEP', 0.1)),
+            backoff_base=float(config.get('SEND_BACKOFF_BASE', 2.0)),
+            backoff_max=float(config.get('SEND_BACKOFF_MAX', 300.0)),
+        )
+
+    def send_batch(key, attempt, batch):
+        """
+        Send one same-domain batch over its own connection. `attempt` counts
+        earlier tries of these recipients; returns the recipients to retry.
+        """
+        from .sender import deliver_with_retries
+
+        controller = controllers[key]
+        statuses = {}
+        bounced = {}
+        retry = []
+        with app.app_context():
+            transport = get_transport(sender_email, sender_password, config)
+            try:
+                if personalized:
+                    for recipient_id, email in batch:
+                        msg = template.render(email, token=signer.sign(recipient_id, campaign_id))
+                        sent, error = deliver_with_retries(transport, controller, sender_email, [email], msg, max_retries)
+                        if not sent:
+                            logger.warning("Failed to send to %s: %s", email, error)
+                            if is_hard_bounce(error):
+                                bounced[recipient_id] = email
+                        statuses[recipient_id] = 'Sent' if sent else 'Failed'
+                else:
+                    # Identical content: one transaction, many RCPT TO. Refused addresses
+                    # (some, or all of them) are handled one by one by their reply code
+                    msg = template.render('undisclosed-recipients:;')
+                    emails = [email for _, email in batch]
+                    sent, result = deliver_with_retries(transport, controller, sender_email, emails, msg, max_retries,
+                                                        retry_refused=False)
+                    if sent:
+                        refused = result if isinstance(result, dict) else {}
+                    elif isinstance(result, smtplib.SMTPRecipientsRefused):
+                        refused = result.recipients
+                    else:
+                        refused = None
+                        logger.warning("Failed to send batch to %s: %s", key, result)
+                    for recipient_id, email in batch:
+                        if refused is None:
+                            statuses[recipient_id] = 'Failed'
+                        elif email not in refused:
+                            statuses[recipient_id] = 'Sent'
+                        elif 400 <= refused[email][0] < 500 and attempt < max_retries:
+                            retry.append((recipient_id, email))
+                        else:
+                            statuses[recipient_id] = 'Failed'
+                            if is_hard_bounce(refused[email]):
+                                bounced[recipient_id] = email
+                    if refused and any(code in THROTTLE_CODES for code, _ in refused.values()):
+                        controller.on_throttle()
+            finally:
+                transport.close()
+
+            now = datetime.now()
+            sent_ids = [rid for rid, status in statuses.items() if status == 'Sent']
+            failed_ids = [rid for rid, status in statuses.items() if status == 'Failed' and rid not in bounced]
+            if sent_ids:
+                Recipient.query.filter(Recipient.id.in_(sent_ids)).update(
+                    {'status': 'Sent', 'sent_at': now}, synchronize_session=False)
+            if failed_ids:
+                Recipient.query.filter(Recipient.id.in_(failed_ids)).update(
+                    {'status': 'Failed'}, synchronize_session=False)
+            if bounced:
+                mark_bounced(list(bounced), bounced.values(), 'Refused by the receiving server')
+            db.session.commit()
+            db.session.remove()
+
+        MESSAGES_SENT.inc(len(sent_ids), campaign=campaign_id)
+        MESSAGES_FAILED.inc(len(failed_ids) + len(bounced), campaign=campaign_id)
+        SEND_QUEUE_DEPTH.dec(len(batch) - len(retry), campaign=campaign_id)
+        SEND_RATE.set(controller.rate, campaign=campaign_id)
+        return retry
+
+    pending = iter_pending_recipients(campaign_id, chunk_size)
+    exhausted = False
+    in_flight = {}  # future -> (domain key, attempt)
+    since_pause = 0
+    # Recipients refused with a 4xx wait here until their backoff ends: (ready time, seq, key, attempt, batch)
+    delayed = []
+    sequence = itertools.count()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            # Top the domain queues up to one chunk; retried recipients are behind the keyset
+            while not exhausted and queued < chunk_size:
+                chunk = next(pending, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    enqueue(chunk)
+            if not (queued or in_flight or delayed):
+                break
+
+            # Campaign batch pause: drain in-flight work, then wait (never after the last batch)
+            if since_pause >= pause_every and not in_flight:
+                logger.info("Batch limit of %s reached. Pausing for %s minutes.", pause_every, pause_minutes)
+                time.sleep(pause_minutes * 60)
+                since_pause = 0
+
+            # Retries whose backoff has ended go first in their domain's queue
+            while delayed and delayed[0][0] <= time.monotonic():
+                _, _, key, attempt, batch = heapq.heappop(delayed)
+                queues[key].appendleft((attempt, batch))
+                queued += len(batch)
+
+            # Fill free slots round-robin across domains that are under their cap
+            submitted = True
+            while submitted and len(in_flight) < max_workers and since_pause < pause_every:
+                submitted = False
+                for key, queue in queues.items():
+                    if queue and busy[key] < concurrency(key) and len(in_flight) < max_workers:
+                        attempt, batch = queue.popleft()
+                        queued -= len(batch)
+                        in_flight[pool.submit(send_batch, key, attempt, batch)] = (key, attempt)
+                        busy[key] += 1
+                        since_pause += len(batch)
+                        submitted = True
+
+            if not in_flight:
+                if delayed:
+                    time.sleep(max(delayed[0][0] - time.monotonic(), 0))
+                    continue
+                break
+
+            timeout = max(delayed[0][0] - time.monotonic(), 0) if delayed else None
+            done, _ = wait(list(in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, attempt = in_flight.pop(future)
+                busy[key] -= 1
+                retry = future.result()
+                if retry:
+                    ready = time.monotonic() + controllers[key].backoff(attempt + 1)
+                    heapq.heappush(delayed, (ready, next(sequence), key, attempt + 1, retry))
+
+    # Domains capped at zero concurrency were never queued and stay Pending for a restart
+    campaign = Campaign.query.get(campaign_id)
+    remaining = Recipient.query.filter_by(campaign_id=campaign_id, status='Pending').count()
+    campaign.status = 'Paused' if remaining else 'Completed'
+    db.session.commit()
@@ -0,0 +1,186 @@
+"""
+Engagement Time Series
+
+Per-campaign event counts per hour are kept in EngagementRollup and
+updated incrementally: each run aggregates only the tracking events with
+an id above the stored watermark (RollupState 'engagement') and adds
+them to the hourly rows. Daily series are summed from the hourly rows, so
+the analytics endpoint never scans raw TrackingEvent rows.
+
+Events newer than SETTLE_SECONDS are left for the next run, so rows from
+transactions that commit slightly out of id order are not skipped.
+
+Every gunicorn worker runs the update, so each run locks the watermark row
+(see _lock_state) before reading it: a concurrent run in another process
+waits and then starts from the advanced watermark instead of counting the
+same events twice.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Recipient, TrackingEvent, EngagementRollup, RollupState
+
+WATERMARK = 'engagement'
+SETTLE_SECONDS = 60
+SERIES_TYPES = ('open', 'replied')
+
+_update_lock = threading.Lock()
+
+
+def _hour_bucket(column):
+    """SQL expression truncating a timestamp to the hour."""
+    if db.engine.name == 'postgresql':
+        return func.date_trunc('hour', column)
+    return func.strftime('%Y-%m-%d %H:00:00', column)
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _lock_state():
+    """
+    Lock the watermark row for the rest of the transaction and read it.
+
+    The row is written first (a no-op update), which takes the row lock on
+    PostgreSQL and the database write lock on SQLite, so the watermark read
+    afterwards is the latest committed one and no other process can move
+    it until this transaction ends.
+    """
+    while True:
+        locked = db.session.execute(db.update(RollupState).where(RollupState.name == WATERMARK).values(
+            last_event_id=RollupState.last_event_id)).rowcount
+        if locked:
+            return db.session.query(RollupState).filter_by(name=WATERMARK).populate_existing().one()
+        try:
+            db.session.add(RollupState(name=WATERMARK, last_event_id=0, updated_at=None))
+            db.session.commit()
+        except IntegrityError:
+            # Another process created it first
+            db.session.rollback()
+
+
+def update_rollups(now=None):
+    """
+    Add tracking events newer than the watermark to the hourly rollups.
+
+    Returns:
+        int: Number of events aggregated, or None if another update is running
+    """
+    if not _update_lock.acquire(blocking=False):
+        return None
+    try:
+        now = now or datetime.now()
+        db.session.commit()  # Start a fresh transaction for the lock
+        state = _lock_state()
+
+        upto = db.session.query(func.max(TrackingEvent.id)).filter(
+            TrackingEvent.id > state.last_event_id,
+            TrackingEvent.timestamp < now - timedelta(seconds=SETTLE_SECONDS)
+        ).scalar()
+        if upto is None:
+            state.updated_at = now
+            db.session.commit()
+            return 0
+
+        bucket = _hour_bucket(TrackingEvent.timestamp)
+        rows = db.session.query(
+            Recipient.campaign_id, bucket, TrackingEvent.type, func.count(TrackingEvent.id)
+        ).join(Recipient, Recipient.id == TrackingEvent.recipient_id).filter(
+            TrackingEvent.id > state.last_event_id,
+            TrackingEvent.id <= upto
+        ).group_by(Recipient.campaign_id, bucket, TrackingEvent.type).all()
+
+        rows = [(campaign_id, _as_datetime(hour), event_type, count) for campaign_id, hour, event_type, count in rows]
+        if rows:
+            campaign_ids = {row[0] for row in rows}
+            earliest = min(row[1] for row in rows)
+            existing = {
+                (rollup.campaign_id, rollup.bucket, rollup.type): rollup
+                for rollup in EngagementRollup.query.filter(
+                    EngagementRollup.campaign_id.in_(campaign_ids),
+                    EngagementRollup.bucket >= earliest
+                )
+            }
+            for campaign_id, hour, event_type, count in rows:
+                rollup = existing.get((campaign_id, hour, event_type))
+                if rollup:
+                    rollup.count += count
+                else:
+                    rollup = EngagementRollup(campaign_id=campaign_id, bucket=hour, type=event_type, count=count)
+                    db.session.add(rollup)
+                    existing[(campaign_id, hour, event_type)] = rollup
+
+        state.last_event_id = upto
+        state.updated_at = now
+        db.session.commit()
+        return sum(row[3] for row in rows)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        _update_lock.release()
+
+
+def refresh_if_stale(max_age_minutes):
+    """Run update_rollups() if the last update is older than max_age_minutes."""
+    state = db.session.get(RollupState, WATERMARK)
+    if state is None or state.updated_at is None or \
+            state.updated_at < datetime.now() - timedelta(minutes=max_age_minutes):
+        update_rollups()
+
+
+def campaign_series(campaign_id, bucket='hour', start=None, end=None, types=SERIES_TYPES):
+    """
+    Build a campaign's engagement time series from the rollups.
+
+    Args:
+        campaign_id: Campaign to report on
+        bucket: 'hour' or 'day'
+        start, end: Optional datetime bounds (inclusive start, exclusive end)
+        types: Event types to include
+
+    Returns:
+        dict: {'bucket', 'series': [{'time', <type>: count, ...}], 'totals'}
+    """
+    query = EngagementRollup.query.filter(
+        EngagementRollup.campaign_id == campaign_id,
+        EngagementRollup.type.in_(types)
+    )
+    if start:
+        query = query.filter(EngagementRollup.bucket >= start)
+    if end:
+        query = query.filter(EngagementRollup.bucket < end)
+
+    points = OrderedDict()
+    totals = {event_type: 0 for event_type in types}
+    for rollup in query.order_by(EngagementRollup.bucket):
+        key = rollup.bucket if bucket == 'hour' else rollup.bucket.replace(hour=0)
+        point = points.setdefault(key, {event_type: 0 for event_type in types})
+        point[rollup.type] += rollup.count
+        totals[rollup.type] += rollup.count
+
+    fmt = '%Y-%m-%dT%H:00' if bucket == 'hour' else '%Y-%m-%d'
+    return {
+        'bucket': bucket,
+        'series': [dict(time=key.strftime(fmt), **counts) for key, counts in points.items()],
+        'totals': totals,
+    }
+
+
+def run_update(app):
+    """Scheduler job wrapper."""
+    with app.app_context():
+        try:
+            count = update_rollups()
+            if count:
+                print(f"📈 Engagement rollups: {count} events aggregated")
+        except Exception as e:
+            print(f"❌ Engagement rollup failed: {e}")
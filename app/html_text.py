@@ -0,0 +1,102 @@
+"""
+HTML to Plain Text
+
+Builds the text/plain alternative sent next to every HTML email. The
+conversion runs once per distinct HTML source (a campaign body or the
+birthday template) and is cached, so per-recipient personalization is
+applied to the cached text rather than converting again for every message.
+Slot markers and {{ placeholders }} pass through unchanged.
+"""
+
+import re
+from functools import lru_cache
+from html.parser import HTMLParser
+
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'div', 'dl', 'dt', 'dd', 'fieldset',
+    'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr',
+    'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'tr', 'ul',
+}
+SKIP_TAGS = {'head', 'script', 'style', 'title', 'noscript'}
+
+_SPACES = re.compile(r'[ \t\r\n\f\v]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+_RUN_OF_SPACES = re.compile(r' {2,}')
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+        self.links = []
+
+    def newline(self, count=1):
+        self.parts.append('\n' * count)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth:
+            return
+        attrs = dict(attrs)
+        if tag == 'br':
+            self.newline()
+        elif tag in BLOCK_TAGS:
+            self.newline(2 if tag in ('p', 'h1', 'h2', 'h3', 'table', 'hr') else 1)
+            if tag == 'li':
+                self.parts.append('- ')
+            elif tag == 'hr':
+                self.parts.append('-' * 20)
+                self.newline()
+        elif tag == 'a':
+            self.links.append((attrs.get('href') or '', len(self.parts)))
+        elif tag == 'img' and attrs.get('alt'):
+            self.parts.append(attrs['alt'])
+        elif tag in ('td', 'th'):
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if self.skip_depth:
+            return
+        if tag in BLOCK_TAGS and tag != 'li':
+            self.newline(2 if tag in ('p', 'h1', 'h2', 'h3', 'table') else 1)
+        elif tag == 'a' and self.links:
+            href, start = self.links.pop()
+            label = _SPACES.sub(' ', ''.join(self.parts[start:])).strip()
+            if href and not href.startswith(('#', 'mailto:')) and href != label:
+                if len(self.parts) > start:
+                    self.parts[-1] = self.parts[-1].rstrip(' ')
+                self.parts.append(f' ({href})')
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(_SPACES.sub(' ', data))
+
+    def text(self):
+        lines = [_RUN_OF_SPACES.sub(' ', line).strip() for line in ''.join(self.parts).split('\n')]
+        return _BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip() + '\n'
+
+
+@lru_cache(maxsize=64)
+def html_to_text(html):
+    """
+    Convert an HTML email body to readable plain text.
+
+    Links are kept as "label (url)", images by their alt text, and block
+    elements become line breaks. Results are cached per HTML string.
+
+    Args:
+        html: HTML source (may contain personalization placeholders)
+
+    Returns:
+        str: Plain text ending with a newline
+    """
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
@@ -0,0 +1,240 @@
+"""
+Metrics Module
+
+Small in-process metrics registry rendered in the Prometheus text
+exposition format at /metrics. Counters, gauges and histograms are
+thread-safe so the background sender, the scheduler and request handlers
+can all record into them.
+
+Values are per process: with several gunicorn workers, scrape each worker
+or run one worker per metrics target.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def collect(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def remove(self, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values.pop(key, None)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def collect(self):
+        with self.lock:
+            items = sorted((key, {'buckets': list(s['buckets']), 'sum': s['sum'], 'count': s['count']})
+                           for key, s in self.series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['buckets']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series["sum"])}')
+            lines.append(f'{self.name}_count{labels} {series["count"]}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# --- Sending path ---
+SMTP_CONNECT_SECONDS = registry.register(Histogram(
+    'email_smtp_connect_seconds', 'Time to open a TCP connection to the SMTP server', ['transport']))
+SMTP_LOGIN_SECONDS = registry.register(Histogram(
+    'email_smtp_login_seconds', 'Time spent in STARTTLS and AUTH', ['transport']))
+SMTP_SEND_SECONDS = registry.register(Histogram(
+    'email_smtp_send_seconds', 'Time to hand one message to the mail transport', ['transport']))
+MESSAGES_SENT = registry.register(Counter(
+    'email_messages_sent_total', 'Messages accepted by the mail transport', ['campaign']))
+MESSAGES_FAILED = registry.register(Counter(
+    'email_messages_failed_total', 'Messages that could not be sent', ['campaign']))
+SEND_QUEUE_DEPTH = registry.register(Gauge(
+    'email_send_queue_depth', 'Recipients still waiting to be sent', ['campaign']))
+SEND_RATE = registry.register(Gauge(
+    'email_send_rate', 'Current adaptive send rate in messages per second', ['campaign']))
+SEND_RETRIES = registry.register(Counter(
+    'email_send_retries_total', 'Send attempts retried, by failure kind', ['reason']))
+
+# --- Database ---
+DB_COMMIT_SECONDS = registry.register(Histogram(
+    'email_db_commit_seconds', 'Duration of session commits, including the flush'))
+
+# --- Tracking and jobs ---
+TRACKING_EVENTS = registry.register(Counter(
+    'email_tracking_events_total', 'Tracking events ingested', ['type']))
+TRACKING_REJECTED = registry.register(Counter(
+    'email_tracking_rejected_total', 'Tracking hits with an invalid or disallowed token', ['type']))
+WEBHOOK_EVENTS = registry.register(Counter(
+    'email_webhook_events_total', 'Provider webhook events accepted for ingestion', ['provider', 'type']))
+BIRTHDAY_RUN_SECONDS = registry.register(Histogram(
+    'email_birthday_run_seconds', 'Duration of the daily birthday job',
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)))
+BIRTHDAY_EMAILS = registry.register(Counter(
+    'email_birthday_emails_total', 'Planned birthday emails handled by the dispatcher', ['status']))
+BIRTHDAY_PENDING = registry.register(Gauge(
+    'email_birthday_pending', 'Planned birthday emails not yet sent'))
+
+# --- HTTP ---
+REQUEST_SECONDS = registry.register(Histogram(
+    'email_http_request_seconds', 'Request latency per route', ['endpoint', 'method', 'status']))
+
+
+def _start_commit_timer(session):
+    session.info['_metrics_commit_started'] = time.perf_counter()
+
+
+def _observe_commit(session):
+    started = session.info.pop('_metrics_commit_started', None)
+    if started is not None:
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def init_app(app, db):
+    """
+    Hook request latency and DB commit timing into the app.
+    """
+    from flask import g, request
+    from sqlalchemy import event
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                endpoint=request.endpoint or 'unmatched',
+                method=request.method,
+                status=response.status_code
+            )
+        return response
+
+    # The session is shared by every app instance, so only listen once
+    if not event.contains(db.session, 'before_commit', _start_commit_timer):
+        event.listen(db.session, 'before_commit', _start_commit_timer)
+        event.listen(db.session, 'after_commit', _observe_commit)
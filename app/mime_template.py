@@ -0,0 +1,148 @@
+"""
+Precomputed MIME Messages
+
+Building a MIMEMultipart per recipient and calling as_string() re-encodes
+the whole HTML body for every message. A MessageTemplate serializes the
+invariant parts once per campaign (headers, boundaries and the
+quoted-printable encoded static body chunks) and only splices in the
+per-recipient pieces (To header and slot values such as the tracking
+token in tracking URLs) as bytes.
+
+Slots are marked in the source HTML (and optional plain-text part) with
+slot('name'), e.g.:
+
+    html = build_campaign_html(body, slot('token'), base_url)
+    template = MessageTemplate(sender_email, subject, html)
+    data = template.render('someone@example.com', token=signer.sign(42, 7))
+
+Each static chunk is encoded on its own and ends with a soft line break,
+so the decoded body is exactly the concatenation of chunks and values and
+no encoded line exceeds 76 characters.
+"""
+
+import re
+import uuid
+from email import policy, quoprimime
+from email.header import Header
+
+_SLOT_RE = re.compile('\x00([A-Za-z_][A-Za-z0-9_]*)\x00')
+_SOFT_BREAK = b'=\r\n'
+_MAX_PLAIN_HEADER = 72
+_MAX_HEADER_LINE = 78
+# Address headers are folded by the header registry, which encodes only display names
+_ADDRESS_HEADERS = {'from', 'to', 'cc', 'reply-to', 'sender'}
+_ADDRESS_POLICY = policy.SMTP.clone(refold_source='all')
+
+
+def slot(name):
+    """Return the placeholder marking a per-recipient value in template source."""
+    return f'\x00{name}\x00'
+
+
+def _qp_encode(text):
+    """Quoted-printable encode text as UTF-8, ending on a line break."""
+    encoded = quoprimime.body_encode(text.encode('utf-8').decode('latin-1'), eol='\r\n').encode('ascii')
+    if not encoded.endswith(b'\r\n'):
+        encoded += _SOFT_BREAK
+    return encoded
+
+
+def _header(name, value):
+    """
+    Serialize one header line, RFC 2047 encoding/folding only when needed.
+    Unstructured values (e.g. Subject) go through email.header, which keeps
+    the space between words inside the encoded words, so a long non-ASCII
+    value decodes back exactly (policy folding drops it at the fold).
+    """
+    value = ' '.join(value.splitlines())
+    if value.isascii() and len(name) + len(value) < _MAX_PLAIN_HEADER:
+        return f'{name}: {value}\r\n'.encode('ascii')
+    if name.lower() in _ADDRESS_HEADERS:
+        return _ADDRESS_POLICY.fold(name, value).encode('ascii')
+    folded = Header(value, 'us-ascii' if value.isascii() else 'utf-8', header_name=name).encode(
+        linesep='\r\n', maxlinelen=_MAX_HEADER_LINE)
+    return f'{name}: {folded}\r\n'.encode('ascii')
+
+
+class MessageTemplate:
+    """
+    A multipart/alternative message serialized once, rendered per recipient.
+
+    Args:
+        sender_email: From address
+        subject: Subject line
+        html: HTML body, optionally containing slot() markers
+        text: Optional plain-text alternative, with the same slots
+        headers: Optional extra (name, value) headers; values may contain slots
+    """
+
+    def __init__(self, sender_email, subject, html, text=None, headers=None):
+        self.boundary = f'=_{uuid.uuid4().hex}'
+        self.head = b''.join([
+            f'Content-Type: multipart/alternative; boundary="{self.boundary}"\r\n'.encode('ascii'),
+            b'MIME-Version: 1.0\r\n',
+            _header('Subject', subject or ''),
+            _header('From', sender_email),
+        ])
+        self.slots = set()
+        # Headers with slots are filled in per recipient, the rest are static
+        self.slot_headers = []
+        for name, value in headers or []:
+            pieces = _SLOT_RE.split(value)
+            if len(pieces) == 1:
+                self.head += _header(name, value)
+            else:
+                self.slots.update(pieces[1::2])
+                self.slot_headers.append((name, pieces))
+        self.body = [b'\r\n']
+        if text is not None:
+            self._add_part('text/plain', text)
+        self._add_part('text/html', html)
+        self.body.append(f'--{self.boundary}--\r\n'.encode('ascii'))
+        self._compact()
+
+    def _add_part(self, content_type, source):
+        self.body.append(b''.join([
+            f'--{self.boundary}\r\n'.encode('ascii'),
+            f'Content-Type: {content_type}; charset="utf-8"\r\n'.encode('ascii'),
+            b'Content-Transfer-Encoding: quoted-printable\r\n',
+            b'\r\n',
+        ]))
+        # re.split with a group alternates static text and slot names
+        for index, piece in enumerate(_SLOT_RE.split(source)):
+            if index % 2:
+                self.slots.add(piece)
+                self.body.append(piece)
+            elif piece:
+                self.body.append(_qp_encode(piece))
+        # Line break before the next boundary belongs to the delimiter
+        self.body.append(b'\r\n')
+
+    def _compact(self):
+        """Merge adjacent static chunks so render() joins as few pieces as possible."""
+        merged = []
+        for piece in self.body:
+            if merged and isinstance(piece, bytes) and isinstance(merged[-1], bytes):
+                merged[-1] += piece
+            else:
+                merged.append(piece)
+        self.body = merged
+
+    def render(self, to_email, **values):
+        """
+        Return the full message for one recipient as bytes.
+
+        Args:
+            to_email: To header value
+            **values: One value per slot in the template
+
+        Raises:
+            KeyError: If a slot has no value
+        """
+        pieces = [self.head, _header('To', to_email)]
+        for name, parts in self.slot_headers:
+            value = ''.join(str(values[part]) if index % 2 else part for index, part in enumerate(parts))
+            pieces.append(_header(name, value))
+        for piece in self.body:
+            pieces.append(piece if isinstance(piece, bytes) else _qp_encode(str(values[piece])))
+        return b''.join(pieces)
@@ -1,6 +1,13 @@
 from datetime import datetime, date
 from app import db
 
+# Sender accounts a campaign is sharded across (optional; empty means the campaign's own sender)
+campaign_sender = db.Table(
+    'campaign_sender',
+    db.Column('campaign_id', db.Integer, db.ForeignKey('campaign.id'), primary_key=True),
+    db.Column('sender_account_id', db.Integer, db.ForeignKey('sender_account.id'), primary_key=True)
+)
+
 class Campaign(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -13,11 +20,19 @@ class Campaign(db.Model):
     sender_password = db.Column(db.String(255), nullable=True)
     batch_size = db.Column(db.Integer, default=50)
     batch_delay = db.Column(db.Integer, default=5) # Delay in minutes
+    timezone = db.Column(db.String(64), nullable=True)  # IANA zone for members' birthday emails without their own
     
     # Relationships
     recipients = db.relationship('Recipient', backref='campaign', lazy=True, cascade="all, delete-orphan")
+    sender_accounts = db.relationship('SenderAccount', secondary=campaign_sender, lazy=True)
+    rollups = db.relationship('TrackingRollup', backref='campaign', lazy=True, cascade="all, delete-orphan")
+    engagement_rollups = db.relationship('EngagementRollup', lazy=True, cascade="all, delete-orphan")
+    archive = db.relationship('CampaignArchive', uselist=False, lazy=True, cascade="all, delete-orphan")
 
     def to_dict(self):
+        if self.archive:
+            return dict(self.archive.summary(), id=self.id, name=self.name, subject=self.subject, status=self.status,
+                        created_at=self.created_at.strftime('%Y-%m-%d %H:%M'))
         return {
             'id': self.id,
             'name': self.name,
@@ -26,24 +41,194 @@ class Campaign(db.Model):
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M'),
             'total_recipients': len(self.recipients),
             'sent_count': sum(1 for r in self.recipients if r.status == 'Sent'),
-            'open_count': sum(1 for r in self.recipients if any(e.type == 'open' for e in r.events)),
-            'replied_count': sum(1 for r in self.recipients if any(e.type == 'replied' for e in r.events))
+            'open_count': sum(1 for r in self.recipients if any(e.type == 'open' for e in r.events)) + self.rolled_up('open'),
+            'replied_count': sum(1 for r in self.recipients if any(e.type == 'replied' for e in r.events)) + self.rolled_up('replied')
         }
 
-class Recipient(db.Model):
+    def rolled_up(self, event_type):
+        """Count of events of this type already moved into daily rollups by retention."""
+        return sum(rollup.count for rollup in self.rollups if rollup.type == event_type)
+
+class SenderAccount(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), nullable=False)
-    email = db.Column(db.String(120), nullable=False)
+    email = db.Column(db.String(120), nullable=False, unique=True)
+    password = db.Column(db.String(255), nullable=False)
+    daily_quota = db.Column(db.Integer, nullable=True)  # Max messages per day, None = unlimited
+    rate_limit = db.Column(db.Float, nullable=True)  # Max messages per second, None = global SEND_RATE_MAX
+    status = db.Column(db.String(20), default='Active')  # Active, Disabled (e.g. bad credentials)
+    sent_today = db.Column(db.Integer, default=0)
+    quota_date = db.Column(db.Date, nullable=True)  # Day sent_today refers to
+    consecutive_failures = db.Column(db.Integer, default=0)
+    cooldown_until = db.Column(db.DateTime, nullable=True)  # Unhealthy until this time
+    last_error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    def remaining_quota(self, today=None):
+        """Messages this account may still send today (None = unlimited)."""
+        if self.daily_quota is None:
+            return None
+        today = today or date.today()
+        used = self.sent_today if self.quota_date == today else 0
+        return max(self.daily_quota - (used or 0), 0)
+
+    def is_healthy(self, now=None):
+        now = now or datetime.now()
+        if self.status != 'Active':
+            return False
+        return self.cooldown_until is None or self.cooldown_until <= now
+
+class Contact(db.Model):
+    """
+    One person, stored once and shared by every campaign they receive.
+    Emails are normalized (see app/contacts.py) so repeat imports match.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), nullable=False, unique=True)
     name = db.Column(db.String(100), nullable=True)  # Recipient name for personalization
     dob = db.Column(db.Date, nullable=True)  # Date of birth for birthday wishes
-    status = db.Column(db.String(20), default='Pending')  # Pending, Sent, Failed, Bounced
+    timezone = db.Column(db.String(64), nullable=True)  # IANA zone, e.g. Europe/Berlin; birthday emails go at local time
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+class BirthdaySchedule(db.Model):
+    """
+    A birthday email planned for one contact's local birthday, sent by the
+    dispatcher once send_at (server time) has passed (see app/birthday_scheduler.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    contact_id = db.Column(db.Integer, db.ForeignKey('contact.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)  # The birthday in the contact's timezone
+    timezone = db.Column(db.String(64), nullable=True)  # None = server time
+    send_at = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='Pending')  # Pending, Sending, Sent, Failed, Skipped, Missed
+    sent_at = db.Column(db.DateTime, nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)  # When a dispatcher moved it to Sending
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    contact = db.relationship('Contact', lazy='joined', innerjoin=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('contact_id', 'day', name='uq_birthday_schedule_contact_day'),
+        db.Index('ix_birthday_schedule_status_send_at', 'status', 'send_at'),
+    )
+
+class Suppression(db.Model):
+    """
+    An address that must not be mailed again: hard bounce, spam complaint
+    or unsubscribe. Applies to every campaign and the birthday job.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), nullable=False, unique=True)  # Normalized like Contact.email
+    reason = db.Column(db.String(20), nullable=False)  # bounce, complaint, unsubscribe
+    detail = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+class Recipient(db.Model):
+    """
+    A contact's membership in one campaign, with its delivery status.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), nullable=False)
+    contact_id = db.Column(db.Integer, db.ForeignKey('contact.id'), nullable=False)
+    status = db.Column(db.String(20), default='Pending')  # Pending, Sent, Failed, Bounced, Suppressed
     sent_at = db.Column(db.DateTime, nullable=True)
     
     # Relationships
+    contact = db.relationship('Contact', backref=db.backref('memberships', lazy=True), lazy='joined', innerjoin=True)
     events = db.relationship('TrackingEvent', backref='recipient', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_recipient_campaign_contact', 'campaign_id', 'contact_id'),
+        db.Index('ix_recipient_contact', 'contact_id'),
+    )
+
+    @property
+    def email(self):
+        return self.contact.email
+
+    @property
+    def name(self):
+        return self.contact.name
+
+    @property
+    def dob(self):
+        return self.contact.dob
+
 class TrackingEvent(db.Model):
+    # On PostgreSQL this table is partitioned by month (see app/tracking_storage.py)
     id = db.Column(db.Integer, primary_key=True)
     recipient_id = db.Column(db.Integer, db.ForeignKey('recipient.id'), nullable=False)
     type = db.Column(db.String(20), nullable=False)  # open, click
-    timestamp = db.Column(db.DateTime, default=datetime.now)
+    timestamp = db.Column(db.DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_tracking_event_recipient_type', 'recipient_id', 'type'),
+        db.Index('ix_tracking_event_timestamp', 'timestamp'),
+    )
+
+class TrackingRollup(db.Model):
+    """
+    Daily per-campaign event counts for raw events past the retention window.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    type = db.Column(db.String(20), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('campaign_id', 'day', 'type', name='uq_tracking_rollup_campaign_day_type'),
+    )
+
+class CampaignArchive(db.Model):
+    """
+    Summary of a campaign whose recipients and tracking events were moved
+    to Parquet files (see app/archive.py).
+    """
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), primary_key=True)
+    path = db.Column(db.String(500), nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.now)
+    recipients = db.Column(db.Integer, nullable=False, default=0)
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    opened = db.Column(db.Integer, nullable=False, default=0)
+    replied = db.Column(db.Integer, nullable=False, default=0)
+    events = db.Column(db.Integer, nullable=False, default=0)
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+
+    def summary(self):
+        return {
+            'total_recipients': self.recipients,
+            'sent_count': self.sent,
+            'open_count': self.opened,
+            'replied_count': self.replied,
+        }
+
+class EngagementRollup(db.Model):
+    """
+    Hourly per-campaign event counts for the engagement time series (see app/engagement.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign.id'), nullable=False)
+    bucket = db.Column(db.DateTime, nullable=False)  # Start of the hour
+    type = db.Column(db.String(20), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('campaign_id', 'bucket', 'type', name='uq_engagement_rollup_campaign_bucket_type'),
+    )
+
+class AppSetting(db.Model):
+    """
+    A value recorded once by the migrate step and read at runtime, e.g. the
+    last recipient id before signed tracking tokens (see app/tracking.py).
+    """
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+class RollupState(db.Model):
+    """
+    Watermark of an incremental rollup: the last TrackingEvent id already aggregated.
+    """
+    name = db.Column(db.String(50), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,143 @@
+"""
+Adaptive Rate Control
+
+Classifies delivery errors by SMTP reply code and paces the send loop with
+an AIMD (additive increase, multiplicative decrease) controller:
+
+- Every accepted message nudges the rate up by `step / rate`, so the rate
+  grows by roughly `step` msgs/sec per second of clean sending.
+- A throttling reply (421, 450, 451, 452, 454 or HTTP 429) halves the rate.
+- Transient failures are retried with exponential backoff and full jitter;
+  permanent (5xx) failures are not retried.
+"""
+
+import random
+import smtplib
+import threading
+import time
+
+# Error kinds
+THROTTLED = 'throttled'      # provider asks us to slow down; retry later
+TRANSIENT = 'transient'      # temporary failure; retry
+CONNECTION = 'connection'    # connection dropped; reconnect and retry
+PERMANENT = 'permanent'      # will never succeed for this recipient
+FATAL = 'fatal'              # affects every message (e.g. bad credentials)
+
+THROTTLE_CODES = {421, 450, 451, 452, 454}
+
+
+def _smtp_code(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in exc.recipients.values()]
+        return min(codes) if codes else None
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code
+    # SendGrid / HTTP errors carry an HTTP status instead
+    status = getattr(exc, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(exc):
+    """
+    Map a send exception to an error kind.
+
+    Returns:
+        tuple: (kind, code) where code is the SMTP or HTTP status if known
+    """
+    if isinstance(exc, smtplib.SMTPAuthenticationError):
+        return FATAL, exc.smtp_code
+
+    code = _smtp_code(exc)
+
+    if code is not None:
+        if code >= 600 or code < 400:
+            # HTTP status from an API transport
+            if code == 429:
+                return THROTTLED, code
+            if code in (401, 403):
+                return FATAL, code
+            if code >= 500:
+                return TRANSIENT, code
+            return PERMANENT, code
+        if code in THROTTLE_CODES:
+            return THROTTLED, code
+        if 400 <= code < 500:
+            return TRANSIENT, code
+        return PERMANENT, code
+
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return CONNECTION, None
+    # SMTPException subclasses OSError but without a reply code it is a protocol
+    # problem on a live connection, not a dropped one: reconnecting would not help
+    if isinstance(exc, smtplib.SMTPNotSupportedError):
+        return PERMANENT, None
+    if isinstance(exc, smtplib.SMTPException):
+        return TRANSIENT, None
+
+    if isinstance(exc, (ConnectionError, TimeoutError, OSError)):
+        return CONNECTION, None
+
+    return PERMANENT, None
+
+
+class AdaptiveRateController:
+    """
+    Paces sends and adapts the rate to the provider's replies.
+
+    A rate <= 0 disables pacing (backoff on failures still applies).
+    """
+
+    def __init__(self, initial_rate=1.0, min_rate=0.1, max_rate=10.0, step=0.1,
+                 decrease_factor=0.5, backoff_base=2.0, backoff_max=300.0):
+        self.enabled = initial_rate > 0
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, initial_rate)
+        self.step = step
+        self.decrease_factor = decrease_factor
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            initial_rate=float(config.get('SEND_RATE_INITIAL', 1.0)),
+            min_rate=float(config.get('SEND_RATE_MIN', 0.1)),
+            max_rate=float(config.get('SEND_RATE_MAX', 10.0)),
+            step=float(config.get('SEND_RATE_STEP', 0.1)),
+            backoff_base=float(config.get('SEND_BACKOFF_BASE', 2.0)),
+            backoff_max=float(config.get('SEND_BACKOFF_MAX', 300.0)),
+        )
+
+    def wait(self):
+        """Block until the next send slot."""
+        if not self.enabled:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + 1.0 / self.rate
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_success(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.step / self.rate)
+
+    def on_throttle(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            # Drop any slots reserved at the old rate
+            self.next_slot = time.monotonic() + 1.0 / self.rate
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter for the given retry attempt (1-based)."""
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
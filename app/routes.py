@@ -1,14 +1,22 @@
-from flask import render_template, request, redirect, url_for, flash, session, Blueprint, current_app
+from flask import render_template, request, redirect, url_for, flash, session, Blueprint, current_app, jsonify, abort
 from . import db
-from .models import Campaign, Recipient, TrackingEvent
-from .utils import parse_recipient_file, parse_manual_emails
+from .models import Campaign, Contact, Recipient, TrackingEvent, SenderAccount
+from .contacts import add_recipients
+from .utils import parse_recipient_file, parse_manual_emails, parse_sender_accounts, parse_timezone, sniff_columns
+from .metrics import registry
+from .engagement import campaign_series, refresh_if_stale
+from . import archive
+from datetime import datetime
+from sqlalchemy import and_, func
+from sqlalchemy.orm import selectinload
 import os
-import pandas as pd
 import io
 from flask import send_file
 
 main_bp = Blueprint('main', __name__)
 
+RECIPIENTS_PER_PAGE = 100
+
 @main_bp.route('/')
 def home():
     if 'sender_email' not in session:
@@ -54,10 +62,10 @@ def dashboard():
     if query:
         # Search by Name, Subject, or Recipient Email
         search_filter = f"%{query}%"
-        campaigns = Campaign.query.outerjoin(Recipient).filter(
+        campaigns = Campaign.query.outerjoin(Recipient).outerjoin(Contact).filter(
             (Campaign.name.ilike(search_filter)) | 
             (Campaign.subject.ilike(search_filter)) |
-            (Recipient.email.ilike(search_filter))
+            (Contact.email.ilike(search_filter))
         ).distinct().order_by(Campaign.created_at.desc()).all()
     else:
         campaigns = Campaign.query.order_by(Campaign.created_at.desc()).all()
@@ -72,6 +80,24 @@ def new_campaign():
         
     return render_template('campaign_setup.html')
 
+@main_bp.route('/api/sniff-columns', methods=['POST'])
+def sniff_columns_api():
+    """
+    Columns, a few sample rows and suggested email/name/DOB mappings of an
+    uploaded recipient file, read from its first rows only.
+    """
+    if 'sender_email' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    file = request.files.get('recipient_file')
+    if not file or not file.filename:
+        return jsonify({'error': 'No file uploaded'}), 400
+
+    result, error = sniff_columns(file)
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(result)
+
 @main_bp.route('/campaign/create', methods=['POST'])
 def create_campaign():
     if 'sender_email' not in session:
@@ -135,6 +161,19 @@ def create_campaign():
         flash('No valid emails found.', 'warning')
         return redirect(url_for('main.new_campaign'))
 
+    # Optional pool of extra sender accounts to shard the campaign across
+    sender_accounts_data, error = parse_sender_accounts(request.form.get('sender_accounts', ''))
+    if error:
+        flash(f'Error in sender accounts: {error}', 'danger')
+        return redirect(url_for('main.new_campaign'))
+
+    # Birthday emails go at local time: a recipient's own timezone column wins over the campaign's
+    timezone_input = request.form.get('timezone', '').strip()
+    timezone = parse_timezone(timezone_input)
+    if timezone_input and timezone is None:
+        flash(f'Unknown timezone: {timezone_input}', 'danger')
+        return redirect(url_for('main.new_campaign'))
+
     # Parse scheduled_at if provided
     scheduled_at = None
     if scheduled_at_str:
@@ -154,27 +193,36 @@ def create_campaign():
         status='Draft', 
         scheduled_at=scheduled_at,
         batch_size=batch_size,
-        batch_delay=batch_delay
+        batch_delay=batch_delay,
+        timezone=timezone
     )
     campaign.sender_email = session.get('sender_email')
     campaign.sender_password = session.get('sender_password')
-    db.session.add(campaign)
-    db.session.commit()
     
-    # Create Recipients with email, name, and dob (if available)
-    recipients = []
-    for recipient_data in recipients_data:
-        recipient = Recipient(
-            campaign_id=campaign.id,
-            email=recipient_data['email'],
-            name=recipient_data.get('name'),
-            dob=recipient_data.get('dob')
-        )
-        recipients.append(recipient)
+    if sender_accounts_data:
+        # The logged-in sender is part of the pool too
+        pool = [{'email': campaign.sender_email, 'password': campaign.sender_password, 'daily_quota': None, 'rate_limit': None}]
+        pool += [a for a in sender_accounts_data if a['email'].lower() != (campaign.sender_email or '').lower()]
+        for account_data in pool:
+            account = SenderAccount.query.filter_by(email=account_data['email']).first()
+            if account is None:
+                account = SenderAccount(email=account_data['email'])
+                db.session.add(account)
+            account.password = account_data['password']
+            if account_data['daily_quota'] is not None:
+                account.daily_quota = account_data['daily_quota']
+            if account_data['rate_limit'] is not None:
+                account.rate_limit = account_data['rate_limit']
+            # Re-entering credentials re-enables an account disabled by an auth failure
+            account.status = 'Active'
+            campaign.sender_accounts.append(account)
     
-    db.session.add_all(recipients)
+    db.session.add(campaign)
     db.session.commit()
     
+    # Shared contacts (email, name, dob) are upserted once; the campaign only links them
+    add_recipients(campaign.id, recipients_data)
+    
     return redirect(url_for('main.review_campaign', campaign_id=campaign.id))
 
 @main_bp.route('/campaign/<int:campaign_id>/review')
@@ -258,59 +306,113 @@ def check_and_start_scheduled_campaigns():
 @main_bp.route('/campaign/<int:campaign_id>/delete')
 def delete_campaign(campaign_id):
     campaign = Campaign.query.get_or_404(campaign_id)
+    archived = campaign.archive
     db.session.delete(campaign)
     db.session.commit()
+    archive.remove_files(archived)
     flash('Campaign discarded.', 'info')
     return redirect(url_for('main.dashboard'))
 
+def campaign_stats(campaign):
+    """
+    Recipient and engagement totals for a campaign, counted in SQL
+    (or taken from the archive summary).
+    """
+    if campaign.archive:
+        summary = campaign.archive.summary()
+        return {
+            'total': summary['total_recipients'],
+            'sent': summary['sent_count'],
+            'opened': summary['open_count'],
+            'replied': summary['replied_count']
+        }
+    by_status = dict(db.session.query(Recipient.status, func.count(Recipient.id)).filter(
+        Recipient.campaign_id == campaign.id).group_by(Recipient.status).all())
+    engaged = dict(db.session.query(TrackingEvent.type, func.count(func.distinct(TrackingEvent.recipient_id))).join(
+        Recipient, Recipient.id == TrackingEvent.recipient_id
+    ).filter(
+        Recipient.campaign_id == campaign.id, TrackingEvent.type.in_(('open', 'replied'))
+    ).group_by(TrackingEvent.type).all())
+    return {
+        'total': sum(by_status.values()),
+        'sent': by_status.get('Sent', 0),
+        'opened': engaged.get('open', 0) + campaign.rolled_up('open'),
+        'replied': engaged.get('replied', 0) + campaign.rolled_up('replied')
+    }
+
+def recipient_rows(campaign_id, page, total, replied_only=False):
+    """
+    One page of a campaign's recipients as lightweight rows
+    (id, email, status, sent_at, replied_at) from a single query on
+    recipient joined to its 'replied' events.
+
+    Returns:
+        tuple: (rows, page actually shown, number of pages)
+    """
+    per_page = RECIPIENTS_PER_PAGE
+    pages = max((total + per_page - 1) // per_page, 1)
+    page = min(max(page, 1), pages)
+
+    replied_at = func.min(TrackingEvent.timestamp).label('replied_at')
+    query = db.session.query(
+        Recipient.id, Contact.email, Recipient.status, Recipient.sent_at, replied_at
+    ).join(Contact, Contact.id == Recipient.contact_id).filter(Recipient.campaign_id == campaign_id)
+    reply_join = and_(TrackingEvent.recipient_id == Recipient.id, TrackingEvent.type == 'replied')
+    if replied_only:
+        query = query.join(TrackingEvent, reply_join).order_by(replied_at.desc(), Recipient.id)
+    else:
+        query = query.outerjoin(TrackingEvent, reply_join).order_by(Recipient.id)
+    query = query.group_by(Recipient.id, Contact.email, Recipient.status, Recipient.sent_at)
+
+    return query.limit(per_page).offset((page - 1) * per_page).all(), page, pages
+
 @main_bp.route('/campaign/<int:campaign_id>')
 def campaign_detail(campaign_id):
     if 'sender_email' not in session:
         return redirect(url_for('main.login'))
         
     campaign = Campaign.query.get_or_404(campaign_id)
+    stats = campaign_stats(campaign)
+    page = request.args.get('page', 1, type=int)
+    if campaign.archive:
+        recipients, page, pages = archive.recipient_rows(campaign.archive, page, stats['total'], RECIPIENTS_PER_PAGE)
+    else:
+        recipients, page, pages = recipient_rows(campaign.id, page, total=stats['total'])
     
-    # Calculate stats for the specific campaign view
-    stats = {
-        'total': len(campaign.recipients),
-        'sent': sum(1 for r in campaign.recipients if r.status == 'Sent'),
-        'opened': sum(1 for r in campaign.recipients if any(e.type == 'open' for e in r.events)),
-        'replied': sum(1 for r in campaign.recipients if any(e.type == 'replied' for e in r.events))
-    }
-    
-    return render_template('campaign_detail.html', campaign=campaign, recipients=campaign.recipients, stats=stats)
-
-# --- Tracking Routes ---
-
-@main_bp.route('/track/open/<int:recipient_id>')
-def track_open(recipient_id):
-    recipient = Recipient.query.get(recipient_id)
-    if recipient:
-        # Log Open Event if not already logged (or log every time)
-        # For unique opens check existence
-        exists = TrackingEvent.query.filter_by(recipient_id=recipient_id, type='open').first()
-        if not exists:
-            event = TrackingEvent(recipient_id=recipient_id, type='open')
-            db.session.add(event)
-            db.session.commit()
-            
-    # Return 1x1 transparent pixel
-    # Base64 of a 1x1 transparent gif
-    pixel = b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00\x21\xf9\x04\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x44\x01\x00\x3b'
-    return app.response_class(pixel, mimetype='image/gif')
-
-@main_bp.route('/track/replied/<int:recipient_id>')
-def track_replied(recipient_id):
-    recipient = Recipient.query.get(recipient_id)
-    if recipient:
-        # Log Reply Event
-        exists = TrackingEvent.query.filter_by(recipient_id=recipient_id, type='replied').first()
-        if not exists:
-            event = TrackingEvent(recipient_id=recipient_id, type='replied')
-            db.session.add(event)
-            db.session.commit()
-            
-    return render_template('tracking_success.html')
+    return render_template('campaign_detail.html', campaign=campaign, recipients=recipients, stats=stats,
+                           page=page, pages=pages)
+
+@main_bp.route('/api/campaign/<int:campaign_id>/engagement')
+def campaign_engagement(campaign_id):
+    """
+    Opens/replies over time from the hourly rollups.
+    Query params: bucket=hour|day (default hour), start/end as ISO dates or datetimes.
+    """
+    if 'sender_email' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    campaign = Campaign.query.get_or_404(campaign_id)
+
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in ('hour', 'day'):
+        return jsonify({'error': "bucket must be 'hour' or 'day'"}), 400
+    try:
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': 'start/end must be ISO dates, e.g. 2024-05-01 or 2024-05-01T13:00'}), 400
+
+    refresh_if_stale(current_app.config.get('ENGAGEMENT_ROLLUP_MINUTES', 5))
+
+    result = campaign_series(campaign.id, bucket, start, end)
+    result['campaign_id'] = campaign.id
+    return jsonify(result)
+
+# --- Metrics ---
+
+@main_bp.route('/metrics')
+def metrics():
+    return current_app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
 
 @main_bp.route('/campaign/<int:campaign_id>/replied')
 def campaign_replied(campaign_id):
@@ -318,31 +420,65 @@ def campaign_replied(campaign_id):
         return redirect(url_for('main.login'))
         
     campaign = Campaign.query.get_or_404(campaign_id)
+    page = request.args.get('page', 1, type=int)
     
-    # Get all recipients who have replied
-    replied_recipients = [
-        r for r in campaign.recipients 
-        if any(e.type == 'replied' for e in r.events)
-    ]
+    # Recipients who replied, with their first reply time, one page at a time
+    if campaign.archive:
+        total = archive.replied_count(campaign.archive)
+        replied_recipients, page, pages = archive.recipient_rows(
+            campaign.archive, page, total, RECIPIENTS_PER_PAGE, replied_only=True)
+        return render_template('campaign_replied.html', campaign=campaign, replied_recipients=replied_recipients,
+                               total=total, page=page, pages=pages)
+
+    total = db.session.query(func.count(func.distinct(TrackingEvent.recipient_id))).join(
+        Recipient, Recipient.id == TrackingEvent.recipient_id
+    ).filter(Recipient.campaign_id == campaign.id, TrackingEvent.type == 'replied').scalar()
+    replied_recipients, page, pages = recipient_rows(campaign.id, page, total=total, replied_only=True)
     
-    return render_template('campaign_replied.html', campaign=campaign, replied_recipients=replied_recipients)
+    return render_template('campaign_replied.html', campaign=campaign, replied_recipients=replied_recipients,
+                           total=total, page=page, pages=pages)
 
 @main_bp.route('/export/report')
 def export_report():
     if 'sender_email' not in session:
         return redirect(url_for('main.login'))
+
+    # pandas/openpyxl are only loaded by the workers that actually export
+    import pandas as pd
         
     campaign_id = request.args.get('campaign_id', type=int)
     
+    # Load recipients, their events and rollups up front instead of per recipient
+    eager = (
+        selectinload(Campaign.recipients).selectinload(Recipient.events),
+        selectinload(Campaign.rollups),
+        selectinload(Campaign.archive),
+    )
     if campaign_id:
-        campaigns = [Campaign.query.get_or_404(campaign_id)]
+        campaigns = Campaign.query.options(*eager).filter_by(id=campaign_id).all()
+        if not campaigns:
+            abort(404)
         filename = f"report_campaign_{campaign_id}.xlsx"
     else:
-        campaigns = Campaign.query.all()
+        campaigns = Campaign.query.options(*eager).all()
         filename = "all_campaigns_report.xlsx"
         
     data = []
     for c in campaigns:
+        if c.archive:
+            # Archived recipients come from the campaign's Parquet file
+            for r in archive.report_rows(c.archive):
+                data.append({
+                    'Campaign Name': c.name,
+                    'Subject': c.subject,
+                    'Recipient Email': r['email'],
+                    'Status': r['status'],
+                    'Sent At': r['sent_at'].strftime('%Y-%m-%d %H:%M:%S') if r['sent_at'] else 'N/A',
+                    'Opens': r['opens'],
+                    'Replies': r['replies'],
+                    'Created At': c.created_at.strftime('%Y-%m-%d %H:%M:%S')
+                })
+            continue
         for r in c.recipients:
             data.append({
                 'Campaign Name': c.name,
@@ -1,12 +1,145 @@
+import queue
 import smtplib
 import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from flask import current_app
-from .models import db, Campaign, Recipient
-from datetime import datetime
+from .models import db, Campaign, Contact, Recipient, SenderAccount
+from .sharding import HashRing
+from .transport import get_transport, RECIPIENT_TOKEN_HEADER
+from .mime_template import MessageTemplate, slot
+from .html_text import html_to_text
+from .tokens import get_signer
+from .suppression import get_suppressions, is_hard_bounce, mark_bounced, mark_suppressed
+from .metrics import MESSAGES_SENT, MESSAGES_FAILED, SEND_QUEUE_DEPTH, SEND_RATE, SEND_RETRIES
+from .ratecontrol import AdaptiveRateController, classify_error, THROTTLED, TRANSIENT, CONNECTION, FATAL
+from datetime import datetime, date, timedelta
 import time
 
+def build_html_message(sender_email, to_email, subject, html, text=None):
+    """
+    Build the multipart/alternative message used for every outgoing email,
+    with an optional plain-text part before the HTML part.
+    """
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = sender_email
+    msg['To'] = to_email
+    if text is not None:
+        msg.attach(MIMEText(text, 'plain', 'utf-8'))
+    msg.attach(MIMEText(html, 'html'))
+    return msg
+
+def build_campaign_html(body_content, tracking_token, base_url, track_opens=True):
+    """
+    Build the final HTML for one recipient: the campaign body with the
+    verify button / tracking link filled in and the open pixel appended
+    (unless track_opens is False). tracking_token is the recipient's signed
+    token (see app/tokens.py).
+    """
+    # Construct Body with Tracking
+    # 1. Open Pixel
+    tracking_pixel = f'<img src="{base_url}/track/open/{tracking_token}" width="1" height="1" style="display:none;" />'
+    
+    # 2. Reply Link Replacement
+    # We look for the placeholder or [VERIFY_BUTTON] we inserted in JS
+    # A better way is to wrap the whole body and replacing a known token
+    
+    click_link = f"{base_url}/track/replied/{tracking_token}"
+    
+    # Replace [VERIFY_BUTTON] or similar constructions
+    # For V1: We will REPLACE the specific text "[VERIFY_BUTTON]" with the button HTML
+    # And also append the pixel at the end.
+    
+    body = body_content
+    
+    btn_html = f'''
+    <a href="{click_link}" style="display: inline-block; padding: 12px 24px; background-color: #6366f1; color: white; text-decoration: none; border-radius: 6px; font-weight: bold; font-family: sans-serif;">
+        Verify Email
+    </a>
+    '''
+    
+    if '[VERIFY_BUTTON]' in body:
+        body = body.replace('[VERIFY_BUTTON]', btn_html)
+    
+    # Also look for {{ tracking_link }} just in case
+    body = body.replace('{{ tracking_link }}', click_link)
+    
+    if not track_opens:
+        tracking_pixel = ''
+    
+    final_html = f"<html><body>{body}<br>{tracking_pixel}</body></html>"
+    return final_html
+
+def build_campaign_template(sender_email, subject, body_content, base_url, track_opens=True):
+    """
+    Serialize a campaign message (HTML plus its plain-text alternative)
+    once; render(to_email, token=...) then produces each recipient's
+    message as bytes.
+    """
+    html = build_campaign_html(body_content, slot('token'), base_url, track_opens)
+    headers = []
+    if is_personalized(body_content, track_opens):
+        # One-click unsubscribe (RFC 8058); needs the recipient's token, so only on per-recipient messages.
+        # The token header lets the SendGrid transport tag the message for webhook events (app/webhooks.py)
+        headers = [
+            ('List-Unsubscribe', f"<{base_url}/unsubscribe/{slot('token')}>"),
+            ('List-Unsubscribe-Post', 'List-Unsubscribe=One-Click'),
+            (RECIPIENT_TOKEN_HEADER, slot('token')),
+        ]
+    return MessageTemplate(sender_email, subject, html, html_to_text(html), headers)
+
+def is_personalized(body_content, track_opens=True):
+    """
+    True if the campaign HTML differs per recipient (tracking pixel or
+    per-recipient links), i.e. one message cannot be shared by recipients.
+    """
+    return track_opens or '[VERIFY_BUTTON]' in body_content or '{{ tracking_link }}' in body_content
+
+def deliver_with_retries(transport, controller, sender_email, to_addrs, msg, max_retries, retry_refused=True):
+    """
+    Send one message, pacing with the rate controller and retrying
+    transient failures with jittered backoff. With retry_refused=False a
+    refusal of every recipient is returned at once, for callers that
+    handle each refused address by its own reply code.
+
+    Returns:
+        tuple: (True, transport result) on success, (False, exception) on a
+               permanent failure or once retries are exhausted. For SMTP the
+               result maps recipients refused by the server to their reply.
+
+    Raises:
+        The original exception for fatal errors (e.g. bad credentials)
+    """
+    attempt = 0
+    while True:
+        controller.wait()
+        try:
+            result = transport.send(sender_email, to_addrs, msg)
+            controller.on_success()
+            return True, result
+        except Exception as e:
+            kind, code = classify_error(e)
+            if kind == FATAL:
+                raise
+            if not retry_refused and isinstance(e, smtplib.SMTPRecipientsRefused):
+                return False, e
+
+            if kind not in (THROTTLED, TRANSIENT, CONNECTION) or attempt >= max_retries:
+                return False, e
+
+            attempt += 1
+            SEND_RETRIES.inc(reason=kind)
+            if kind == THROTTLED:
+                controller.on_throttle()
+            if kind == CONNECTION:
+                # Reconnect before the next attempt
+                transport.close()
+
+            delay = controller.backoff(attempt)
+            print(f"Retrying {', '.join(to_addrs)} in {delay:.1f}s ({kind}{f' {code}' if code else ''}, attempt {attempt}/{max_retries})")
+            time.sleep(delay)
+
 def send_async(app, campaign_id, sender_email, sender_password):
     """
     Background worker to send emails.
@@ -16,92 +149,355 @@ def send_async(app, campaign_id, sender_email, sender_password):
         if not campaign:
             return
 
-        recipients = Recipient.query.filter_by(campaign_id=campaign_id, status='Pending').all()
+        if campaign.sender_accounts:
+            return send_sharded(app, campaign_id)
+
+        if app.config.get('DELIVERY_MODE', 'serial') == 'domain':
+            from .domain_scheduler import send_by_domain
+            try:
+                return send_by_domain(app, campaign_id, sender_email, sender_password)
+            except Exception as e:
+                print(f"Domain send error for campaign {campaign_id}: {e}")
+                db.session.rollback()
+                campaign = Campaign.query.get(campaign_id)
+                campaign.status = 'Failed'
+                db.session.commit()
+                return
+            finally:
+                SEND_QUEUE_DEPTH.remove(campaign=campaign_id)
+                SEND_RATE.remove(campaign=campaign_id)
+
+        total = db.session.query(db.func.count(Recipient.id)).filter_by(
+            campaign_id=campaign_id, status='Pending').scalar()
+        SEND_QUEUE_DEPTH.set(total, campaign=campaign_id)
+        # A batch size of 0 (or none) means no pauses, as in the sharded and domain senders
+        batch_size = campaign.batch_size or float('inf')
+        batch_delay = campaign.batch_delay or 0
         
         try:
-            # Connect to SMTP
-            # Assuming Gmail for now as per requirements, but could be configurable
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(sender_email, sender_password)
+            # Connect using the configured transport (SMTP relay by default)
+            transport = get_transport(sender_email, sender_password, app.config)
+            transport.open()
+
+            controller = AdaptiveRateController.from_config(app.config)
+            max_retries = int(app.config.get('SEND_MAX_RETRIES', 5))
             
-            base_url = "http://127.0.0.1:5002"  # Hardcoded for local dev
+            base_url = app.config['TRACKING_BASE_URL']
+            template = build_campaign_template(sender_email, campaign.subject, campaign.body_content,
+                                               base_url, app.config.get('TRACK_OPENS', True))
+            signer = get_signer(app)
+            suppressions = get_suppressions(app)
 
             sent_in_batch = 0
-            for i, r in enumerate(recipients):
-                try:
-                    msg = MIMEMultipart('alternative')
-                    msg['Subject'] = campaign.subject
-                    msg['From'] = sender_email
-                    msg['To'] = r.email
-
-                    # Construct Body with Tracking
-                    # 1. Open Pixel
-                    tracking_pixel = f'<img src="{base_url}/track/open/{r.id}" width="1" height="1" style="display:none;" />'
-                    
-                    # 2. Reply Link Replacement
-                    # We look for the placeholder or [VERIFY_BUTTON] we inserted in JS
-                    # A better way is to wrap the whole body and replacing a known token
-                    
-                    click_link = f"{base_url}/track/replied/{r.id}"
-                    
-                    # Replace [VERIFY_BUTTON] or similar constructions
-                    # For V1: We will REPLACE the specific text "[VERIFY_BUTTON]" with the button HTML
-                    # And also append the pixel at the end.
-                    
-                    body = campaign.body_content
-                    
-                    btn_html = f'''
-                    <a href="{click_link}" style="display: inline-block; padding: 12px 24px; background-color: #6366f1; color: white; text-decoration: none; border-radius: 6px; font-weight: bold; font-family: sans-serif;">
-                        Verify Email
-                    </a>
-                    '''
-                    
-                    if '[VERIFY_BUTTON]' in body:
-                        body = body.replace('[VERIFY_BUTTON]', btn_html)
-                    
-                    # Also look for {{ tracking_link }} just in case
-                    body = body.replace('{{ tracking_link }}', click_link)
-                    
-                    final_html = f"<html><body>{body}<br>{tracking_pixel}</body></html>"
-
-                    msg.attach(MIMEText(final_html, 'html'))
-
-                    server.sendmail(sender_email, r.email, msg.as_string())
-                    
-                    r.status = 'Sent'
-                    r.sent_at = datetime.now()
-                    db.session.commit()
-                    
-                    # Increment batch counter
-                    sent_in_batch += 1
-                    
-                    # Small delay to avoid aggressive rate limits
-                    time.sleep(1) 
-                    
-                    # Batch Delay Logic
-                    # Check if we reached the batch size AND there are still recipients left
-                    if sent_in_batch >= campaign.batch_size and (i + 1) < len(recipients):
-                        print(f"Batch limit of {campaign.batch_size} reached. Pausing for {campaign.batch_delay} minutes.")
-                        time.sleep(campaign.batch_delay * 60)
-                        sent_in_batch = 0 # Reset counter 
+            processed = 0
+            for chunk in iter_pending_recipients(campaign_id, int(app.config.get('SEND_CHUNK_SIZE', 1000))):
+                suppressed = []
+                for recipient_id, email in chunk:
+                    processed += 1
+                    if email in suppressions:
+                        suppressed.append(recipient_id)
+                        SEND_QUEUE_DEPTH.dec(campaign=campaign_id)
+                        continue
+                    try:
+                        msg = template.render(email, token=signer.sign(recipient_id, campaign_id))
 
-                except Exception as e:
-                    print(f"Failed to send to {r.email}: {e}")
-                    r.status = 'Failed'
-                    db.session.commit()
+                        sent, error = deliver_with_retries(transport, controller, sender_email, [email], msg, max_retries)
+                        SEND_RATE.set(controller.rate, campaign=campaign_id)
+                        if not sent:
+                            raise error
+                        
+                        set_recipient_status(recipient_id, 'Sent', sent_at=datetime.now())
+                        MESSAGES_SENT.inc(campaign=campaign_id)
+                        SEND_QUEUE_DEPTH.dec(campaign=campaign_id)
+                        
+                        # Increment batch counter
+                        sent_in_batch += 1
+                        
+                        # Batch Delay Logic
+                        # Check if we reached the batch size AND there are still recipients left
+                        if sent_in_batch >= batch_size and processed < total:
+                            print(f"Batch limit of {batch_size} reached. Pausing for {batch_delay} minutes.")
+                            time.sleep(batch_delay * 60)
+                            sent_in_batch = 0 # Reset counter 
+
+                    except Exception as e:
+                        if classify_error(e)[0] == FATAL:
+                            raise
+                        print(f"Failed to send to {email}: {e}")
+                        if is_hard_bounce(e):
+                            mark_bounced([recipient_id], [email], str(e))
+                        else:
+                            set_recipient_status(recipient_id, 'Failed')
+                        MESSAGES_FAILED.inc(campaign=campaign_id)
+                        SEND_QUEUE_DEPTH.dec(campaign=campaign_id)
+                if suppressed:
+                    mark_suppressed(suppressed)
 
+            campaign = db.session.get(Campaign, campaign_id)
             campaign.status = 'Completed'
             db.session.commit()
-            server.quit()
+            transport.close()
             
         except Exception as e:
             error_msg = f"SMTP Error for campaign {campaign_id}: {e}"
             print(error_msg)
             with open("smtp_error.log", "a") as log:
                 log.write(f"{datetime.now()}: {error_msg}\n")
+            db.session.rollback()
+            campaign = db.session.get(Campaign, campaign_id)
             campaign.status = 'Failed'  # Mark campaign as failed if logic breaks
             db.session.commit()
+        finally:
+            SEND_QUEUE_DEPTH.remove(campaign=campaign_id)
+            SEND_RATE.remove(campaign=campaign_id)
+
+def iter_pending_recipients(campaign_id, chunk_size=1000):
+    """
+    Yield a campaign's pending recipients as chunks of (id, email) tuples.
+
+    Chunks are read by keyset on the recipient id rather than loading the
+    whole campaign up front, and the session is cleared between chunks,
+    so memory stays flat however large the campaign is. Recipients whose
+    status changes while sending are not revisited.
+    """
+    last_id = 0
+    while True:
+        chunk = db.session.query(Recipient.id, Contact.email).join(
+            Contact, Contact.id == Recipient.contact_id
+        ).filter(
+            Recipient.campaign_id == campaign_id,
+            Recipient.status == 'Pending',
+            Recipient.id > last_id
+        ).order_by(Recipient.id).limit(chunk_size).all()
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1][0]
+        db.session.expunge_all()
+
+def set_recipient_status(recipient_id, status, sent_at=None):
+    """
+    Update one recipient's status by id and commit, without loading it.
+    """
+    values = {'status': status}
+    if sent_at:
+        values['sent_at'] = sent_at
+    db.session.execute(db.update(Recipient).where(Recipient.id == recipient_id).values(**values))
+    db.session.commit()
+
+def send_sharded(app, campaign_id):
+    """
+    Dispatch a campaign across its pool of sender accounts.
+
+    Recipients are assigned to accounts with a consistent hash of their
+    email, so a recipient always goes through the same account. Each account
+    sends its shard in its own thread with its own connection, rate
+    controller, rate limit and daily quota. Each round scans the pending
+    recipients once, in keyset chunks, and hands every id to its owner's
+    bounded queue, so threads never scan the list themselves and no round
+    holds it in memory. When an account is disabled,
+    cools down after repeated failures or runs out of quota, its unsent
+    recipients move to the next healthy account on the ring. Recipients left
+    when no account can send stay Pending and the campaign is Paused, so
+    starting it again resumes.
+    """
+    campaign = Campaign.query.get(campaign_id)
+    ring = HashRing(account.id for account in campaign.sender_accounts)
+    excluded = set()
+    suppressions = get_suppressions(app)
+    chunk_size = int(app.config.get('SEND_CHUNK_SIZE', 1000))
+    SEND_QUEUE_DEPTH.set(
+        Recipient.query.filter_by(campaign_id=campaign_id, status='Pending').count(), campaign=campaign_id
+    )
+
+    try:
+        while True:
+            # Re-read accounts every round: shard threads update their health and quota
+            campaign = Campaign.query.get(campaign_id)
+            for account in campaign.sender_accounts:
+                if not account.is_healthy() or account.remaining_quota() == 0:
+                    excluded.add(account.id)
+
+            # One streaming pass: drop suppressed recipients and route the rest to
+            # their account's thread, started when its first recipient turns up
+            queues = {}
+            threads = {}
+            results = {}
+            has_pending = False
+            for chunk in iter_pending_recipients(campaign_id, chunk_size):
+                suppressed = [recipient_id for recipient_id, email in chunk if email in suppressions]
+                if suppressed:
+                    mark_suppressed(suppressed)
+                    SEND_QUEUE_DEPTH.dec(len(suppressed), campaign=campaign_id)
+                # Don't keep a read transaction open while waiting on full queues
+                db.session.commit()
+                for recipient_id, email in chunk:
+                    if email in suppressions:
+                        continue
+                    has_pending = True
+                    account_id = ring.get(email, exclude=excluded)
+                    if account_id is None:
+                        continue
+                    if account_id not in threads:
+                        queues[account_id] = queue.Queue(maxsize=chunk_size)
+                        threads[account_id] = threading.Thread(
+                            target=_send_shard, args=(app, campaign_id, account_id, queues[account_id], results))
+                        threads[account_id].start()
+                    _hand_off(queues[account_id], threads[account_id], recipient_id)
+
+            for account_id, thread in threads.items():
+                _hand_off(queues[account_id], thread, None)
+            for thread in threads.values():
+                thread.join()
+
+            if not has_pending:
+                break
+            if not threads:
+                print(f"No healthy sender account with quota left for campaign {campaign_id}; pausing.")
+                break
+
+            # Accounts that stopped early are excluded for the next round
+            stopped = {account_id for account_id, finished in results.items() if not finished}
+            if not stopped:
+                break
+            excluded |= stopped
+
+        campaign = Campaign.query.get(campaign_id)
+        remaining = Recipient.query.filter_by(campaign_id=campaign_id, status='Pending').count()
+        campaign.status = 'Paused' if remaining else 'Completed'
+        db.session.commit()
+    except Exception as e:
+        print(f"Sharded send error for campaign {campaign_id}: {e}")
+        db.session.rollback()
+        campaign = Campaign.query.get(campaign_id)
+        campaign.status = 'Failed'
+        db.session.commit()
+    finally:
+        SEND_QUEUE_DEPTH.remove(campaign=campaign_id)
+        SEND_RATE.remove(campaign=campaign_id)
+
+def _hand_off(work, thread, recipient_id):
+    """
+    Put a recipient id (None = end of shard) on a shard thread's queue,
+    waiting while it is full. Returns False if the thread has already
+    stopped; its recipients stay Pending for the next round.
+    """
+    while thread.is_alive():
+        try:
+            work.put(recipient_id, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _send_shard(app, campaign_id, account_id, work, results):
+    """
+    Thread target: send one account's shard, i.e. the recipient ids that
+    send_sharded puts on the `work` queue, until it puts None.
+
+    Sets results[account_id] to True if the whole shard was attempted, or
+    False if the account stopped early (disabled, cooling down or out of
+    quota) and its remaining recipients need another account.
+    """
+    results[account_id] = False
+    with app.app_context():
+        campaign = Campaign.query.get(campaign_id)
+        account = SenderAccount.query.get(account_id)
+        failure_threshold = int(app.config.get('SENDER_FAILURE_THRESHOLD', 5))
+        cooldown = timedelta(minutes=float(app.config.get('SENDER_COOLDOWN_MINUTES', 15)))
+        max_retries = int(app.config.get('SEND_MAX_RETRIES', 5))
+        base_url = app.config['TRACKING_BASE_URL']
+        template = build_campaign_template(account.email, campaign.subject, campaign.body_content,
+                                           base_url, app.config.get('TRACK_OPENS', True))
+        signer = get_signer(app)
+
+        controller = AdaptiveRateController.from_config(app.config)
+        if account.rate_limit:
+            controller.max_rate = account.rate_limit
+            controller.rate = min(controller.rate, account.rate_limit)
+
+        transport = get_transport(account.email, account.password, app.config)
+        try:
+            transport.open()
+        except Exception as e:
+            if classify_error(e)[0] == FATAL:
+                account.status = 'Disabled'
+            else:
+                account.cooldown_until = datetime.now() + cooldown
+            account.last_error = str(e)[:255]
+            db.session.commit()
+            print(f"Sender {account.email} unavailable: {e}")
+            return
+
+        # Write only at commit: an autoflush from the next query would take the
+        # SQLite writer lock (SQLITE_WRITE_LOCK) and hold it across the SMTP send
+        db.session.autoflush = False
+        try:
+            sent_in_batch = 0
+            for recipient_id in iter(work.get, None):
+                today = date.today()
+                if account.quota_date != today:
+                    account.quota_date = today
+                    account.sent_today = 0
+                if account.remaining_quota() == 0:
+                    print(f"Sender {account.email} reached its daily quota of {account.daily_quota}.")
+                    db.session.commit()
+                    return
+
+                r = Recipient.query.get(recipient_id)
+                if r is None or r.status != 'Pending':
+                    continue
+
+                # Pause between batches, never after the last recipient
+                if campaign.batch_size and sent_in_batch >= campaign.batch_size:
+                    print(f"Batch limit of {campaign.batch_size} reached for {account.email}. Pausing for {campaign.batch_delay} minutes.")
+                    time.sleep((campaign.batch_delay or 0) * 60)
+                    sent_in_batch = 0
+
+                msg = template.render(r.email, token=signer.sign(r.id, campaign_id))
+
+                try:
+                    sent, error = deliver_with_retries(transport, controller, account.email, [r.email], msg, max_retries)
+                except Exception as e:
+                    # Fatal for this account (e.g. credentials revoked): hand the rest to others
+                    account.status = 'Disabled'
+                    account.last_error = str(e)[:255]
+                    db.session.commit()
+                    print(f"Sender {account.email} disabled: {e}")
+                    return
+
+                if sent:
+                    r.status = 'Sent'
+                    r.sent_at = datetime.now()
+                    account.sent_today = (account.sent_today or 0) + 1
+                    account.consecutive_failures = 0
+                    db.session.commit()
+                    MESSAGES_SENT.inc(campaign=campaign_id)
+                else:
+                    print(f"Failed to send to {r.email} via {account.email}: {error}")
+                    if is_hard_bounce(error):
+                        mark_bounced([r.id], [r.email], str(error))
+                    else:
+                        r.status = 'Failed'
+                    account.consecutive_failures = (account.consecutive_failures or 0) + 1
+                    account.last_error = str(error)[:255]
+                    if account.consecutive_failures >= failure_threshold:
+                        account.cooldown_until = datetime.now() + cooldown
+                        account.consecutive_failures = 0
+                        db.session.commit()
+                        MESSAGES_FAILED.inc(campaign=campaign_id)
+                        SEND_QUEUE_DEPTH.dec(campaign=campaign_id)
+                        print(f"Sender {account.email} cooling down after {failure_threshold} consecutive failures.")
+                        return
+                    db.session.commit()
+                    MESSAGES_FAILED.inc(campaign=campaign_id)
+                SEND_QUEUE_DEPTH.dec(campaign=campaign_id)
+                sent_in_batch += 1
+
+            results[account_id] = True
+        finally:
+            transport.close()
+            db.session.remove()
 
 def start_sending_thread(app, campaign_id, sender_email, sender_password):
     thread = threading.Thread(target=send_async, args=(app, campaign_id, sender_email, sender_password))
@@ -134,28 +530,24 @@ def send_birthday_email(recipient, sender_email, sender_password):
         # Replace {{ name }} placeholder with recipient's name or "Friend" if no name
         recipient_name = recipient.name if recipient.name else "Friend"
         email_body = template_content.replace('{{ name }}', recipient_name)
+        # Text conversion is cached per template; only the name is filled in per recipient
+        email_text = html_to_text(template_content).replace('{{ name }}', recipient_name)
         
-        # Connect to SMTP server
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        
-        # Create email message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"🎉 Happy Birthday {recipient_name}!"
-        msg['From'] = sender_email
-        msg['To'] = recipient.email
+        # Connect using the configured transport
+        transport = get_transport(sender_email, sender_password, current_app.config)
         
-        # Attach HTML body
-        msg.attach(MIMEText(email_body, 'html'))
+        # Create email message with HTML body
+        msg = build_html_message(sender_email, recipient.email, f"🎉 Happy Birthday {recipient_name}!", email_body, email_text)
         
         # Send email
-        server.sendmail(sender_email, recipient.email, msg.as_string())
-        server.quit()
+        with transport:
+            transport.send(sender_email, [recipient.email], msg)
         
+        MESSAGES_SENT.inc(campaign='birthday')
         return True
         
     except Exception as e:
         print(f"Failed to send birthday email to {recipient.email}: {e}")
+        MESSAGES_FAILED.inc(campaign='birthday')
         return False
 
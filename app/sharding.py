@@ -0,0 +1,54 @@
+"""
+Consistent Hashing
+
+Maps recipients to sender accounts so that the same address always goes
+through the same account (including on retries and reruns), and removing
+one account only moves the recipients that were assigned to it.
+"""
+
+import bisect
+import hashlib
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(str(value).encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Hash ring with virtual nodes.
+
+    Args:
+        nodes: Iterable of node ids (e.g. SenderAccount ids)
+        replicas: Virtual nodes per real node; more gives a more even spread
+    """
+
+    def __init__(self, nodes, replicas=100):
+        self.replicas = replicas
+        self.nodes = set()
+        self.ring = []
+        self.keys = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            bisect.insort(self.ring, (_hash(f'{node}:{i}'), node))
+        self.keys = [h for h, _ in self.ring]
+
+    def get(self, key, exclude=()):
+        """
+        Return the node owning `key`, skipping nodes in `exclude` by walking
+        clockwise to the next one. Returns None if every node is excluded.
+        """
+        if not self.ring or not (self.nodes - set(exclude)):
+            return None
+        index = bisect.bisect(self.keys, _hash(str(key).lower()))
+        for offset in range(len(self.ring)):
+            node = self.ring[(index + offset) % len(self.ring)][1]
+            if node not in exclude:
+                return node
+        return None
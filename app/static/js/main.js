@@ -51,7 +51,7 @@ function handleFileSelect(input) {
 
             parseCSV(file);
         } else {
-            // Excel or other: Show Manual Input
+            // Excel or other: Show Manual Input until the server has read the header row
             csvMode.style.display = 'none';
             excelMode.style.display = 'block';
             // Disable CSV inputs, enable Excel text
@@ -62,10 +62,42 @@ function handleFileSelect(input) {
             emailColumnSelect.value = '';
             nameColumnSelect.value = '';
             dobColumnSelect.value = '';
+
+            sniffColumns(file);
         }
     }
 }
 
+function sniffColumns(file) {
+    // The server reads only the first rows of the workbook and suggests the column mapping
+    const formData = new FormData();
+    formData.append('recipient_file', file);
+
+    fetch('/api/sniff-columns', { method: 'POST', body: formData })
+        .then(response => response.ok ? response.json() : null)
+        .then(result => {
+            // Ignore the answer if another file was selected meanwhile
+            if (!result || fileInput.files[0] !== file) {
+                return;
+            }
+            csvMode.style.display = 'block';
+            excelMode.style.display = 'none';
+            emailColumnSelect.required = true;
+            emailColumnText.required = false;
+            emailColumnText.value = '';
+
+            const rows = result.rows.map(row => {
+                const record = {};
+                result.columns.forEach((column, i) => record[column] = row[i]);
+                return record;
+            });
+            renderPreview(rows, result.columns, result.suggested);
+        })
+        .catch(() => {
+            // Keep the manual column input
+        });
+}
+
 function clearFileSelection() {
     fileInput.value = '';
     fileInfo.style.display = 'none';
@@ -87,21 +119,23 @@ function parseCSV(file) {
     });
 }
 
-function renderPreview(data, headers) {
+function renderPreview(data, headers, suggested) {
+    suggested = suggested || {};
+
     // Auto-fill Email input
-    const emailHeader = headers.find(h => h.toLowerCase().includes('email'));
+    const emailHeader = suggested.email || headers.find(h => h.toLowerCase().includes('email'));
     if (emailHeader) {
         emailColumnSelect.value = emailHeader;
     }
 
     // Auto-fill Name input (optional)
-    const nameHeader = headers.find(h => h.toLowerCase().includes('name'));
+    const nameHeader = suggested.name || headers.find(h => h.toLowerCase().includes('name'));
     if (nameHeader) {
         nameColumnSelect.value = nameHeader;
     }
 
     // Auto-fill DOB input (optional)
-    const dobHeader = headers.find(h => {
+    const dobHeader = suggested.dob || headers.find(h => {
         const lower = h.toLowerCase();
         return lower.includes('dob') || lower.includes('birth') || lower.includes('birthday');
     });
@@ -0,0 +1,123 @@
+"""
+Suppression List
+
+Addresses that hard-bounced, complained or unsubscribed are stored once
+in the Suppression table and never mailed again by any campaign or the
+birthday job.
+
+Senders check addresses against an in-memory set (get_suppressions),
+so the pre-send check is a hash lookup per recipient with no database
+round trip. The set is reloaded only when the table has changed, which
+is detected with one count/max(id) query per send run. Imports drop
+suppressed rows set-wise before recipients are created.
+"""
+
+import threading
+from datetime import datetime
+
+from flask import current_app, has_app_context
+
+from .contacts import normalize_email
+from .models import db, Recipient, Suppression
+from .ratecontrol import classify_error, PERMANENT
+
+# Mailbox does not exist / not accepted / bad address: retrying will never work
+HARD_BOUNCE_CODES = {550, 551, 553}
+REASONS = ('bounce', 'complaint', 'unsubscribe')
+IN_CLAUSE_CHUNK = 500
+
+
+def _chunks(values, size=IN_CLAUSE_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class SuppressionSet:
+    """
+    Suppressed emails held in memory for constant-time lookups.
+    """
+
+    def __init__(self):
+        self.emails = frozenset()
+        self.version = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Reload the set if rows were added or removed since the last load."""
+        version = tuple(db.session.query(db.func.count(Suppression.id), db.func.max(Suppression.id)).one())
+        if version != self.version:
+            with self.lock:
+                self.emails = frozenset(row[0] for row in db.session.query(Suppression.email))
+                self.version = version
+        return self
+
+    def __contains__(self, email):
+        return normalize_email(email) in self.emails
+
+    def __len__(self):
+        return len(self.emails)
+
+
+def get_suppressions(app=None):
+    """
+    The app's suppression set, refreshed from the database if it changed.
+    Requires an app context.
+    """
+    app = app or current_app
+    suppressions = app.extensions.get('suppressions')
+    if suppressions is None:
+        suppressions = app.extensions['suppressions'] = SuppressionSet()
+    return suppressions.refresh()
+
+
+def suppressed_emails():
+    """Frozen set of suppressed emails, or an empty set outside an app context."""
+    if not has_app_context():
+        return frozenset()
+    return get_suppressions().emails
+
+
+def suppress(emails, reason, detail=None):
+    """
+    Add addresses to the suppression list (existing entries are kept).
+
+    Returns:
+        int: Number of addresses newly suppressed
+    """
+    if reason not in REASONS:
+        raise ValueError(f"Unknown suppression reason: {reason}")
+    emails = {normalize_email(email) for email in emails if email}
+    existing = set()
+    for chunk in _chunks(emails):
+        existing.update(row[0] for row in db.session.query(Suppression.email).filter(Suppression.email.in_(chunk)))
+
+    rows = [{'email': email, 'reason': reason, 'detail': (detail or '')[:255] or None, 'created_at': datetime.now()}
+            for email in emails - existing]
+    if rows:
+        db.session.execute(db.insert(Suppression), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def mark_suppressed(recipient_ids):
+    """Set recipients skipped because of the suppression list to 'Suppressed'."""
+    for chunk in _chunks(recipient_ids):
+        Recipient.query.filter(Recipient.id.in_(chunk)).update({'status': 'Suppressed'}, synchronize_session=False)
+    db.session.commit()
+
+
+def mark_bounced(recipient_ids, emails, detail=None):
+    """Set recipients to 'Bounced' and suppress their addresses."""
+    for chunk in _chunks(recipient_ids):
+        Recipient.query.filter(Recipient.id.in_(chunk)).update({'status': 'Bounced'}, synchronize_session=False)
+    return suppress(emails, 'bounce', detail)
+
+
+def is_hard_bounce(error):
+    """True if a send error or refused-recipient reply means the address is dead."""
+    if isinstance(error, tuple):
+        # smtplib refused-recipients entry: (code, message)
+        return error[0] in HARD_BOUNCE_CODES
+    kind, code = classify_error(error)
+    return kind == PERMANENT and code in HARD_BOUNCE_CODES
@@ -0,0 +1,107 @@
+"""
+Signed Tracking Tokens
+
+Tracking links carry a compact token instead of the raw recipient id:
+
+    base64url( varint(recipient_id) + varint(campaign_id) + HMAC-SHA256[:8] )
+
+The MAC is keyed from SECRET_KEY, so tokens are validated in-process with
+no database read, cannot be enumerated like sequential ids and cannot be
+forged without the key. A typical token is 14-18 characters.
+
+Rotating SECRET_KEY invalidates the tracking links of emails already sent.
+"""
+
+import base64
+import hashlib
+import hmac
+
+MAC_BYTES = 8
+MAX_TOKEN_LENGTH = 48
+
+
+def _pack(*numbers):
+    """Encode non-negative integers as concatenated LEB128 varints."""
+    out = bytearray()
+    for number in numbers:
+        number = int(number)
+        if number < 0:
+            raise ValueError('Token ids must be non-negative')
+        while True:
+            byte = number & 0x7F
+            number >>= 7
+            if number:
+                out.append(byte | 0x80)
+            else:
+                out.append(byte)
+                break
+    return bytes(out)
+
+
+def _unpack(data, count):
+    numbers = []
+    number = shift = 0
+    for byte in data:
+        number |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            numbers.append(number)
+            number = shift = 0
+        elif shift > 63:
+            return None
+    if shift or len(numbers) != count:
+        return None
+    return numbers
+
+
+class TokenSigner:
+    """
+    Signs and verifies (recipient_id, campaign_id) tracking tokens.
+
+    Args:
+        secret: Application secret (SECRET_KEY); a purpose-specific key is
+                derived from it so tokens can't be reused elsewhere
+    """
+
+    def __init__(self, secret):
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        self.key = hashlib.sha256(b'tracking-token:' + secret).digest()
+
+    def _mac(self, payload):
+        return hmac.new(self.key, payload, hashlib.sha256).digest()[:MAC_BYTES]
+
+    def sign(self, recipient_id, campaign_id):
+        """Return the URL-safe token for one recipient of a campaign."""
+        payload = _pack(recipient_id, campaign_id)
+        return base64.urlsafe_b64encode(payload + self._mac(payload)).rstrip(b'=').decode('ascii')
+
+    def verify(self, token):
+        """
+        Validate a token.
+
+        Returns:
+            tuple: (recipient_id, campaign_id), or None if the token is
+                   malformed or its signature doesn't match
+        """
+        if not token or len(token) > MAX_TOKEN_LENGTH:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        except (ValueError, TypeError):
+            return None
+        if len(raw) <= MAC_BYTES:
+            return None
+        payload, mac = raw[:-MAC_BYTES], raw[-MAC_BYTES:]
+        if not hmac.compare_digest(mac, self._mac(payload)):
+            return None
+        ids = _unpack(payload, 2)
+        return tuple(ids) if ids else None
+
+
+def get_signer(app):
+    """Return the app's TokenSigner, created once from SECRET_KEY."""
+    signer = app.extensions.get('token_signer')
+    if signer is None:
+        signer = app.extensions['token_signer'] = TokenSigner(app.config['SECRET_KEY'])
+    return signer
@@ -0,0 +1,390 @@
+"""
+Tracking Endpoints and Buffered Writes
+
+The open pixel, reply link and unsubscribe routes live in tracking_bp,
+which is served both by the main app and by the standalone tracking app
+(app/tracking_app.py), so pixel traffic can be scaled separately from the
+dashboard.
+
+Tracking hits are appended to an in-memory EventBuffer and written to
+TrackingEvent in batches by a background thread, so the pixel and link
+endpoints answer without waiting on the database.
+
+- Repeat hits for the same (recipient, type) are dropped in memory before
+  they are buffered; the flush also skips pairs already stored, so opens
+  and replies stay unique across workers.
+- Events for recipients that no longer exist (deleted campaigns, legacy
+  ids that never existed) are discarded at flush time.
+- Bare recipient ids from emails sent before signed tokens are accepted
+  only up to the last recipient id at the upgrade, which the migrate step
+  records once (TRACKING_LEGACY_MAX_ID overrides it), so ids of newer
+  recipients cannot be guessed.
+- Provider webhook events (app/webhooks.py) go through the same buffer;
+  they may carry only an email, which is resolved to the contact's latest
+  sent recipient at flush time, and bounces, complaints and unsubscribes
+  update recipient status and the suppression list in the same flush.
+- TRACKING_FLUSH_INTERVAL=0 writes each hit synchronously instead.
+
+Each process has its own buffer; anything not yet flushed is written at exit.
+"""
+
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import Blueprint, current_app, render_template, request
+
+from .models import db, AppSetting, Recipient, TrackingEvent
+from .metrics import TRACKING_EVENTS, TRACKING_REJECTED
+from .tokens import get_signer
+
+IN_CLAUSE_CHUNK = 500
+# Event types that change recipient status or the suppression list when flushed
+OUTCOME_TYPES = ('bounce', 'complaint', 'unsubscribe', 'dropped')
+
+# 1x1 transparent GIF, its ETag and cache headers are built once
+PIXEL_GIF = b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x80\x00\x00\xff\xff\xff\x00\x00\x00\x21\xf9\x04\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x44\x01\x00\x3b'
+PIXEL_ETAG = hashlib.sha1(PIXEL_GIF).hexdigest()[:16]
+
+tracking_bp = Blueprint('tracking', __name__)
+
+
+def _chunks(values, size=IN_CLAUSE_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class EventBuffer:
+    """
+    Collects tracking events and writes them in batches.
+
+    Args:
+        app: Flask app whose context is used for flushes
+        flush_interval: Seconds between background flushes (0 = write immediately)
+        flush_size: Buffered events that trigger an early flush
+        seen_size: Recently accepted (recipient, type) pairs remembered for dedupe
+    """
+
+    def __init__(self, app, flush_interval=1.0, flush_size=500, seen_size=100000):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = flush_size * 20
+        self.seen_size = seen_size
+        self.seen = OrderedDict()
+        self.pending = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def add(self, recipient_id, event_type, unique=True, timestamp=None):
+        """
+        Queue one event. Returns False if it was dropped as a repeat.
+        """
+        return self.add_many([(recipient_id, event_type, unique, timestamp or datetime.now(), None, None)]) == 1
+
+    def add_many(self, events):
+        """
+        Queue a batch of events under one lock acquisition.
+
+        Args:
+            events: (recipient_id, event_type, unique, timestamp, email, detail)
+                tuples; recipient_id may be None if email is given
+
+        Returns:
+            int: Number of events queued (repeats are dropped)
+        """
+        accepted = 0
+        with self.lock:
+            for event in events:
+                if event[2]:
+                    key = (event[0] if event[0] is not None else event[4], event[1])
+                    if key in self.seen:
+                        self.seen.move_to_end(key)
+                        continue
+                    self.seen[key] = True
+                    if len(self.seen) > self.seen_size:
+                        self.seen.popitem(last=False)
+                self.pending.append(event)
+                accepted += 1
+            full = len(self.pending) >= self.flush_size
+
+        if accepted and self.flush_interval <= 0:
+            self.flush()
+        elif full:
+            self.wake.set()
+        return accepted
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of rows inserted."""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return 0
+
+            try:
+                with self.app.app_context():
+                    inserted = self._write(batch)
+                    db.session.remove()
+                return inserted
+            except Exception as e:
+                print(f"⚠️  Tracking flush failed, will retry: {e}")
+                with self.lock:
+                    # Keep the newest events if the database stays unavailable
+                    self.pending = (batch + self.pending)[-self.max_pending:]
+                return 0
+
+    def _write(self, batch):
+        batch = _resolve_emails(batch)
+        recipient_ids = {event[0] for event in batch if event[0] is not None}
+        unique_types = {event[1] for event in batch if event[2]}
+
+        existing_recipients = set()
+        stored = set()
+        for chunk in _chunks(recipient_ids):
+            existing_recipients.update(
+                row[0] for row in db.session.query(Recipient.id).filter(Recipient.id.in_(chunk)))
+            if unique_types:
+                stored.update(db.session.query(TrackingEvent.recipient_id, TrackingEvent.type).filter(
+                    TrackingEvent.recipient_id.in_(chunk), TrackingEvent.type.in_(unique_types)))
+
+        rows = []
+        for recipient_id, event_type, unique, timestamp, email, detail in batch:
+            if recipient_id not in existing_recipients:
+                continue
+            if unique:
+                if (recipient_id, event_type) in stored:
+                    continue
+                stored.add((recipient_id, event_type))
+            rows.append({'recipient_id': recipient_id, 'type': event_type, 'timestamp': timestamp})
+
+        if rows:
+            db.session.execute(db.insert(TrackingEvent), rows)
+            db.session.commit()
+            for row in rows:
+                TRACKING_EVENTS.inc(type=row['type'])
+        _apply_outcomes([event for event in batch if event[1] in OUTCOME_TYPES])
+        return len(rows)
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def start(self):
+        if self.flush_interval > 0 and self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='tracking-flush', daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+        return self
+
+
+def _resolve_emails(batch):
+    """
+    Fill in the recipient id of events that only carry an email: the
+    contact's most recent recipient that was sent to.
+    """
+    from .contacts import normalize_email
+    from .models import Contact
+
+    emails = {normalize_email(event[4]) for event in batch if event[0] is None and event[4]}
+    if not emails:
+        return batch
+
+    latest = {}
+    for chunk in _chunks(emails):
+        latest.update(db.session.query(Contact.email, db.func.max(Recipient.id)).join(
+            Recipient, Recipient.contact_id == Contact.id).filter(
+            Contact.email.in_(chunk), Recipient.sent_at.isnot(None)).group_by(Contact.email))
+
+    return [
+        (latest.get(normalize_email(event[4])),) + event[1:] if event[0] is None and event[4] else event
+        for event in batch
+    ]
+
+
+def _apply_outcomes(events):
+    """
+    Bounces mark the recipient 'Bounced' and suppress the address,
+    complaints and unsubscribes suppress it, drops mark the recipient
+    'Failed'. Every step is idempotent, so redelivered events are harmless.
+    """
+    if not events:
+        return
+    from .suppression import mark_bounced, suppress
+
+    bounced = [event for event in events if event[1] == 'bounce']
+    if bounced:
+        mark_bounced({event[0] for event in bounced if event[0] is not None},
+                     {event[4] for event in bounced if event[4]}, bounced[-1][5])
+    for event_type, reason in (('complaint', 'complaint'), ('unsubscribe', 'unsubscribe')):
+        emails = {event[4] for event in events if event[1] == event_type and event[4]}
+        if emails:
+            suppress(emails, reason, 'webhook')
+
+    dropped = [event[0] for event in events if event[1] == 'dropped' and event[0] is not None]
+    for chunk in _chunks(dropped):
+        Recipient.query.filter(Recipient.id.in_(chunk), Recipient.status == 'Sent').update(
+            {'status': 'Failed'}, synchronize_session=False)
+    db.session.commit()
+
+
+def init_app(app, start=True):
+    """Create the app's tracking buffer and, unless start is False, its flush thread."""
+    buffer = EventBuffer(
+        app,
+        flush_interval=float(app.config.get('TRACKING_FLUSH_INTERVAL', 1.0)),
+        flush_size=int(app.config.get('TRACKING_FLUSH_SIZE', 500)),
+    )
+    app.extensions['tracking_buffer'] = buffer
+    return buffer.start() if start else buffer
+
+
+def get_buffer(app):
+    buffer = app.extensions.get('tracking_buffer')
+    if buffer is None:
+        buffer = init_app(app)
+    return buffer
+
+
+def pixel_headers(max_age):
+    """
+    Headers for the open pixel. Every token URL is unique to one recipient
+    and only the first open counts, so the pixel may be cached by browsers,
+    image proxies and CDNs; max_age=0 makes every open reach the server.
+    """
+    if max_age > 0:
+        cache_control = f'public, max-age={max_age}, immutable'
+    else:
+        cache_control = 'no-cache, no-store, must-revalidate'
+    return [
+        ('Content-Type', 'image/gif'),
+        ('Content-Length', str(len(PIXEL_GIF))),
+        ('Cache-Control', cache_control),
+        ('ETag', f'"{PIXEL_ETAG}"'),
+    ]
+
+
+LEGACY_CUTOVER_SETTING = 'tracking_legacy_max_id'
+
+
+def record_legacy_cutover():
+    """
+    Record the highest recipient id as the last one whose emails may carry
+    bare tracking ids. Only the first call stores a value (migrate calls it
+    on every deploy), so the cutover stays at the upgrade to signed tokens.
+    """
+    from sqlalchemy.exc import IntegrityError
+
+    if db.session.get(AppSetting, LEGACY_CUTOVER_SETTING) is not None:
+        return
+    max_id = db.session.query(db.func.max(Recipient.id)).scalar() or 0
+    db.session.add(AppSetting(name=LEGACY_CUTOVER_SETTING, value=str(max_id)))
+    try:
+        db.session.commit()
+        print(f"🔒 Bare tracking ids accepted up to recipient {max_id}")
+    except IntegrityError:
+        # A concurrent migrate recorded it first
+        db.session.rollback()
+
+
+def legacy_max_id(app):
+    """
+    Highest bare recipient id accepted in tracking links: TRACKING_LEGACY_MAX_ID
+    if set, else the cutover recorded by migrate (none accepted before that).
+    """
+    max_id = app.extensions.get('tracking_legacy_max_id')
+    if max_id is None:
+        max_id = app.config.get('TRACKING_LEGACY_MAX_ID')
+        if max_id is None:
+            setting = db.session.get(AppSetting, LEGACY_CUTOVER_SETTING)
+            if setting is None:
+                return 0
+            max_id = int(setting.value)
+        app.extensions['tracking_legacy_max_id'] = max_id
+    return max_id
+
+
+# --- Routes ---
+
+def _tracked_recipient(token, event_type):
+    """
+    Resolve the id segment of a tracking URL to a recipient id without a
+    database read: a signed token, or a bare recipient id from emails sent
+    before tokens (unless TRACKING_LEGACY_IDS is off, up to legacy_max_id).
+    Returns None if rejected.
+    """
+    # isdigit() alone also accepts non-ASCII digits such as '²', which int() rejects
+    if token.isascii() and token.isdigit():
+        if current_app.config.get('TRACKING_LEGACY_IDS', True):
+            recipient_id = int(token)
+            if 0 < recipient_id <= legacy_max_id(current_app):
+                return recipient_id
+    else:
+        ids = get_signer(current_app).verify(token)
+        if ids:
+            return ids[0]
+    TRACKING_REJECTED.inc(type=event_type)
+    return None
+
+
+@tracking_bp.route('/track/open/<token>')
+def track_open(token):
+    recipient_id = _tracked_recipient(token, 'open')
+    if recipient_id is not None:
+        # Unique opens: repeats are dropped by the buffer, the write happens in batches
+        get_buffer(current_app).add(recipient_id, 'open')
+
+    headers = current_app.extensions.get('tracking_pixel_headers')
+    if headers is None:
+        headers = current_app.extensions['tracking_pixel_headers'] = pixel_headers(
+            int(current_app.config.get('TRACKING_PIXEL_MAX_AGE', 86400)))
+
+    if PIXEL_ETAG in request.if_none_match:
+        return current_app.response_class(status=304, headers=headers[2:])
+    return current_app.response_class(PIXEL_GIF, headers=headers)
+
+
+@tracking_bp.route('/unsubscribe/<token>', methods=['GET', 'POST'])
+def unsubscribe(token):
+    """
+    GET shows a confirmation (link scanners prefetch GETs); POST, from the
+    page or a mail client's one-click List-Unsubscribe, suppresses the address.
+    """
+    from .models import Contact
+    from .suppression import suppress
+
+    ids = get_signer(current_app).verify(token)
+    email = None
+    if ids:
+        email = db.session.query(Contact.email).join(Recipient, Recipient.contact_id == Contact.id).filter(
+            Recipient.id == ids[0]).scalar()
+        if email is None:
+            # Archived campaigns keep their recipients in Parquet files
+            from .archive import archived_email
+            from .models import CampaignArchive
+            archive = db.session.get(CampaignArchive, ids[1])
+            email = archived_email(archive, ids[0]) if archive else None
+    if email is None:
+        TRACKING_REJECTED.inc(type='unsubscribe')
+        return render_template('unsubscribe.html', email=None), 404
+
+    if request.method == 'POST':
+        suppress([email], 'unsubscribe', f'campaign {ids[1]}')
+        return render_template('unsubscribe.html', email=email, done=True)
+    return render_template('unsubscribe.html', email=email)
+
+
+@tracking_bp.route('/track/replied/<token>')
+def track_replied(token):
+    recipient_id = _tracked_recipient(token, 'replied')
+    if recipient_id is not None:
+        get_buffer(current_app).add(recipient_id, 'replied')
+
+    return render_template('tracking_success.html')
@@ -0,0 +1,47 @@
+"""
+Standalone Tracking App
+
+A minimal Flask app that serves only the tracking endpoints (open pixel,
+reply link, unsubscribe, provider webhooks) and /metrics, so pixel traffic can run on its own workers and
+scale independently of the dashboard. It shares the database and
+SECRET_KEY with the main app but skips everything else create_app does:
+no UI routes, no pandas, no schema setup and no birthday scheduler.
+
+Run it with:
+    gunicorn --bind 0.0.0.0:$PORT tracking_wsgi:app
+
+and point TRACKING_BASE_URL of the main app at its public URL.
+"""
+
+import os
+
+from flask import Flask
+
+from . import db, load_database_config, load_tracking_config
+
+
+def create_tracking_app():
+    app = Flask(__name__)
+
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-please-change-in-production')
+    load_database_config(app)
+    load_tracking_config(app)
+
+    db.init_app(app)
+
+    from . import database, metrics, tracking, webhooks
+    database.init_app(app, db)
+    metrics.init_app(app, db)
+    tracking.init_app(app)
+    app.register_blueprint(tracking.tracking_bp)
+    app.register_blueprint(webhooks.webhooks_bp)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/ping')
+    def ping():
+        return {'status': 'ok'}
+
+    return app
@@ -0,0 +1,230 @@
+"""
+Tracking Event Storage and Retention
+
+On PostgreSQL, tracking_event is a range-partitioned table with one
+partition per month (tracking_event_y2026m01, ...) plus a default
+partition, so queries filtered on timestamp (birthday dedupe, retention,
+time-series rollups) only touch the months they need, and expired months
+are dropped as whole tables instead of deleted row by row. An existing
+plain table is converted on first startup.
+
+SQLite has no partitioning; there the table keeps its single layout with
+timestamp and (recipient_id, type) indexes, and retention deletes rows.
+
+Retention (TRACKING_RETENTION_DAYS, off unless set) rolls raw events
+older than the window into per-campaign daily TrackingRollup rows before
+removing them.
+Birthday sends of the current year are always kept because the birthday
+job checks them to avoid sending twice.
+"""
+
+import re
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_, func, not_
+
+from .models import db, Recipient, TrackingEvent, TrackingRollup
+
+PARTITION_PREFIX = 'tracking_event_y'
+_PARTITION_RE = re.compile(r'^tracking_event_y(\d{4})m(\d{2})$')
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _next_month(value):
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _partition_name(month):
+    return f'{PARTITION_PREFIX}{month.year}m{month.month:02d}'
+
+
+# --- PostgreSQL partitions ---
+
+def _relkind(conn, name):
+    return conn.execute(db.text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+                        {'name': name}).scalar()
+
+
+def _create_partitioned_table(conn, name='tracking_event'):
+    conn.execute(db.text(f'''
+        CREATE TABLE {name} (
+            id SERIAL,
+            recipient_id INTEGER NOT NULL REFERENCES recipient (id),
+            type VARCHAR(20) NOT NULL,
+            "timestamp" TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+    '''))
+    conn.execute(db.text(f'CREATE TABLE {name}_default PARTITION OF {name} DEFAULT'))
+    conn.execute(db.text(f'CREATE INDEX ix_{name}_recipient_type ON {name} (recipient_id, type)'))
+    conn.execute(db.text(f'CREATE INDEX ix_{name}_timestamp ON {name} ("timestamp")'))
+
+
+def list_partitions(conn):
+    """Return {month start date: partition name} for the monthly partitions."""
+    rows = conn.execute(db.text('''
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = 'tracking_event'
+    '''))
+    partitions = {}
+    for (name,) in rows:
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def ensure_partitions(conn, start, months_ahead=3):
+    """
+    Create monthly partitions from the month of `start` through
+    `months_ahead` months after the current month.
+    """
+    existing = list_partitions(conn)
+    month = _month_start(start)
+    last = _month_start(date.today())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    created = []
+    while month <= last:
+        if month not in existing:
+            name = _partition_name(month)
+            conn.execute(db.text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF tracking_event "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')"
+            ))
+            created.append(name)
+        month = _next_month(month)
+    return created
+
+
+def prepare_schema(months_ahead=3):
+    """
+    Create (or convert to) the partitioned tracking_event table on
+    PostgreSQL. Must run before db.create_all(); a no-op on other databases.
+    """
+    engine = db.engine
+    if engine.name != 'postgresql':
+        return
+
+    # tracking_event references recipient, which references campaign and contact
+    db.metadata.create_all(engine, tables=[table for table in db.metadata.sorted_tables
+                                           if table.name in ('campaign', 'contact', 'recipient')])
+
+    with engine.begin() as conn:
+        kind = _relkind(conn, 'tracking_event')
+        if kind == 'p':
+            ensure_partitions(conn, date.today(), months_ahead)
+            return
+
+        if kind is None:
+            _create_partitioned_table(conn)
+            ensure_partitions(conn, date.today(), months_ahead)
+            print("✅ Created partitioned tracking_event table")
+            return
+
+        # One-time conversion of an existing plain table
+        print("🔄 Converting tracking_event to monthly partitions...")
+        conn.execute(db.text('ALTER TABLE tracking_event RENAME TO tracking_event_unpartitioned'))
+        _create_partitioned_table(conn)
+        oldest = conn.execute(db.text('SELECT min("timestamp") FROM tracking_event_unpartitioned')).scalar()
+        ensure_partitions(conn, (oldest or datetime.now()).date(), months_ahead)
+        conn.execute(db.text('''
+            INSERT INTO tracking_event (id, recipient_id, type, "timestamp")
+            SELECT id, recipient_id, type, COALESCE("timestamp", now()) FROM tracking_event_unpartitioned
+        '''))
+        conn.execute(db.text(
+            "SELECT setval(pg_get_serial_sequence('tracking_event', 'id'), "
+            "COALESCE((SELECT max(id) FROM tracking_event), 0) + 1, false)"
+        ))
+        conn.execute(db.text('DROP TABLE tracking_event_unpartitioned'))
+        print("✅ tracking_event converted to monthly partitions")
+
+
+def ensure_indexes():
+    """Add the tracking_event indexes to databases created before they existed."""
+    with db.engine.begin() as conn:
+        conn.execute(db.text(
+            'CREATE INDEX IF NOT EXISTS ix_tracking_event_recipient_type ON tracking_event (recipient_id, type)'))
+        conn.execute(db.text(
+            'CREATE INDEX IF NOT EXISTS ix_tracking_event_timestamp ON tracking_event ("timestamp")'))
+
+
+# --- Retention ---
+
+def _rollup(condition):
+    """Add counts of the events matching `condition` to TrackingRollup."""
+    day = func.date(TrackingEvent.timestamp)
+    rows = db.session.query(
+        Recipient.campaign_id, day, TrackingEvent.type, func.count(TrackingEvent.id)
+    ).join(Recipient, Recipient.id == TrackingEvent.recipient_id).filter(condition).group_by(
+        Recipient.campaign_id, day, TrackingEvent.type
+    ).all()
+
+    for campaign_id, event_day, event_type, count in rows:
+        if isinstance(event_day, str):
+            event_day = date.fromisoformat(event_day)
+        rollup = TrackingRollup.query.filter_by(campaign_id=campaign_id, day=event_day, type=event_type).first()
+        if rollup:
+            rollup.count += count
+        else:
+            db.session.add(TrackingRollup(campaign_id=campaign_id, day=event_day, type=event_type, count=count))
+    return sum(row[3] for row in rows)
+
+
+def apply_retention(retention_days, today=None):
+    """
+    Roll up and remove raw tracking events older than `retention_days`
+    whole days. Current-year birthday_sent events are never removed.
+
+    Returns:
+        dict: events rolled up, partitions dropped and rows deleted
+    """
+    today = today or date.today()
+    cutoff = datetime.combine(today - timedelta(days=retention_days), time.min)
+    year_start = datetime(today.year, 1, 1)
+
+    keep = and_(TrackingEvent.type == 'birthday_sent', TrackingEvent.timestamp >= year_start)
+    expired = and_(TrackingEvent.timestamp < cutoff, not_(keep))
+
+    rolled = _rollup(expired)
+
+    # Months entirely before both the cutoff and this year are dropped whole
+    dropped = []
+    if db.engine.name == 'postgresql':
+        drop_before = min(cutoff, year_start).date()
+        conn = db.session.connection()
+        for month, name in sorted(list_partitions(conn).items()):
+            if _next_month(month) <= drop_before:
+                conn.execute(db.text(f'DROP TABLE {name}'))
+                dropped.append(name)
+
+    deleted = TrackingEvent.query.filter(expired).delete(synchronize_session=False)
+    db.session.commit()
+    return {'rolled_up': rolled, 'partitions_dropped': dropped, 'deleted': deleted}
+
+
+def run_maintenance(app):
+    """
+    Daily job: create upcoming partitions and apply retention.
+    """
+    with app.app_context():
+        try:
+            if db.engine.name == 'postgresql':
+                with db.engine.begin() as conn:
+                    created = ensure_partitions(conn, date.today(), int(app.config.get('TRACKING_PARTITIONS_AHEAD', 3)))
+                if created:
+                    print(f"🗂️  Created tracking partitions: {', '.join(created)}")
+
+            retention_days = int(app.config.get('TRACKING_RETENTION_DAYS', 0))
+            if retention_days > 0:
+                result = apply_retention(retention_days)
+                print(f"🧹 Tracking retention: {result['rolled_up']} events rolled up, "
+                      f"{len(result['partitions_dropped'])} partitions dropped, {result['deleted']} rows deleted")
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Tracking maintenance failed: {e}")
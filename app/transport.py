@@ -0,0 +1,403 @@
+"""
+Mail Transports
+
+Every outgoing message goes through a Transport, selected by the
+MAIL_TRANSPORT setting:
+
+- smtp:     SMTP relay (SMTP_HOST/SMTP_PORT, STARTTLS + login)
+- sendgrid: SendGrid v3 HTTP API (SENDGRID_API_KEY)
+- memory:   keeps messages in-process, for tests and dry runs
+- sink:     plain SMTP to a local SMTPSinkServer (SINK_HOST/SINK_PORT),
+            for end-to-end throughput measurements with no network
+
+The sink server can be started with `python scripts/smtp_sink.py`.
+"""
+
+import os
+import random
+import smtplib
+import socketserver
+import threading
+from collections import deque
+from email import message_from_bytes, message_from_string
+from email.message import Message
+
+from .metrics import SMTP_CONNECT_SECONDS, SMTP_LOGIN_SECONDS, SMTP_SEND_SECONDS
+
+DEFAULT_SMTP_HOST = 'smtp.gmail.com'
+DEFAULT_SMTP_PORT = 587
+DEFAULT_SINK_HOST = '127.0.0.1'
+DEFAULT_SINK_PORT = 1025
+# MIME headers carried over to SendGrid messages (others are rebuilt from the Mail fields)
+SENDGRID_PASSTHROUGH_HEADERS = ('List-Unsubscribe', 'List-Unsubscribe-Post', 'List-Id')
+# Signed tracking token of a per-recipient message; sent to SendGrid as the
+# recipient_token custom arg, which comes back on every webhook event
+RECIPIENT_TOKEN_HEADER = 'X-Recipient-Token'
+
+
+class Transport:
+    """
+    Base class. Subclasses implement send(); open()/close() manage any
+    connection so one transport can be reused for many messages.
+    """
+
+    name = 'base'
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, from_addr, to_addrs, message):
+        """
+        Send one message.
+
+        Args:
+            from_addr: Envelope sender
+            to_addrs: List of envelope recipients
+            message: email.message.Message, str or bytes (full RFC 5322 message)
+        """
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class SMTPTransport(Transport):
+    name = 'smtp'
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.server = None
+
+    def open(self):
+        if self.server is not None:
+            return
+        with SMTP_CONNECT_SECONDS.time(transport=self.name):
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        with SMTP_LOGIN_SECONDS.time(transport=self.name):
+            if self.use_tls:
+                server.starttls()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        self.server = server
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            pass
+        self.server = None
+
+    def send(self, from_addr, to_addrs, message):
+        if self.server is None:
+            self.open()
+        if isinstance(message, Message):
+            message = message.as_string()
+        try:
+            with SMTP_SEND_SECONDS.time(transport=self.name):
+                return self.server.sendmail(from_addr, to_addrs, message)
+        except smtplib.SMTPServerDisconnected:
+            # Connection is unusable; reconnect on the next send
+            self.server = None
+            raise
+
+
+class SendGridTransport(Transport):
+    """
+    Converts the MIME message into a SendGrid Mail object. Multiple
+    recipients get one personalization each, so they don't see each other.
+    List headers (SENDGRID_PASSTHROUGH_HEADERS) are copied over as-is and
+    the recipient token header becomes the recipient_token custom arg.
+    """
+
+    name = 'sendgrid'
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.client = None
+
+    def open(self):
+        if self.client is None:
+            from sendgrid import SendGridAPIClient
+            self.client = SendGridAPIClient(self.api_key)
+
+    def send(self, from_addr, to_addrs, message):
+        from sendgrid.helpers.mail import CustomArg, Header, Mail
+
+        if self.client is None:
+            self.open()
+        if isinstance(message, bytes):
+            message = message_from_bytes(message)
+        elif isinstance(message, str):
+            message = message_from_string(message)
+
+        html_content = None
+        text_content = None
+        for part in message.walk():
+            if part.get_content_maintype() == 'multipart':
+                continue
+            payload = part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8')
+            if part.get_content_type() == 'text/html' and html_content is None:
+                html_content = payload
+            elif part.get_content_type() == 'text/plain' and text_content is None:
+                text_content = payload
+
+        mail = Mail(
+            from_email=from_addr,
+            to_emails=list(to_addrs),
+            subject=str(message['Subject'] or ''),
+            html_content=html_content,
+            plain_text_content=text_content,
+            is_multiple=len(to_addrs) > 1
+        )
+        for name in SENDGRID_PASSTHROUGH_HEADERS:
+            if message[name] is not None:
+                mail.add_header(Header(name, str(message[name])))
+        if message[RECIPIENT_TOKEN_HEADER]:
+            mail.add_custom_arg(CustomArg('recipient_token', str(message[RECIPIENT_TOKEN_HEADER])))
+        with SMTP_SEND_SECONDS.time(transport=self.name):
+            return self.client.send(mail)
+
+
+class MemoryTransport(Transport):
+    """
+    Records messages instead of sending them. The outbox is shared by all
+    instances so callers can inspect what a background sender produced;
+    it keeps only the last OUTBOX_SIZE messages, with sent_count counting
+    all of them, so long dry runs don't grow memory.
+    """
+
+    name = 'memory'
+    OUTBOX_SIZE = 1000
+    outbox = deque(maxlen=OUTBOX_SIZE)
+    sent_count = 0
+    lock = threading.Lock()
+
+    def send(self, from_addr, to_addrs, message):
+        if isinstance(message, Message):
+            message = message.as_bytes()
+        elif isinstance(message, str):
+            message = message.encode('utf-8')
+        with MemoryTransport.lock:
+            MemoryTransport.outbox.append((from_addr, list(to_addrs), message))
+            MemoryTransport.sent_count += 1
+        return {}
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.outbox.clear()
+            cls.sent_count = 0
+
+
+def _config_value(config, key, default=None):
+    value = config.get(key) if config is not None else None
+    if value is None:
+        value = os.environ.get(key)
+    return default if value is None else value
+
+
+def _config_flag(config, key, default):
+    value = _config_value(config, key)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+
+def get_transport(sender_email=None, sender_password=None, config=None):
+    """
+    Build the transport selected by MAIL_TRANSPORT.
+
+    Args:
+        sender_email: Account used to log in to the SMTP relay
+        sender_password: Password for the SMTP relay account
+        config: Mapping to read settings from (e.g. app.config); falls back
+                to environment variables for missing keys
+
+    Returns:
+        An unopened Transport instance
+    """
+    kind = str(_config_value(config, 'MAIL_TRANSPORT', 'smtp')).lower()
+
+    if kind == 'smtp':
+        return SMTPTransport(
+            host=_config_value(config, 'SMTP_HOST', DEFAULT_SMTP_HOST),
+            port=int(_config_value(config, 'SMTP_PORT', DEFAULT_SMTP_PORT)),
+            username=sender_email,
+            password=sender_password,
+            use_tls=_config_flag(config, 'SMTP_USE_TLS', True),
+            timeout=float(_config_value(config, 'SMTP_TIMEOUT', 30))
+        )
+    if kind == 'sink':
+        return SMTPTransport(
+            host=_config_value(config, 'SINK_HOST', DEFAULT_SINK_HOST),
+            port=int(_config_value(config, 'SINK_PORT', DEFAULT_SINK_PORT)),
+            use_tls=False
+        )
+    if kind == 'sendgrid':
+        return SendGridTransport(_config_value(config, 'SENDGRID_API_KEY'))
+    if kind == 'memory':
+        return MemoryTransport()
+
+    raise ValueError(f"Unknown MAIL_TRANSPORT '{kind}'")
+
+
+# --- Local SMTP sink ---
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """
+    Minimal SMTP server side: accepts every envelope and discards (or keeps)
+    the message. Supports EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP and QUIT.
+    """
+
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        sink = self.server.sink
+        self.reply('220 localhost SMTP sink ready')
+        mail_from = None
+        rcpt_to = []
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+
+            if verb == 'EHLO':
+                self.wfile.write(b'250-localhost\r\n250-PIPELINING\r\n250-8BITMIME\r\n250 SIZE 52428800\r\n')
+            elif verb == 'HELO':
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                mail_from = command[10:].strip().split(' ')[0]
+                rcpt_to = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                if sink.should_throttle():
+                    self.reply('451 4.7.1 Rate limited, try again later')
+                    continue
+                if sink.should_reject():
+                    self.reply('550 5.1.1 User unknown')
+                    continue
+                rcpt_to.append(command[8:].strip().split(' ')[0])
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                if not rcpt_to:
+                    self.reply('503 Need RCPT command')
+                    continue
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                chunks = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    if data_line.startswith(b'..'):
+                        data_line = data_line[1:]
+                    chunks.append(data_line)
+                sink.record(mail_from, rcpt_to, b''.join(chunks))
+                mail_from, rcpt_to = None, []
+                self.reply('250 OK: queued')
+            elif verb == 'RSET':
+                mail_from, rcpt_to = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSinkServer:
+    """
+    Threaded local SMTP server that accepts and counts every message.
+
+    throttle_ratio answers that share of RCPT commands with a 451 reply, to
+    exercise retry and rate-adaptation logic; reject_ratio answers that
+    share with a 550 (unknown user), to exercise bounce handling.
+
+    Usage:
+        sink = SMTPSinkServer(port=0).start()   # port 0 picks a free port
+        ... send to ('127.0.0.1', sink.port) ...
+        sink.stop()
+    """
+
+    def __init__(self, host=DEFAULT_SINK_HOST, port=DEFAULT_SINK_PORT, keep_messages=False, throttle_ratio=0.0,
+                 reject_ratio=0.0):
+        self.host = host
+        self.requested_port = port
+        self.keep_messages = keep_messages
+        self.throttle_ratio = throttle_ratio
+        self.throttled_count = 0
+        self.reject_ratio = reject_ratio
+        self.rejected_count = 0
+        self.messages = []
+        self.message_count = 0
+        self.recipient_count = 0
+        self.byte_count = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1] if self.server else self.requested_port
+
+    def should_throttle(self):
+        if self.throttle_ratio <= 0 or random.random() >= self.throttle_ratio:
+            return False
+        with self.lock:
+            self.throttled_count += 1
+        return True
+
+    def should_reject(self):
+        if self.reject_ratio <= 0 or random.random() >= self.reject_ratio:
+            return False
+        with self.lock:
+            self.rejected_count += 1
+        return True
+
+    def record(self, mail_from, rcpt_to, data):
+        with self.lock:
+            self.message_count += 1
+            self.recipient_count += len(rcpt_to)
+            self.byte_count += len(data)
+            if self.keep_messages:
+                self.messages.append((mail_from, list(rcpt_to), data))
+
+    def start(self):
+        self.server = _ThreadingSMTPServer((self.host, self.requested_port), _SinkHandler)
+        self.server.sink = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -1,16 +1,40 @@
-import pandas as pd
 import os
-from datetime import datetime
+from datetime import date, datetime
+from functools import lru_cache
 from werkzeug.utils import secure_filename
 
-ALLOWED_EXTENSIONS = {'csv', 'xlsx'}
+ALLOWED_EXTENSIONS = {'csv', 'csv.gz', 'xlsx', 'parquet'}
+# A per-recipient timezone column is picked up by name, without a form field
+TIMEZONE_COLUMNS = ('timezone', 'time zone', 'time_zone', 'tz')
+
+def file_extension(filename):
+    """Lower-case extension of a file name; 'csv.gz' counts as one extension."""
+    lower = filename.lower()
+    if lower.endswith('.csv.gz'):
+        return 'csv.gz'
+    return lower.rsplit('.', 1)[1] if '.' in lower else ''
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return file_extension(filename) in ALLOWED_EXTENSIONS
+
+def find_column(columns, wanted):
+    """
+    The column of `columns` matching the name `wanted` case-insensitively,
+    or None.
+    """
+    if not wanted:
+        return None
+    key = wanted.lower().strip()
+    for column in columns:
+        if str(column).lower().strip() == key:
+            return column
+    return wanted if wanted in columns else None
 
 def parse_recipient_file(file_storage, email_col_name, name_col_name=None, dob_col_name=None):
     """
-    Parses a CSV or Excel file and returns a list of recipient data.
+    Parses a CSV (optionally gzipped), Excel or Parquet file and returns a list of recipient data.
+    Only the mapped columns (and a timezone column, if present) are read; see
+    read_recipient_columns for the readers used.
     
     Args:
         file_storage: The uploaded file
@@ -20,103 +44,308 @@ def parse_recipient_file(file_storage, email_col_name, name_col_name=None, dob_c
         
     Returns:
         tuple: (list of recipient dicts, error_message)
-               Each recipient dict contains: {'email': str, 'name': str|None, 'dob': date|None}
+               Each recipient dict contains: {'email': str, 'name': str|None, 'dob': date|None,
+               'timezone': str|None}
     """
     try:
         filename = secure_filename(file_storage.filename)
-        ext = filename.rsplit('.', 1)[1].lower()
+        ext = file_extension(filename)
         
-        if ext == 'csv':
-            df = pd.read_csv(file_storage)
-        else:
-            df = pd.read_excel(file_storage)
-            
-        # Case-insensitive column mapping
-        col_map = {str(c).lower().strip(): c for c in df.columns}
-        
-        # Find email column
-        email_search_key = email_col_name.lower().strip()
-        if email_search_key in col_map:
-            actual_email_col = col_map[email_search_key]
-        elif email_col_name in df.columns:
-            actual_email_col = email_col_name
-        else:
-            return None, f"Column '{email_col_name}' not found. Available columns: {', '.join(map(str, df.columns))}"
-        
-        # Find name column (optional)
-        actual_name_col = None
-        if name_col_name:
-            name_search_key = name_col_name.lower().strip()
-            if name_search_key in col_map:
-                actual_name_col = col_map[name_search_key]
-            elif name_col_name in df.columns:
-                actual_name_col = name_col_name
-        
-        # Find DOB column (optional)
-        actual_dob_col = None
-        if dob_col_name:
-            dob_search_key = dob_col_name.lower().strip()
-            if dob_search_key in col_map:
-                actual_dob_col = col_map[dob_search_key]
-            elif dob_col_name in df.columns:
-                actual_dob_col = dob_col_name
-        
-        # Build recipient list
-        recipients = []
-        for idx, row in df.iterrows():
-            email = row[actual_email_col]
-            
-            # Skip invalid emails
-            if pd.isna(email) or '@' not in str(email):
-                continue
-                
-            email = str(email).strip()
-            
-            # Extract name if available
-            name = None
-            if actual_name_col and actual_name_col in row.index:
-                name_val = row[actual_name_col]
-                if not pd.isna(name_val):
-                    name = str(name_val).strip()
-            
-            # Extract and parse DOB if available
-            dob = None
-            if actual_dob_col and actual_dob_col in row.index:
-                dob_val = row[actual_dob_col]
-                if not pd.isna(dob_val):
-                    dob = parse_dob(dob_val)
-            
-            recipients.append({
-                'email': email,
-                'name': name,
-                'dob': dob
-            })
-        
-        # Remove duplicates based on email
-        seen_emails = set()
-        unique_recipients = []
-        for recipient in recipients:
-            if recipient['email'] not in seen_emails:
-                seen_emails.add(recipient['email'])
-                unique_recipients.append(recipient)
-        
-        return unique_recipients, None
+        def pick(columns):
+            # Only the mapped columns are read
+            found = [find_column(columns, col) for col in (email_col_name, name_col_name, dob_col_name)]
+            found.append(timezone_column(columns))
+            return [c for c in dict.fromkeys(found) if c is not None]
+        
+        columns, data = read_recipient_columns(file_storage, ext, pick)
+        
+        actual_email_col = find_column(columns, email_col_name)
+        if actual_email_col is None:
+            return None, f"Column '{email_col_name}' not found. Available columns: {', '.join(map(str, columns))}"
+        actual_name_col = find_column(columns, name_col_name)
+        actual_dob_col = find_column(columns, dob_col_name)
+        actual_tz_col = timezone_column(columns)
+        
+        recipients = build_recipients(
+            filename,
+            data[actual_email_col],
+            data[actual_name_col] if actual_name_col is not None else None,
+            data[actual_dob_col] if actual_dob_col is not None else None,
+            data[actual_tz_col] if actual_tz_col is not None else None
+        )
+        return recipients, None
         
     except Exception as e:
         return None, str(e)
 
+def timezone_column(columns):
+    """The first column of `columns` named like a timezone column, or None."""
+    for wanted in TIMEZONE_COLUMNS:
+        column = find_column(columns, wanted)
+        if column is not None:
+            return column
+    return None
+
+def read_recipient_columns(file_storage, ext, pick):
+    """
+    Reads the header of an uploaded file and the values of the columns
+    chosen by `pick`.
+    
+    With RECIPIENT_FAST_PARSE on (the default) CSVs are read by pyarrow's
+    multi-threaded reader, Parquet files by pyarrow and workbooks by the
+    streaming reader in app/xlsx_reader.py, which parses large sheets in a
+    small process pool only if RECIPIENT_PARSE_WORKERS is above 1. If pyarrow is missing or the fast reader fails, pandas
+    reads the file instead.
+    
+    Args:
+        file_storage: The uploaded file
+        ext: Extension from file_extension()
+        pick: Callable taking the header and returning the columns to read
+        
+    Returns:
+        tuple: (header, {column: list of values})
+    """
+    from flask import current_app, has_app_context
+    config = current_app.config if has_app_context() else {}
+    stream = file_storage.stream
+    
+    if config.get('RECIPIENT_FAST_PARSE', True):
+        try:
+            return _read_columns_fast(stream, ext, pick, config.get('RECIPIENT_PARSE_WORKERS') or 1)
+        except ImportError:
+            pass
+        except Exception as e:
+            print(f"⚠️  Fast {ext} reader failed, falling back to pandas: {e}")
+        stream.seek(0)
+    
+    import pandas as pd
+    if ext in ('csv', 'csv.gz'):
+        df = pd.read_csv(stream, compression='gzip' if ext == 'csv.gz' else None)
+    elif ext == 'parquet':
+        df = pd.read_parquet(stream)
+    else:
+        df = pd.read_excel(stream)
+    columns = list(df.columns)
+    return columns, {name: df[name].tolist() for name in pick(columns)}
+
+def _read_columns_fast(stream, ext, pick, workers):
+    if ext == 'xlsx':
+        from .xlsx_reader import read_columns
+        return read_columns(stream, pick, workers=workers)
+    
+    import pyarrow as pa
+    
+    if ext == 'parquet':
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(stream)
+        columns = parquet.schema_arrow.names
+        names = pick(columns)
+        table = parquet.read(columns=names, use_threads=True)
+    else:
+        import pyarrow.csv as pa_csv
+        
+        data = pa.py_buffer(stream.read())
+        
+        def source():
+            raw = pa.BufferReader(data)
+            return pa.CompressedInputStream(raw, 'gzip') if ext == 'csv.gz' else raw
+        
+        columns = pa_csv.open_csv(source()).schema.names
+        names = pick(columns)
+        # Mapped columns stay text, like pandas' defaults for these columns; parse_dob handles the dates
+        table = pa_csv.read_csv(
+            source(),
+            read_options=pa_csv.ReadOptions(use_threads=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=names,
+                column_types={name: pa.string() for name in names},
+                strings_can_be_null=True
+            )
+        )
+    return columns, {name: table.column(name).to_pylist() for name in names}
+
+def _is_missing(value):
+    # None, NaN and NaT are the only values not equal to themselves
+    return value is None or value != value
+
+def build_recipients(filename, emails, names=None, dobs=None, timezones=None):
+    """
+    Recipient dicts from column values: suppressed addresses (bounced,
+    complained, unsubscribed) and invalid emails are skipped and the first
+    row of each email wins.
+    
+    Args:
+        filename: Uploaded file name, for the log line
+        emails: Values of the email column
+        names: Values of the name column, or None
+        dobs: Values of the DOB column, or None
+        timezones: Values of the timezone column, or None (unknown zones are dropped)
+        
+    Returns:
+        list: {'email': str, 'name': str|None, 'dob': date|None, 'timezone': str|None} dicts
+    """
+    from .suppression import suppressed_emails
+    suppressed = suppressed_emails()
+    
+    recipients = []
+    seen_emails = set()
+    parsed_dobs = {}
+    parsed_timezones = {}
+    skipped = 0
+    for i, email in enumerate(emails):
+        if suppressed and str(email).strip().lower() in suppressed:
+            skipped += 1
+            continue
+        
+        # Skip invalid emails
+        if _is_missing(email) or '@' not in str(email):
+            continue
+        email = str(email).strip()
+        if email in seen_emails:
+            continue
+        seen_emails.add(email)
+        
+        name = None
+        if names is not None and not _is_missing(names[i]):
+            name = str(names[i]).strip()
+        
+        # Birthdays repeat across a big list, so each distinct value is parsed once
+        dob = None
+        if dobs is not None and not _is_missing(dobs[i]):
+            value = dobs[i]
+            if value not in parsed_dobs:
+                parsed_dobs[value] = parse_dob(value)
+            dob = parsed_dobs[value]
+        
+        timezone = None
+        if timezones is not None and not _is_missing(timezones[i]):
+            value = timezones[i]
+            if value not in parsed_timezones:
+                parsed_timezones[value] = parse_timezone(value)
+            timezone = parsed_timezones[value]
+        
+        recipients.append({
+            'email': email,
+            'name': name,
+            'dob': dob,
+            'timezone': timezone
+        })
+    
+    if skipped:
+        print(f"⏭️  Skipped {skipped} suppressed addresses in {filename}")
+    return recipients
+
+SNIFF_SAMPLE_ROWS = 5
+SNIFF_MAX_BYTES = 64 * 1024
+
+def sniff_columns(file_storage, sample_rows=SNIFF_SAMPLE_ROWS):
+    """
+    Reads only the header row and the first few rows of an uploaded file,
+    without pandas or a full parse: CSVs (plain or gzipped) are read up to
+    SNIFF_MAX_BYTES of text, workbooks are streamed with openpyxl in
+    read-only mode and Parquet files read one small batch.
+    
+    Args:
+        file_storage: The uploaded file
+        sample_rows: Number of data rows to return
+        
+    Returns:
+        tuple: (dict with 'columns', 'rows' and 'suggested' mappings, error_message)
+    """
+    filename = secure_filename(file_storage.filename or '')
+    if not allowed_file(filename):
+        return None, f"Unsupported file type. Allowed: {', '.join(sorted(ALLOWED_EXTENSIONS))}"
+    ext = file_extension(filename)
+
+    try:
+        if ext in ('csv', 'csv.gz'):
+            import csv
+            source = file_storage.stream
+            if ext == 'csv.gz':
+                import gzip
+                source = gzip.GzipFile(fileobj=source)
+            chunk = source.read(SNIFF_MAX_BYTES)
+            text = chunk.decode('utf-8-sig', errors='replace')
+            lines = text.splitlines()
+            if len(chunk) == SNIFF_MAX_BYTES and len(lines) > 1:
+                lines = lines[:-1]  # Last line may be cut off mid-row
+            reader = csv.reader(lines)
+            header = next(reader, [])
+            rows = [row for _, row in zip(range(sample_rows), reader)]
+        elif ext == 'parquet':
+            import pyarrow.parquet as pq
+            parquet = pq.ParquetFile(file_storage.stream)
+            header = parquet.schema_arrow.names
+            batch = next(parquet.iter_batches(batch_size=sample_rows), None)
+            rows = [list(row) for row in zip(*(column.to_pylist() for column in batch.columns))] if batch else []
+        else:
+            from openpyxl import load_workbook
+            workbook = load_workbook(file_storage.stream, read_only=True, data_only=True)
+            try:
+                sheet_rows = workbook.active.iter_rows(max_row=sample_rows + 1, values_only=True)
+                header = list(next(sheet_rows, ()))
+                rows = [list(row) for row in sheet_rows]
+            finally:
+                workbook.close()
+    except Exception as e:
+        return None, f"Could not read {filename}: {e}"
+
+    columns = [str(c).strip() if c is not None else '' for c in header]
+    while columns and not columns[-1]:
+        columns.pop()
+    if not any(columns):
+        return None, "The file has no header row"
+
+    def cell(value):
+        if value is None:
+            return ''
+        if isinstance(value, datetime):
+            return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat(sep=' ')
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value).strip()
+
+    rows = [[cell(row[i]) if i < len(row) else '' for i in range(len(columns))] for row in rows]
+    return {'columns': columns, 'rows': rows, 'suggested': suggest_columns(columns, rows)}, None
+
+def suggest_columns(columns, rows):
+    """
+    Guess the email, name and DOB columns from header names, falling back
+    to the column whose sample values look like email addresses.
+    """
+    lower = [c.lower() for c in columns]
+
+    def find(*keys, exclude=()):
+        for column, name in zip(columns, lower):
+            if any(key in name for key in keys) and not any(key in name for key in exclude):
+                return column
+        return None
+
+    email = find('email', 'e-mail') or find('mail')
+    if email is None and rows:
+        hits = [sum(1 for row in rows if '@' in row[i]) for i in range(len(columns))]
+        if max(hits) > len(rows) / 2:
+            email = columns[hits.index(max(hits))]
+    return {
+        'email': email,
+        'name': find('name', exclude=('mail', 'user')),
+        'dob': find('dob', 'birth', 'bday'),
+    }
+
 def parse_dob(dob_value):
     """
     Parse DOB from various formats to a datetime.date object.
     Accepts: YYYY-MM-DD, DD/MM/YYYY, MM/DD/YYYY, datetime objects, etc.
     Returns None if parsing fails.
     """
-    if pd.isna(dob_value):
+    if _is_missing(dob_value):
         return None
         
-    # If it's already a datetime/date object (from Excel)
-    if isinstance(dob_value, (datetime, pd.Timestamp)):
+    # If it's already a datetime/date object (from Excel, Parquet or pandas)
+    if isinstance(dob_value, datetime):
         return dob_value.date()
+    if isinstance(dob_value, date):
+        return dob_value
     
     # Try parsing string formats
     dob_str = str(dob_value).strip()
@@ -140,16 +369,32 @@ def parse_dob(dob_value):
     # If all formats fail, return None
     return None
 
+@lru_cache(maxsize=1)
+def _timezone_names():
+    from zoneinfo import available_timezones
+    return {name.lower(): name for name in available_timezones()}
+
+def parse_timezone(value):
+    """
+    Canonical IANA timezone name for a value such as 'europe/berlin' or
+    'UTC', matched case-insensitively.
+    Returns None if the value is empty or not a known zone.
+    """
+    if _is_missing(value):
+        return None
+    return _timezone_names().get(str(value).strip().lower())
+
 
 def parse_manual_emails(manual_input):
     """
     Parses a string of emails separated by commas or new lines.
+    Suppressed addresses are skipped, as in file uploads (see build_recipients).
     
     Args:
         manual_input: String containing emails
         
     Returns:
-        list: List of recipient dicts: {'email': str, 'name': None, 'dob': None}
+        list: List of recipient dicts: {'email': str, 'name': None, 'dob': None, 'timezone': None}
     """
     if not manual_input:
         return []
@@ -157,20 +402,47 @@ def parse_manual_emails(manual_input):
     # Replace commas with new lines and split
     raw_emails = manual_input.replace(',', '\n').split('\n')
     
-    recipients = []
+    return build_recipients('manual input', [email.strip() for email in raw_emails if email.strip()])
+
+
+def parse_sender_accounts(accounts_input):
+    """
+    Parses the sender pool textarea: one account per line as
+    "email, app-password[, daily quota[, max messages per second]]".
+    
+    Args:
+        accounts_input: String containing one account per line
+        
+    Returns:
+        tuple: (list of account dicts, error_message)
+               Each dict contains: {'email': str, 'password': str, 'daily_quota': int|None, 'rate_limit': float|None}
+    """
+    accounts = []
     seen_emails = set()
     
-    for email in raw_emails:
-        email = email.strip()
-        if not email or '@' not in email:
+    for line_number, line in enumerate((accounts_input or '').splitlines(), 1):
+        line = line.strip()
+        if not line:
             continue
             
-        if email not in seen_emails:
-            seen_emails.add(email)
-            recipients.append({
-                'email': email,
-                'name': None,
-                'dob': None
-            })
+        parts = [p.strip() for p in line.split(',')]
+        if len(parts) < 2 or '@' not in parts[0] or not parts[1]:
+            return None, f"Line {line_number}: expected 'email, app-password[, daily quota[, rate]]'"
             
-    return recipients
+        try:
+            daily_quota = int(parts[2]) if len(parts) > 2 and parts[2] else None
+            rate_limit = float(parts[3]) if len(parts) > 3 and parts[3] else None
+        except ValueError:
+            return None, f"Line {line_number}: quota and rate must be numbers"
+            
+        if parts[0].lower() in seen_emails:
+            continue
+        seen_emails.add(parts[0].lower())
+        accounts.append({
+            'email': parts[0],
+            'password': parts[1],
+            'daily_quota': daily_quota,
+            'rate_limit': rate_limit
+        })
+        
+    return accounts, None
@@ -0,0 +1,171 @@
+"""
+Provider Event Webhooks
+
+SendGrid posts delivery, engagement and bounce events as JSON arrays to
+/webhooks/sendgrid. The endpoint validates the batch, maps each event to
+a tracking event type and hands the whole batch to the tracking
+EventBuffer, then answers immediately; the buffer writes TrackingEvent
+rows and applies bounces, complaints and unsubscribes to Recipient.status
+and the suppression list in batches (see app/tracking.py). SendGrid
+retries any batch that does not get a 2xx quickly, so nothing here waits
+on the database.
+
+Events are matched to a recipient by the `recipient_token` custom arg
+(the signed tracking token SendGridTransport attaches to personalized
+messages) when present, otherwise by email. Every event type counts once
+per recipient, so retried batches are harmless.
+
+Posts must be signed: set SENDGRID_WEBHOOK_PUBLIC_KEY to the verification
+key of the signed event webhook. Without a key every post is rejected,
+since a forged unsubscribe or bounce would suppress a real address, unless
+SENDGRID_WEBHOOK_ALLOW_UNSIGNED is on (local replays only). The signed
+timestamp must also be within SENDGRID_WEBHOOK_MAX_AGE seconds of now, so
+a captured request cannot be replayed later to re-apply its bounces and
+unsubscribes.
+
+Recorded payloads can be replayed with `python scripts/replay_webhooks.py`.
+"""
+
+import json
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import Blueprint, current_app, request
+
+from .metrics import TRACKING_REJECTED, WEBHOOK_EVENTS
+from .tokens import get_signer
+from .tracking import get_buffer
+
+SIGNATURE_HEADER = 'X-Twilio-Email-Event-Webhook-Signature'
+TIMESTAMP_HEADER = 'X-Twilio-Email-Event-Webhook-Timestamp'
+
+# SendGrid event -> tracking event type; events not listed are acknowledged and ignored
+SENDGRID_EVENTS = {
+    'delivered': 'delivered',
+    'open': 'open',
+    'click': 'click',
+    'bounce': 'bounce',
+    'dropped': 'dropped',
+    'spamreport': 'complaint',
+    'unsubscribe': 'unsubscribe',
+    'group_unsubscribe': 'unsubscribe',
+}
+
+webhooks_bp = Blueprint('webhooks', __name__)
+
+
+def parse_sendgrid_event(event, signer):
+    """
+    Convert one SendGrid event into an EventBuffer tuple.
+
+    Returns:
+        tuple or None: (recipient_id, type, unique, timestamp, email, detail),
+        None for events that are ignored, or raises ValueError if invalid
+    """
+    if not isinstance(event, dict):
+        raise ValueError('event is not an object')
+    name = event.get('event')
+    email = event.get('email')
+    if not isinstance(name, str) or not isinstance(email, str) or '@' not in email:
+        raise ValueError('missing event or email')
+
+    event_type = SENDGRID_EVENTS.get(name)
+    if event_type is None:
+        return None
+    # 'blocked' bounces are temporary rejections by the receiving server
+    if event_type == 'bounce' and event.get('type') == 'blocked':
+        return None
+
+    try:
+        timestamp = datetime.fromtimestamp(int(event['timestamp']))
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        timestamp = datetime.now()
+
+    recipient_id = None
+    token = event.get('recipient_token')
+    if isinstance(token, str):
+        ids = signer.verify(token)
+        if ids:
+            recipient_id = ids[0]
+
+    detail = event.get('reason') or event.get('status')
+    return recipient_id, event_type, True, timestamp, email, str(detail)[:255] if detail else None
+
+
+def _verifier(app):
+    """The app's SendGrid signature verifier, or None if signing is not configured."""
+    if 'sendgrid_webhook_verifier' not in app.extensions:
+        key = app.config.get('SENDGRID_WEBHOOK_PUBLIC_KEY')
+        verifier = None
+        if key:
+            from sendgrid.helpers.eventwebhook import EventWebhook
+            verifier = EventWebhook(key)
+        app.extensions['sendgrid_webhook_verifier'] = verifier
+    return app.extensions['sendgrid_webhook_verifier']
+
+
+def _is_fresh(timestamp, max_age):
+    """True if a signed timestamp (Unix seconds) is within max_age seconds of now (0 = no limit)."""
+    if not max_age:
+        return True
+    try:
+        return abs(time.time() - int(timestamp)) <= max_age
+    except ValueError:
+        return False
+
+
+@webhooks_bp.route('/webhooks/sendgrid', methods=['POST'])
+def sendgrid_events():
+    body = request.get_data(cache=False)
+    if len(body) > current_app.config.get('WEBHOOK_MAX_BYTES', 5 * 1024 * 1024):
+        return {'error': 'payload too large'}, 413
+
+    verifier = _verifier(current_app)
+    if verifier is None and not current_app.config.get('SENDGRID_WEBHOOK_ALLOW_UNSIGNED', False):
+        TRACKING_REJECTED.inc(type='webhook')
+        return {'error': 'webhook signing is not configured'}, 403
+    if verifier is not None:
+        signature = request.headers.get(SIGNATURE_HEADER)
+        timestamp = request.headers.get(TIMESTAMP_HEADER)
+        try:
+            valid = bool(signature and timestamp) and verifier.verify_signature(
+                body.decode('utf-8'), signature, timestamp)
+        except (ValueError, UnicodeDecodeError):
+            valid = False
+        if not valid:
+            TRACKING_REJECTED.inc(type='webhook')
+            return {'error': 'invalid signature'}, 403
+        if not _is_fresh(timestamp, current_app.config.get('SENDGRID_WEBHOOK_MAX_AGE', 300)):
+            TRACKING_REJECTED.inc(type='webhook')
+            return {'error': 'stale timestamp'}, 403
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return {'error': 'invalid JSON'}, 400
+    if not isinstance(payload, list):
+        return {'error': 'expected a JSON array of events'}, 400
+
+    signer = get_signer(current_app)
+    events = []
+    counts = Counter()
+    invalid = ignored = 0
+    for item in payload:
+        try:
+            event = parse_sendgrid_event(item, signer)
+        except ValueError:
+            invalid += 1
+            continue
+        if event is None:
+            ignored += 1
+        else:
+            events.append(event)
+            counts[event[1]] += 1
+
+    for event_type, count in counts.items():
+        WEBHOOK_EVENTS.inc(count, provider='sendgrid', type=event_type)
+    if invalid:
+        TRACKING_REJECTED.inc(invalid, type='webhook')
+    accepted = get_buffer(current_app).add_many(events)
+    return {'received': len(payload), 'accepted': accepted, 'ignored': ignored, 'invalid': invalid}
@@ -0,0 +1,349 @@
+"""
+Streaming XLSX Column Reader
+
+Reads selected columns of the first worksheet of a large .xlsx file much
+faster than openpyxl: the sheet XML is decompressed in blocks, cut at row
+boundaries and each block is parsed with the C XML parser, keeping only
+the cells of the requested columns. Blocks are parsed in this process
+unless the caller asks for workers (at most MAX_WORKERS spawned
+processes), since uploads are read inside web workers.
+
+Only plain cell values are read (shared, inline and formula strings,
+numbers, booleans, ISO dates). The result matches pandas.read_excel for
+those: numbers in cells with a date format become datetimes, pandas'
+default NA strings ('', 'NA', 'n/a', 'null', ...) become None, skipped
+rows are empty rows, trailing empty rows are dropped, and blank or
+repeated headers are named 'Unnamed: 3' / 'Name.1'. Callers fall back to
+pandas if anything here raises.
+"""
+
+import itertools
+import re
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+from xml.etree import ElementTree
+
+BLOCK_BYTES = 8 * 1024 * 1024
+MAX_WORKERS = 4
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_SHEET_DATA = re.compile(rb'<((?:[\w.-]+:)?)sheetData\b[^>]*?(/?)>')
+_ROOT = re.compile(rb'<((?:[\w.-]+:)?worksheet)\b[^>]*>')
+_CELL_REF = re.compile(r'[A-Z]+')
+
+# pandas' default na_values: these strings read as missing
+NA_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+# Set in each pool worker by _init_worker
+_shared_strings = None
+_date_styles = frozenset()
+
+
+def column_index(ref):
+    """Zero-based column index of a cell reference such as 'C12'."""
+    index = 0
+    for char in _CELL_REF.match(ref).group():
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def _first_sheet_path(archive):
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    ns = workbook.tag[:workbook.tag.index('}') + 1] if workbook.tag.startswith('{') else ''
+    sheet = workbook.find(f'{ns}sheets/{ns}sheet')
+    rel_id = sheet.get(f'{_REL_NS}id')
+
+    rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels:
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    raise ValueError('First worksheet not found in workbook')
+
+
+def _read_shared_strings(archive):
+    try:
+        source = archive.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    strings = []
+    with source:
+        for _, elem in ElementTree.iterparse(source):
+            if elem.tag.endswith('si'):
+                # Plain text or rich-text runs; phonetic hints (rPh) are not part of the value
+                parts = []
+                for child in elem:
+                    if child.tag.endswith('}t') or child.tag == 't':
+                        parts.append(child.text or '')
+                    elif child.tag.endswith('}r') or child.tag == 'r':
+                        parts.extend(t.text or '' for t in child if t.tag.endswith('}t') or t.tag == 't')
+                strings.append(''.join(parts))
+                elem.clear()
+    return strings
+
+
+def _read_date_styles(archive):
+    """Indexes of the cell styles (cellXfs) whose number format is a date or time."""
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+    try:
+        styles = ElementTree.fromstring(archive.read('xl/styles.xml'))
+    except KeyError:
+        return frozenset()
+    ns = styles.tag[:styles.tag.index('}') + 1] if styles.tag.startswith('{') else ''
+    formats = dict(BUILTIN_FORMATS)
+    for fmt in styles.iter(f'{ns}numFmt'):
+        formats[int(fmt.get('numFmtId'))] = fmt.get('formatCode')
+    cell_xfs = styles.find(f'{ns}cellXfs')
+    if cell_xfs is None:
+        return frozenset()
+    return frozenset(index for index, xf in enumerate(cell_xfs.iter(f'{ns}xf'))
+                     if is_date_format(formats.get(int(xf.get('numFmtId', 0)), 'General')))
+
+
+def _sheet_blocks(source, block_bytes):
+    """
+    Yield (root tags, prefix, rows_xml) blocks of the sheet XML, each
+    ending on a row boundary. The root tags are the worksheet's opening
+    tag (with its namespace declarations) and closing tag.
+    """
+    buffer = b''
+    root_open = prefix = None
+    while True:
+        data = source.read(block_bytes)
+        buffer += data
+        if root_open is None:
+            match = _SHEET_DATA.search(buffer)
+            if match is None:
+                if not data:
+                    return
+                continue
+            root = _ROOT.search(buffer)
+            root_open = (root.group(), b'</' + root.group(1) + b'>')
+            prefix = match.group(1)
+            if match.group(2):  # <sheetData/>: empty sheet
+                return
+            buffer = buffer[match.end():]
+            row_close = b'</' + prefix + b'row>'
+
+        if not data:
+            end = buffer.rfind(row_close)
+            if end >= 0:
+                yield root_open, prefix, buffer[:end + len(row_close)]
+            return
+
+        end = buffer.rfind(row_close)
+        if end >= 0:
+            end += len(row_close)
+            yield root_open, prefix, buffer[:end]
+            buffer = buffer[end:]
+
+
+def _cell_text(cell, ns):
+    """The string of a text cell, or None for other cells."""
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(f'{ns}t'))
+    if kind in ('s', 'str'):
+        value = cell.find(f'{ns}v')
+        if value is not None and value.text is not None:
+            return _shared_strings[int(value.text)] if kind == 's' else value.text
+    return None
+
+
+def _has_value(cell, ns):
+    """True unless the cell is empty or holds an empty string (pandas trims those)."""
+    if cell.get('t') in ('inlineStr', 's', 'str'):
+        return bool(_cell_text(cell, ns))
+    value = cell.find(f'{ns}v')
+    return value is not None and bool(value.text)
+
+
+def _cell_value(cell, ns):
+    kind = cell.get('t')
+    if kind in ('inlineStr', 's', 'str'):
+        text = _cell_text(cell, ns)
+        return None if text is None or text in NA_STRINGS else text
+    value = cell.find(f'{ns}v')
+    if value is None or value.text is None or kind == 'e':
+        return None
+    text = value.text
+    if kind == 'b':
+        return text == '1'
+    if kind == 'd':
+        return datetime.fromisoformat(text.rstrip('Z'))
+    number = float(text)
+    if _date_styles and int(cell.get('s', 0)) in _date_styles:
+        return EXCEL_EPOCH + timedelta(days=number)
+    return int(number) if number.is_integer() else number
+
+
+def parse_block(block, columns):
+    """
+    Values of the requested column indexes for every row in one block, with
+    empty rows for row numbers the sheet skips.
+
+    Returns:
+        tuple: (one list of values per requested column, number of the
+        block's first row, number of its last row with a value (0 if none),
+        width of its widest row counting only cells with a value)
+    """
+    (opening, closing), prefix, rows_xml = block
+    root = ElementTree.fromstring(opening + b'<' + prefix + b'sheetData>' + rows_xml +
+                                  b'</' + prefix + b'sheetData>' + closing)
+    ns = root.tag[:root.tag.index('}') + 1] if root.tag.startswith('{') else ''
+
+    wanted = {index: position for position, index in enumerate(columns)}
+    out = [[] for _ in columns]
+    first = number = last_filled = width = 0
+    for row in root.iter(f'{ns}row'):
+        number = int(row.get('r') or number + 1)
+        if not first:
+            first = number
+        else:
+            for skipped in range(number - previous - 1):
+                for values in out:
+                    values.append(None)
+        previous = number
+
+        values = [None] * len(columns)
+        index = -1
+        for cell in row.iter(f'{ns}c'):
+            ref = cell.get('r')
+            index = column_index(ref) if ref else index + 1
+            position = wanted.get(index)
+            if position is not None:
+                values[position] = _cell_value(cell, ns)
+            if _has_value(cell, ns):
+                last_filled = number
+                width = max(width, index + 1)
+        for position, value in enumerate(values):
+            out[position].append(value)
+    return out, first, last_filled, width
+
+
+def _init_worker(shared_strings, date_styles):
+    global _shared_strings, _date_styles
+    _shared_strings = shared_strings
+    _date_styles = date_styles
+
+
+def read_columns(stream, pick, workers=1, block_bytes=BLOCK_BYTES):
+    """
+    Read the header and the values of selected columns of the first worksheet.
+
+    Args:
+        stream: Seekable binary file object of the workbook
+        pick: Callable taking the header (list of str) and returning the
+            header names to read
+        workers: Processes to parse blocks with (1 = in this process)
+        block_bytes: Uncompressed sheet XML per block
+
+    Returns:
+        tuple: (header, {name: list of values})
+    """
+    global _shared_strings, _date_styles
+
+    with zipfile.ZipFile(stream) as archive:
+        sheet_path = _first_sheet_path(archive)
+        _shared_strings = _read_shared_strings(archive)
+        _date_styles = _read_date_styles(archive)
+        with archive.open(sheet_path) as source:
+            blocks = _sheet_blocks(source, block_bytes)
+            first = next(blocks, None)
+            if first is None:
+                return [], {}
+
+            # Header: the first row of the sheet
+            header_block, first = _split_first_row(first)
+            cells, header_row, _, _ = parse_block(header_block, list(range(_column_count(header_block[2]))))
+            header = _header_names([values[0] for values in cells])
+
+            names = pick(header)
+            columns = [header.index(name) for name in names]
+
+            data = {name: [] for name in names}
+            extent = {'rows': header_row, 'last_filled': header_row, 'width': len(header)}
+
+            def collect(result):
+                values, first_row, last_filled, width = result
+                for name, column in zip(names, values):
+                    # Rows skipped between two blocks are empty rows
+                    data[name].extend([None] * (first_row - extent['rows'] - 1) if first_row else [])
+                    data[name].extend(column)
+                if values and first_row:
+                    extent['rows'] = first_row + len(values[0]) - 1
+                extent['last_filled'] = max(extent['last_filled'], last_filled)
+                extent['width'] = max(extent['width'], width)
+
+            collect(parse_block(first, columns))
+            second = next(blocks, None)
+            if second is not None and workers > 1:
+                _parse_in_pool(itertools.chain([second], blocks), columns, min(workers, MAX_WORKERS), collect)
+            elif second is not None:
+                for block in itertools.chain([second], blocks):
+                    collect(parse_block(block, columns))
+
+    _shared_strings, _date_styles = None, frozenset()
+    # Like pandas: no trailing empty rows, and data beyond the header gets 'Unnamed: n' columns
+    for name in names:
+        del data[name][extent['last_filled'] - header_row:]
+    header.extend(f'Unnamed: {index}' for index in range(len(header), extent['width']))
+    return header, data
+
+
+def _header_names(values):
+    """Column names from the header row's values, named and de-duplicated as pandas does."""
+    header = [str(value).strip() if value is not None else '' for value in values]
+    while header and not header[-1]:
+        header.pop()
+    names = []
+    seen = {}
+    for index, name in enumerate(header):
+        name = name or f'Unnamed: {index}'
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _parse_in_pool(blocks, columns, workers, collect):
+    """
+    Parse blocks in worker processes, in order, with at most two blocks
+    per worker in flight so the decompressed sheet is never held in memory.
+    """
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'),
+                             initializer=_init_worker, initargs=(_shared_strings, _date_styles)) as pool:
+        for block in blocks:
+            pending.append(pool.submit(parse_block, block, columns))
+            if len(pending) >= workers * 2:
+                collect(pending.popleft().result())
+        while pending:
+            collect(pending.popleft().result())
+
+
+def _split_first_row(block):
+    """Split a block into one holding its first row and one with the rest."""
+    tags, prefix, rows_xml = block
+    row_close = b'</' + prefix + b'row>'
+    end = rows_xml.find(row_close) + len(row_close)
+    return (tags, prefix, rows_xml[:end]), (tags, prefix, rows_xml[end:])
+
+
+def _column_count(row_xml):
+    """Number of columns up to the last cell of one row's XML."""
+    refs = re.findall(rb'<(?:[\w.-]+:)?c\b[^>]*?\br="([A-Z]+)\d+"', row_xml)
+    if refs:
+        return max(column_index(ref.decode()) for ref in refs) + 1
+    return len(re.findall(rb'<(?:[\w.-]+:)?c\b', row_xml))
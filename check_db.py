@@ -3,7 +3,7 @@ Database Inspector - View all recipients and their details
 """
 
 from app import create_app, db
-from app.models import Recipient, Campaign
+from app.models import Recipient, Campaign, Contact
 from datetime import date
 
 app = create_app()
@@ -30,7 +30,7 @@ def show_recipients_with_birthdays():
     """Display only recipients with DOB set"""
     with app.app_context():
         today = date.today()
-        recipients = Recipient.query.filter(Recipient.dob.isnot(None)).all()
+        recipients = Recipient.query.join(Recipient.contact).filter(Contact.dob.isnot(None)).all()
         
         print('\n' + '=' * 100)
         print(f'RECIPIENTS WITH BIRTHDAYS')
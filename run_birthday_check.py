@@ -3,7 +3,7 @@ os.environ['BIRTHDAY_SENDER_EMAIL'] = 'tajaneabhishek5@gmail.com'
 os.environ['BIRTHDAY_SENDER_PASSWORD'] = 'cgel xfjy wxkz rzun'
 
 from app import create_app, db
-from app.models import Recipient
+from app.models import Contact
 from app.birthday_scheduler import check_and_send_birthday_emails
 from datetime import date
 
@@ -14,14 +14,15 @@ with app.app_context():
     print('\n📊 Database Check:')
     print('=' * 80)
     
-    all_recipients = Recipient.query.filter(Recipient.dob.isnot(None)).all()
-    print(f'Total recipients with DOB: {len(all_recipients)}\n')
+    all_contacts = Contact.query.filter(Contact.dob.isnot(None)).all()
+    print(f'Total contacts with DOB: {len(all_contacts)}\n')
     
-    for i, r in enumerate(all_recipients, 1):
-        is_today = r.dob.month == today.month and r.dob.day == today.day
+    for i, c in enumerate(all_contacts, 1):
+        is_today = c.dob.month == today.month and c.dob.day == today.day
         marker = '🎂 BIRTHDAY TODAY!' if is_today else ''
-        print(f'{i}. Campaign {r.campaign_id} - {r.email}')
-        print(f'   Name: {r.name}, DOB: {r.dob} {marker}')
+        campaigns = ', '.join(str(r.campaign_id) for r in c.memberships)
+        print(f'{i}. Campaign {campaigns} - {c.email}')
+        print(f'   Name: {c.name}, DOB: {c.dob} {marker}')
     
     print('\n' + '=' * 80)
     
@@ -0,0 +1,467 @@
+"""
+Benchmark Suite
+
+Seeds a throwaway SQLite database with synthetic campaigns and measures the
+hot paths of the app end-to-end, with mail going to a local SMTP sink:
+
+- import:    recipient file upload through /campaign/create (rows/sec)
+- dispatch:  campaign send loop against the SMTP sink (msgs/sec)
+- tracking:  open-pixel endpoint (req/sec)
+- pages:     dashboard / detail / replied / export latency percentiles
+- birthday:  daily birthday job duration
+- mime:      per-recipient message serialization on a large HTML body,
+             MIMEMultipart.as_string() (text part converted once per
+             campaign, as before templates) vs the precomputed
+             MessageTemplate (bytes/sec and CPU per message), plus the
+             plain-text conversion with and without its cache
+- startup:   worker boot in a fresh interpreter: cold `import app` and
+             create_app(), with and without AUTO_MIGRATE, plus peak RSS and
+             whether pandas got imported
+
+Results are printed as JSON (and appended to --output as one JSON line per
+run) so runs can be compared to catch regressions.
+
+Usage:
+    python scripts/benchmark.py
+    python scripts/benchmark.py --recipients 20000 --events 50000 --output bench_output.txt
+    python scripts/benchmark.py --scenarios dispatch,tracking
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = ['import', 'dispatch', 'tracking', 'pages', 'birthday', 'mime', 'startup']
+
+# Run in a fresh interpreter per sample so import costs are cold
+STARTUP_PROBE = '''
+import json, resource, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app()
+created = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - started,
+    'create_app_s': created - imported,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'pandas_loaded': 'pandas' in sys.modules,
+}))
+'''
+
+
+def percentiles(samples):
+    """Summarize latency samples (seconds) as milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 3),
+        'p50_ms': round(pick(0.50), 3),
+        'p90_ms': round(pick(0.90), 3),
+        'p99_ms': round(pick(0.99), 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def synthetic_dob(rng, today, birthday_ratio):
+    """Random DOB; roughly `birthday_ratio` of them fall on today's month/day."""
+    if rng.random() < birthday_ratio:
+        year = rng.randint(1960, 2004)
+        try:
+            return date(year, today.month, today.day)
+        except ValueError:
+            return date(year, 3, 1)
+    return date(rng.randint(1960, 2004), 1, 1) + timedelta(days=rng.randint(0, 364))
+
+
+class Benchmark:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.workdir = tempfile.mkdtemp(prefix='email-bench-')
+        self.results = {}
+
+    # --- setup ---
+
+    def setup(self):
+        from app.transport import SMTPSinkServer
+
+        self.sink = SMTPSinkServer(port=0).start()
+
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(self.workdir, 'bench.db')
+        os.environ['MAIL_TRANSPORT'] = 'sink'
+        os.environ['SINK_PORT'] = str(self.sink.port)
+        os.environ['SEND_RATE_INITIAL'] = '0'
+        os.environ['BIRTHDAY_SENDER_EMAIL'] = 'birthday@bench.local'
+        os.environ['BIRTHDAY_SENDER_PASSWORD'] = 'bench'
+
+        from app import create_app
+        self.app = create_app()
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as session:
+            session['sender_email'] = 'sender@bench.local'
+            session['sender_password'] = 'bench'
+
+    def teardown(self):
+        self.sink.stop()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def seed_campaign(self, name, recipients, events, status='Completed'):
+        """
+        Insert one campaign with `recipients` recipients and `events` tracking
+        events using bulk inserts. Returns (campaign_id, [recipient ids]).
+        """
+        from app import db
+        from app.contacts import upsert_contacts
+        from app.models import Campaign, Recipient, TrackingEvent
+
+        today = date.today()
+        now = datetime.now()
+
+        with self.app.app_context():
+            campaign = Campaign(
+                name=name,
+                subject=f'{name} subject',
+                body_content='<p>Hello there</p>[VERIFY_BUTTON]<p>' + 'Lorem ipsum dolor sit amet. ' * 40 + '</p>',
+                status=status,
+                sender_email='sender@bench.local',
+                sender_password='bench',
+                batch_size=max(recipients, 1),
+                batch_delay=0
+            )
+            db.session.add(campaign)
+            db.session.commit()
+            campaign_id = campaign.id
+
+            contact_ids = upsert_contacts([
+                {
+                    'email': f'user{i}.{campaign_id}@example{i % 50}.com',
+                    'name': f'User {i}',
+                    'dob': synthetic_dob(self.rng, today, self.args.birthday_ratio),
+                }
+                for i in range(recipients)
+            ])
+            db.session.execute(db.insert(Recipient), [
+                {
+                    'campaign_id': campaign_id,
+                    'contact_id': contact_id,
+                    'status': 'Sent' if status == 'Completed' else 'Pending',
+                    'sent_at': now if status == 'Completed' else None,
+                }
+                for contact_id in contact_ids.values()
+            ])
+            db.session.commit()
+
+            recipient_ids = [row[0] for row in db.session.query(Recipient.id).filter_by(campaign_id=campaign_id)]
+
+            if events and recipient_ids:
+                db.session.execute(db.insert(TrackingEvent), [
+                    {
+                        'recipient_id': self.rng.choice(recipient_ids),
+                        'type': 'open' if self.rng.random() < 0.8 else 'replied',
+                        'timestamp': now - timedelta(minutes=self.rng.randint(0, 60 * 24 * 30)),
+                    }
+                    for _ in range(events)
+                ])
+                db.session.commit()
+
+        return campaign_id, recipient_ids
+
+    def seed(self):
+        started = time.perf_counter()
+        per_campaign_events = self.args.events // max(self.args.campaigns, 1)
+        self.campaign_ids = []
+        for i in range(self.args.campaigns):
+            campaign_id, recipient_ids = self.seed_campaign(f'Seed {i}', self.args.recipients, per_campaign_events)
+            self.campaign_ids.append(campaign_id)
+            self.recipient_ids = recipient_ids
+        self.results['seed'] = {
+            'campaigns': self.args.campaigns,
+            'recipients_per_campaign': self.args.recipients,
+            'events': per_campaign_events * self.args.campaigns,
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+
+    # --- scenarios ---
+
+    def bench_import(self):
+        rows = self.args.recipients
+        today = date.today()
+        buffer = io.StringIO()
+        buffer.write('email,name,dob\n')
+        for i in range(rows):
+            dob = synthetic_dob(self.rng, today, self.args.birthday_ratio)
+            buffer.write(f'import{i}@example{i % 50}.com,Import User {i},{dob.isoformat()}\n')
+        payload = buffer.getvalue().encode('utf-8')
+
+        started = time.perf_counter()
+        response = self.client.post('/campaign/create', data={
+            'campaign_name': 'Import bench',
+            'subject': 'Import bench',
+            'body_content': '<p>Hi</p>',
+            'batch_size': '50',
+            'batch_delay': '0',
+            'email_column_select': 'email',
+            'name_column_select': 'name',
+            'dob_column_select': 'dob',
+            'recipient_file': (io.BytesIO(payload), 'recipients.csv'),
+        }, content_type='multipart/form-data')
+        elapsed = time.perf_counter() - started
+
+        self.results['import'] = {
+            'rows': rows,
+            'bytes': len(payload),
+            'status': response.status_code,
+            'seconds': round(elapsed, 3),
+            'rows_per_sec': round(rows / elapsed, 1) if elapsed else None,
+        }
+
+    def bench_dispatch(self):
+        from app.sender import send_async
+
+        count = self.args.dispatch_recipients or self.args.recipients
+        campaign_id, _ = self.seed_campaign('Dispatch bench', count, 0, status='Sending')
+
+        before_messages = self.sink.message_count
+        before_bytes = self.sink.byte_count
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        send_async(self.app, campaign_id, 'sender@bench.local', 'bench')
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+
+        messages = self.sink.message_count - before_messages
+        self.results['dispatch'] = {
+            'recipients': count,
+            'messages': messages,
+            'bytes': self.sink.byte_count - before_bytes,
+            'seconds': round(elapsed, 3),
+            'msgs_per_sec': round(messages / elapsed, 1) if elapsed else None,
+            'cpu_ms_per_msg': round(cpu / messages * 1000, 3) if messages else None,
+        }
+
+    def bench_tracking(self):
+        from app.tokens import get_signer
+        from app.tracking import get_buffer
+
+        signer = get_signer(self.app)
+        campaign_id = self.campaign_ids[-1]
+        requests = self.args.tracking_requests
+        statuses = {}
+        started = time.perf_counter()
+        for _ in range(requests):
+            token = signer.sign(self.rng.choice(self.recipient_ids), campaign_id)
+            response = self.client.get(f'/track/open/{token}')
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        get_buffer(self.app).flush()
+        elapsed = time.perf_counter() - started
+
+        self.results['tracking'] = {
+            'requests': requests,
+            'statuses': {str(k): v for k, v in statuses.items()},
+            'seconds': round(elapsed, 3),
+            'req_per_sec': round(requests / elapsed, 1) if elapsed else None,
+        }
+
+    def time_get(self, url):
+        samples = []
+        status = None
+        for _ in range(self.args.page_requests):
+            started = time.perf_counter()
+            response = self.client.get(url)
+            samples.append(time.perf_counter() - started)
+            status = response.status_code
+        result = percentiles(samples)
+        result['status'] = status
+        return result
+
+    def bench_pages(self):
+        campaign_id = self.campaign_ids[-1]
+        self.results['pages'] = {
+            'dashboard': self.time_get('/dashboard'),
+            'campaign_detail': self.time_get(f'/campaign/{campaign_id}'),
+            'campaign_replied': self.time_get(f'/campaign/{campaign_id}/replied'),
+            'export_campaign': self.time_get(f'/export/report?campaign_id={campaign_id}'),
+        }
+
+    def bench_birthday(self):
+        from app.birthday_scheduler import check_and_send_birthday_emails
+
+        before = self.sink.message_count
+        started = time.perf_counter()
+        with self.app.app_context():
+            check_and_send_birthday_emails()
+        elapsed = time.perf_counter() - started
+
+        self.results['birthday'] = {
+            'emails_sent': self.sink.message_count - before,
+            'seconds': round(elapsed, 3),
+        }
+
+    def bench_mime(self):
+        from app.sender import build_campaign_html, build_html_message, build_campaign_template
+        from app.html_text import html_to_text
+        from app.mime_template import slot
+        from app.tokens import get_signer
+
+        count = self.args.mime_messages
+        paragraph = '<p>Grüße aus dem Newsletter — Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>\n'
+        body = '[VERIFY_BUTTON]' + paragraph * (self.args.mime_body_kb * 1024 // len(paragraph.encode('utf-8')) + 1)
+        base_url = 'http://127.0.0.1:5002'
+        sender = 'sender@bench.local'
+        subject = 'MIME bench'
+
+        signer = get_signer(self.app)
+        # Per-campaign text part with the token filled in per recipient, as the send path did before templates
+        token_marker = slot('token')
+        text = html_to_text.__wrapped__(build_campaign_html(body, token_marker, base_url))
+
+        def legacy(i):
+            token = signer.sign(i, 1)
+            html = build_campaign_html(body, token, base_url)
+            msg = build_html_message(sender, f'user{i}@example.com', subject, html, text.replace(token_marker, token))
+            return msg.as_string().encode('utf-8')
+
+        template = build_campaign_template(sender, subject, body, base_url)
+
+        def precomputed(i):
+            return template.render(f'user{i}@example.com', token=signer.sign(i, 1))
+
+        results = {'messages': count, 'body_bytes': len(body.encode('utf-8'))}
+        for name, render in (('legacy', legacy), ('template', precomputed)):
+            total_bytes = 0
+            started = time.perf_counter()
+            cpu_started = time.process_time()
+            for i in range(count):
+                total_bytes += len(render(i))
+            elapsed = time.perf_counter() - started
+            cpu = time.process_time() - cpu_started
+            results[name] = {
+                'bytes_per_msg': total_bytes // count if count else 0,
+                'seconds': round(elapsed, 3),
+                'msgs_per_sec': round(count / elapsed, 1) if elapsed else None,
+                'mb_per_sec': round(total_bytes / elapsed / 1e6, 1) if elapsed else None,
+                'cpu_ms_per_msg': round(cpu / count * 1000, 3) if count else None,
+            }
+        if results['template']['cpu_ms_per_msg']:
+            results['cpu_speedup'] = round(results['legacy']['cpu_ms_per_msg'] / results['template']['cpu_ms_per_msg'], 1)
+
+        # The text conversion cache on its own: converting the same HTML for every message vs cache hits
+        html = build_campaign_html(body, token_marker, base_url)
+        html_to_text(html)
+        text_cache = {}
+        for name, convert in (('uncached', html_to_text.__wrapped__), ('cached', html_to_text)):
+            started = time.process_time()
+            for _ in range(count):
+                convert(html)
+            text_cache[f'{name}_cpu_ms_per_msg'] = round((time.process_time() - started) / count * 1000, 3) if count else None
+        if text_cache['cached_cpu_ms_per_msg']:
+            text_cache['cpu_speedup'] = round(text_cache['uncached_cpu_ms_per_msg'] / text_cache['cached_cpu_ms_per_msg'], 1)
+        results['text_cache'] = text_cache
+        self.results['mime'] = results
+
+    def bench_startup(self):
+        runs = self.args.startup_runs
+        results = {'runs': runs}
+        for label, auto_migrate in (('no_migrate', 'false'), ('auto_migrate', 'true')):
+            env = dict(os.environ, AUTO_MIGRATE=auto_migrate, FLASK_ENV='development')
+            env.pop('WERKZEUG_RUN_MAIN', None)
+            samples = []
+            for _ in range(runs):
+                output = subprocess.check_output([sys.executable, '-c', STARTUP_PROBE], cwd=ROOT, env=env,
+                                                 stderr=subprocess.DEVNULL)
+                samples.append(json.loads(output.decode().strip().splitlines()[-1]))
+            results[label] = {
+                'import_ms': round(statistics.median(s['import_s'] for s in samples) * 1000, 1),
+                'create_app_ms': round(statistics.median(s['create_app_s'] for s in samples) * 1000, 1),
+                'total_ms': round(statistics.median(s['import_s'] + s['create_app_s'] for s in samples) * 1000, 1),
+                'max_rss_mb': round(statistics.median(s['max_rss_mb'] for s in samples), 1),
+                'pandas_loaded': any(s['pandas_loaded'] for s in samples),
+            }
+        self.results['startup'] = results
+
+    # --- driver ---
+
+    def run(self, scenarios):
+        self.setup()
+        try:
+            self.seed()
+            for scenario in scenarios:
+                print(f"⏱️  Running {scenario}...", file=sys.stderr)
+                getattr(self, f'bench_{scenario}')()
+        finally:
+            self.teardown()
+
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': vars(self.args),
+            'results': self.results,
+        }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Seed synthetic campaigns and benchmark the app hot paths.')
+    parser.add_argument('--campaigns', type=int, default=5, help='Seeded campaigns')
+    parser.add_argument('--recipients', type=int, default=2000, help='Recipients per seeded campaign and import rows')
+    parser.add_argument('--events', type=int, default=10000, help='Total seeded tracking events')
+    parser.add_argument('--dispatch-recipients', type=int, default=None, help='Recipients in the dispatch campaign')
+    parser.add_argument('--tracking-requests', type=int, default=2000)
+    parser.add_argument('--page-requests', type=int, default=20, help='Requests per page for latency percentiles')
+    parser.add_argument('--mime-messages', type=int, default=500, help='Messages rendered per approach in the mime scenario')
+    parser.add_argument('--mime-body-kb', type=int, default=100, help='HTML body size for the mime scenario')
+    parser.add_argument('--startup-runs', type=int, default=5, help='Fresh interpreters per startup measurement')
+    parser.add_argument('--birthday-ratio', type=float, default=0.01, help='Share of recipients born today')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible data')
+    parser.add_argument('--output', default=None, help='Append the JSON result as one line to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        print(f"❌ Unknown scenarios: {', '.join(unknown)}", file=sys.stderr)
+        return 1
+
+    report = Benchmark(args).run(scenarios)
+    print(json.dumps(report, indent=2, default=str))
+
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report, default=str) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
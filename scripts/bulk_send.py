@@ -0,0 +1,352 @@
+"""
+Bulk Sender CLI
+
+Streams an NDJSON file of recipients ({"email": ..., "name": ...} per line)
+and sends the email template to each of them, outside of the web UI.
+
+- The input file is read line by line, never loaded as a whole.
+- Sending goes through the transports of app/transport.py (SMTP relay,
+  local sink, in-memory) or the SendGrid API with batched personalizations.
+- --concurrency controls parallel workers, --rate caps messages per second.
+- Progress is checkpointed to a sidecar file, so rerunning the same command
+  resumes after the last line that was fully processed.
+- Lines that could not be sent are appended to a .failed NDJSON file.
+
+Usage:
+    python scripts/bulk_send.py recipients.jsonl --transport smtp --concurrency 4 --rate 10
+    python scripts/bulk_send.py recipients.jsonl --transport sendgrid --batch-size 1000
+    python scripts/bulk_send.py recipients.jsonl --transport sink --concurrency 16
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from jinja2 import Template
+
+# Make the app package importable when run as `python scripts/bulk_send.py`
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Same substitution tag and per-call limit as the /send-email/batch endpoint
+NAME_SUBSTITUTION_TAG = "-name-"
+MAX_PERSONALIZATIONS = 1000
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all workers. rate <= 0 disables limiting.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, count=1):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                # Large SendGrid chunks may exceed the bucket; let them through once it is full
+                if self.tokens >= min(count, self.capacity):
+                    self.tokens -= count
+                    return
+                wait = (min(count, self.capacity) - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Checkpoint:
+    """
+    Tracks the highest input line number below which every line is done.
+
+    Workers finish out of order, so completed line numbers are kept in a set
+    until the contiguous prefix can advance. The sidecar file is rewritten
+    atomically at most once per `interval` seconds.
+    """
+
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self.done_through = self._load()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.last_write = 0.0
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return int(json.load(f).get('done_through', 0))
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def mark_done(self, line_numbers):
+        with self.lock:
+            self.pending.update(line_numbers)
+            while self.done_through + 1 in self.pending:
+                self.done_through += 1
+                self.pending.remove(self.done_through)
+            if time.monotonic() - self.last_write >= self.interval:
+                self._write()
+
+    def _write(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'done_through': self.done_through, 'updated_at': time.time()}, f)
+        os.replace(tmp_path, self.path)
+        self.last_write = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self._write()
+
+
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, sent=0, failed=0):
+        with self.lock:
+            self.sent += sent
+            self.failed += failed
+
+    def line(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.sent / elapsed if elapsed > 0 else 0.0
+        return f"sent={self.sent} failed={self.failed} skipped={self.skipped} elapsed={elapsed:.1f}s rate={rate:.1f} msg/s"
+
+
+def read_recipients(path, start_after):
+    """
+    Yield (line_number, record) for each line after `start_after`.
+    Malformed lines are yielded with record=None so they count as processed.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if line_number <= start_after:
+                continue
+            line = line.strip()
+            if not line:
+                yield line_number, None
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict) or not record.get('email'):
+                record = None
+            yield line_number, record
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class TransportWorker:
+    """
+    Sends each item through a per-thread transport from app/transport.py
+    (SMTP relay by default, or the local sink / in-memory transports).
+    """
+
+    def __init__(self, kind, sender_email, sender_password, subject, template):
+        from app.transport import get_transport
+        from app.sender import build_html_message
+        self.get_transport = get_transport
+        self.build_message = build_html_message
+        self.config = {'MAIL_TRANSPORT': kind}
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.subject = subject
+        self.template = template
+        self.local = threading.local()
+        self.transports = []
+        self.transports_lock = threading.Lock()
+
+    def _transport(self):
+        transport = getattr(self.local, 'transport', None)
+        if transport is None:
+            transport = self.get_transport(self.sender_email, self.sender_password, self.config)
+            transport.open()
+            self.local.transport = transport
+            with self.transports_lock:
+                self.transports.append(transport)
+        return transport
+
+    def send(self, items):
+        failures = []
+        for line_number, record in items:
+            html = self.template.render(name=record.get('name') or 'Friend')
+            msg = self.build_message(self.sender_email, record['email'], self.subject, html)
+            try:
+                self._transport().send(self.sender_email, [record['email']], msg)
+            except Exception as e:
+                failures.append((line_number, record, str(e)))
+        return failures
+
+    def close(self):
+        for transport in self.transports:
+            transport.close()
+
+
+class SendGridWorker:
+    """
+    Sends each chunk as a single SendGrid call with one personalization per recipient.
+    """
+
+    def __init__(self, api_key, sender_email, subject, template):
+        from sendgrid import SendGridAPIClient
+        from sendgrid.helpers.mail import Mail, Personalization, To, Substitution
+        self.client = SendGridAPIClient(api_key)
+        self.Mail, self.Personalization, self.To, self.Substitution = Mail, Personalization, To, Substitution
+        self.sender_email = sender_email
+        self.subject = subject
+        self.html_content = template.render(name=NAME_SUBSTITUTION_TAG)
+
+    def send(self, items):
+        message = self.Mail(from_email=self.sender_email, subject=self.subject, html_content=self.html_content)
+        for _, record in items:
+            personalization = self.Personalization()
+            personalization.add_to(self.To(record['email']))
+            personalization.add_substitution(self.Substitution(NAME_SUBSTITUTION_TAG, str(record.get('name') or 'Friend')))
+            message.add_personalization(personalization)
+        try:
+            self.client.send(message)
+            return []
+        except Exception as e:
+            return [(line_number, record, str(e)) for line_number, record in items]
+
+    def close(self):
+        pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Stream an NDJSON recipient file and send the email template to each line.')
+    parser.add_argument('input', help='NDJSON file with one {"email", "name"} object per line')
+    parser.add_argument('--transport', choices=['smtp', 'sink', 'memory', 'sendgrid'], default='smtp')
+    parser.add_argument('--subject', default='Personalized Email')
+    parser.add_argument('--template', default='templates/email_template.html')
+    parser.add_argument('--sender', default=None, help='Sender address (default: SENDER_EMAIL)')
+    parser.add_argument('--password', default=None, help='SMTP app password (default: SENDER_PASSWORD)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of parallel send workers')
+    parser.add_argument('--rate', type=float, default=0, help='Max messages per second across all workers (0 = unlimited)')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Recipients per work item (SMTP default 50, SendGrid default and max 1000)')
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file (default: <input>.checkpoint)')
+    parser.add_argument('--stats-interval', type=float, default=5.0, help='Seconds between progress lines')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+
+    sender_email = args.sender or os.getenv('SENDER_EMAIL')
+    if not sender_email:
+        print('❌ Sender address missing: pass --sender or set SENDER_EMAIL')
+        return 1
+
+    with open(args.template, 'r', encoding='utf-8') as f:
+        template = Template(f.read())
+
+    if args.transport != 'sendgrid':
+        sender_password = args.password or os.getenv('SENDER_PASSWORD')
+        if args.transport == 'smtp' and not sender_password:
+            print('❌ SMTP password missing: pass --password or set SENDER_PASSWORD')
+            return 1
+        worker = TransportWorker(args.transport, sender_email, sender_password, args.subject, template)
+        batch_size = args.batch_size or 50
+    else:
+        api_key = os.getenv('SENDGRID_API_KEY')
+        if not api_key:
+            print('❌ SENDGRID_API_KEY not set')
+            return 1
+        worker = SendGridWorker(api_key, sender_email, args.subject, template)
+        batch_size = min(args.batch_size or MAX_PERSONALIZATIONS, MAX_PERSONALIZATIONS)
+
+    checkpoint = Checkpoint(args.checkpoint or args.input + '.checkpoint')
+    failed_path = args.input + '.failed'
+    failed_lock = threading.Lock()
+    limiter = RateLimiter(args.rate)
+    stats = Stats()
+
+    if checkpoint.done_through:
+        print(f"↩️  Resuming after line {checkpoint.done_through}")
+
+    def process(chunk):
+        line_numbers = [line_number for line_number, _ in chunk]
+        items = [(line_number, record) for line_number, record in chunk if record is not None]
+        failures = []
+        if items:
+            limiter.acquire(len(items))
+            try:
+                failures = worker.send(items)
+            except Exception as e:
+                failures = [(line_number, record, str(e)) for line_number, record in items]
+        if failures:
+            with failed_lock, open(failed_path, 'a', encoding='utf-8') as f:
+                for line_number, record, error in failures:
+                    f.write(json.dumps({'line': line_number, 'email': record.get('email'),
+                                        'name': record.get('name'), 'error': error}) + '\n')
+        with stats.lock:
+            stats.skipped += len(chunk) - len(items)
+        stats.add(sent=len(items) - len(failures), failed=len(failures))
+        checkpoint.mark_done(line_numbers)
+
+    # Bound in-flight work so memory stays flat regardless of input size
+    in_flight = threading.BoundedSemaphore(args.concurrency * 2)
+    stop_reporting = threading.Event()
+
+    def report():
+        while not stop_reporting.wait(args.stats_interval):
+            print(f"📊 {stats.line()}")
+
+    reporter = threading.Thread(target=report, daemon=True)
+    reporter.start()
+
+    def run(chunk):
+        try:
+            process(chunk)
+        finally:
+            in_flight.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for chunk in chunked(read_recipients(args.input, checkpoint.done_through), batch_size):
+                in_flight.acquire()
+                pool.submit(run, chunk)
+    except KeyboardInterrupt:
+        print('\n⏹️  Interrupted, saving checkpoint...')
+    finally:
+        stop_reporting.set()
+        checkpoint.flush()
+        worker.close()
+
+    print(f"✅ Done: {stats.line()}")
+    print(f"   Checkpoint: line {checkpoint.done_through} ({checkpoint.path})")
+    if stats.failed:
+        print(f"   Failures written to {failed_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
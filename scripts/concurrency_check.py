@@ -0,0 +1,226 @@
+"""
+SQLite Concurrency Check
+
+Runs a campaign send against a throwaway SQLite database while tracking
+endpoints are hammered from threads in the same process (like the dev
+server) and from separate processes running the standalone tracking app
+(like extra gunicorn workers), then reports any "database is locked"
+errors seen by the engine.
+
+With the default engine settings (WAL, synchronous=NORMAL, busy timeout,
+writer queue) the run should finish with zero lock errors; --baseline
+switches back to the old rollback journal without the writer queue for
+comparison.
+
+Usage:
+    python scripts/concurrency_check.py
+    python scripts/concurrency_check.py --recipients 5000 --threads 8 --processes 2
+    python scripts/concurrency_check.py --baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+BASELINE_ENV = {
+    'SQLITE_WAL': 'false',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_BUSY_TIMEOUT': '5',
+    'SQLITE_WRITE_LOCK': 'false',
+}
+
+
+def count_lock_errors(engine):
+    """Count 'database is locked' errors raised on `engine`; returns a one-item list."""
+    from sqlalchemy import event
+
+    errors = [0]
+
+    def on_error(context):
+        if 'database is locked' in str(context.original_exception):
+            errors[0] += 1
+
+    event.listen(engine, 'handle_error', on_error)
+    return errors
+
+
+def hammer(client, tokens, stop, stats, seed):
+    """Hit open/replied links with random tokens until `stop` is set."""
+    rng = random.Random(seed)
+    while not stop.is_set():
+        kind = 'open' if rng.random() < 0.8 else 'replied'
+        response = client.get(f'/track/{kind}/{rng.choice(tokens)}')
+        stats['requests'] += 1
+        if response.status_code >= 500:
+            stats['errors'] += 1
+
+
+def run_worker(args):
+    """Hammer mode for the separate processes: print counters as JSON."""
+    from app import db
+    from app.tracking_app import create_tracking_app
+
+    app = create_tracking_app()
+    with app.app_context():
+        lock_errors = count_lock_errors(db.engine)
+
+    tokens = json.loads(os.environ['CONCURRENCY_TOKENS'])
+    stats = {'requests': 0, 'errors': 0}
+    stop = threading.Event()
+    threading.Timer(args.worker_seconds, stop.set).start()
+    hammer(app.test_client(), tokens, stop, stats, seed=os.getpid())
+    from app.tracking import get_buffer
+    get_buffer(app).flush()
+    stats['lock_errors'] = lock_errors[0]
+    print(json.dumps(stats))
+
+
+def seed_campaign(app, recipients):
+    from app import db
+    from app.contacts import add_recipients
+    from app.models import Campaign, Recipient
+
+    with app.app_context():
+        campaign = Campaign(
+            name='Concurrency check',
+            subject='Concurrency check',
+            body_content='<p>Hello</p>[VERIFY_BUTTON]',
+            status='Sending',
+            sender_email='sender@check.local',
+            batch_size=recipients + 1,
+            batch_delay=0,
+        )
+        db.session.add(campaign)
+        db.session.commit()
+        add_recipients(campaign.id, [{'email': f'user{i}@example{i % 20}.com'} for i in range(recipients)])
+        ids = [row[0] for row in db.session.query(Recipient.id).filter_by(campaign_id=campaign.id)]
+        return campaign.id, ids
+
+
+def run_check(args):
+    workdir = tempfile.mkdtemp(prefix='email-concurrency-')
+    try:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'check.db')
+        os.environ['MAIL_TRANSPORT'] = 'memory'
+        os.environ['SEND_RATE_INITIAL'] = '0'
+        os.environ['TRACKING_FLUSH_INTERVAL'] = str(args.flush_interval)
+        if args.baseline:
+            os.environ.update(BASELINE_ENV)
+
+        from app import create_app, db
+        from app.models import Campaign, Recipient, TrackingEvent
+        from app.sender import send_async
+        from app.tokens import get_signer
+        from app.tracking import get_buffer
+
+        app = create_app()
+        campaign_id, recipient_ids = seed_campaign(app, args.recipients)
+        signer = get_signer(app)
+        tokens = [signer.sign(rid, campaign_id) for rid in recipient_ids]
+
+        with app.app_context():
+            lock_errors = count_lock_errors(db.engine)
+
+        # Separate processes: standalone tracking app on the same database file
+        env = dict(os.environ, CONCURRENCY_TOKENS=json.dumps(tokens[:2000]))
+        workers = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker',
+                              '--worker-seconds', str(args.worker_seconds)],
+                             cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            for _ in range(args.processes)
+        ]
+
+        stop = threading.Event()
+        stats = [{'requests': 0, 'errors': 0} for _ in range(args.threads)]
+        threads = [threading.Thread(target=hammer, args=(app.test_client(), tokens, stop, stats[i], i))
+                   for i in range(args.threads)]
+        for thread in threads:
+            thread.start()
+
+        print(f"📨 Sending {args.recipients} messages with {args.threads} tracking threads "
+              f"and {args.processes} tracking processes...", file=sys.stderr)
+        started = time.perf_counter()
+        send_async(app, campaign_id, 'sender@check.local', 'check')
+        send_seconds = time.perf_counter() - started
+
+        stop.set()
+        for thread in threads:
+            thread.join()
+        get_buffer(app).flush()
+
+        worker_stats = []
+        for worker in workers:
+            output, _ = worker.communicate()
+            lines = output.decode().strip().splitlines()
+            worker_stats.append(json.loads(lines[-1]) if lines else {'failed': True})
+
+        with app.app_context():
+            status = db.session.get(Campaign, campaign_id).status
+            by_status = dict(db.session.query(Recipient.status, db.func.count(Recipient.id)).filter_by(
+                campaign_id=campaign_id).group_by(Recipient.status).all())
+            events = db.session.query(db.func.count(TrackingEvent.id)).scalar()
+            journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+
+        total_lock_errors = lock_errors[0] + sum(w.get('lock_errors', 0) for w in worker_stats)
+        report = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'baseline': args.baseline,
+            'journal_mode': journal_mode,
+            'send_seconds': round(send_seconds, 3),
+            'campaign_status': status,
+            'recipients_by_status': by_status,
+            'thread_requests': sum(s['requests'] for s in stats),
+            'thread_requests_per_sec': round(sum(s['requests'] for s in stats) / send_seconds, 1),
+            'thread_5xx': sum(s['errors'] for s in stats),
+            'workers': worker_stats,
+            'tracking_events_stored': events,
+            'lock_errors': total_lock_errors,
+        }
+        ok = (total_lock_errors == 0 and by_status.get('Sent', 0) == args.recipients
+              and not any(w.get('failed') for w in worker_stats))
+        return report, ok
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Check that sending and tracking writes coexist on SQLite.')
+    parser.add_argument('--recipients', type=int, default=1000, help='Recipients in the campaign being sent')
+    parser.add_argument('--threads', type=int, default=4, help='In-process tracking threads')
+    parser.add_argument('--processes', type=int, default=1, help='Separate tracking app processes')
+    parser.add_argument('--flush-interval', type=float, default=0,
+                        help='TRACKING_FLUSH_INTERVAL; 0 writes every hit immediately (most contention)')
+    parser.add_argument('--worker-seconds', type=float, default=10, help='How long each tracking process runs')
+    parser.add_argument('--baseline', action='store_true', help='Rollback journal, no writer queue')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        run_worker(args)
+        return 0
+
+    report, ok = run_check(args)
+    print(json.dumps(report, indent=2, default=str))
+    if ok:
+        print("✅ No 'database is locked' errors", file=sys.stderr)
+        return 0
+    print(f"❌ {report['lock_errors']} 'database is locked' errors", file=sys.stderr)
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
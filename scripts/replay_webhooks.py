@@ -0,0 +1,177 @@
+"""
+Webhook Replay
+
+Replays recorded SendGrid event payloads (JSON arrays, like
+tests/webhook_payloads.json) against /webhooks/sendgrid.
+
+By default the app runs in-process on a throwaway SQLite database seeded
+with a sent campaign for every address in the payloads, and the script
+reports the resulting recipient statuses, stored events and suppressions.
+--burst N instead synthesizes N events from the recorded ones across
+--recipients addresses and posts them in provider-sized batches, reporting
+how fast the endpoint acknowledges them and how long the buffered writes
+take to land. --url posts the files to a running server instead.
+
+Usage:
+    python scripts/replay_webhooks.py
+    python scripts/replay_webhooks.py recorded/*.json
+    python scripts/replay_webhooks.py --burst 50000 --recipients 10000
+    python scripts/replay_webhooks.py --url http://127.0.0.1:5002/webhooks/sendgrid
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+DEFAULT_PAYLOAD = os.path.join(ROOT, 'tests', 'webhook_payloads.json')
+
+
+def load_payloads(paths):
+    batches = []
+    for path in paths:
+        with open(path) as f:
+            payload = json.load(f)
+        if not isinstance(payload, list):
+            raise SystemExit(f"❌ {path}: expected a JSON array of events")
+        batches.append(payload)
+    return batches
+
+
+def synthesize(batches, total, recipients, batch_size, seed=1):
+    """Burst batches: recorded events with their address swapped for one of `recipients` synthetic ones."""
+    rng = random.Random(seed)
+    templates = [event for batch in batches for event in batch if isinstance(event, dict) and 'email' in event]
+    emails = [f'burst{i}@example{i % 50}.com' for i in range(recipients)]
+    now = int(time.time())
+    events = []
+    for i in range(total):
+        event = dict(rng.choice(templates), email=rng.choice(emails), timestamp=now - rng.randint(0, 3600))
+        event['sg_event_id'] = f'burst-{i}'
+        events.append(event)
+    return emails, [events[start:start + batch_size] for start in range(0, total, batch_size)]
+
+
+def post_remote(url, batches):
+    import requests
+
+    for batch in batches:
+        response = requests.post(url, json=batch, timeout=30)
+        print(f"{response.status_code} {response.text.strip()}")
+        if response.status_code >= 300:
+            return 1
+    return 0
+
+
+def seed_sent_campaign(app, emails):
+    from app import db
+    from app.contacts import add_recipients
+    from app.models import Campaign, Recipient
+
+    with app.app_context():
+        campaign = Campaign(name='Webhook replay', subject='Webhook replay', body_content='<p>Hello</p>',
+                            status='Completed', sender_email='sender@replay.local')
+        db.session.add(campaign)
+        db.session.commit()
+        add_recipients(campaign.id, [{'email': email} for email in emails])
+        Recipient.query.filter_by(campaign_id=campaign.id).update(
+            {'status': 'Sent', 'sent_at': datetime.now()}, synchronize_session=False)
+        db.session.commit()
+        return campaign.id
+
+
+def replay_local(args, batches):
+    workdir = tempfile.mkdtemp(prefix='email-webhooks-')
+    try:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'replay.db')
+        os.environ['TRACKING_FLUSH_INTERVAL'] = str(args.flush_interval)
+        os.environ['TRACKING_FLUSH_SIZE'] = str(args.flush_size)
+        # Recorded payloads are not signed
+        os.environ['SENDGRID_WEBHOOK_ALLOW_UNSIGNED'] = 'true'
+
+        from app import create_app, db
+        from app.models import Recipient, Suppression, TrackingEvent
+        from app.tracking import get_buffer
+
+        app = create_app()
+        if args.burst:
+            emails, batches = synthesize(batches, args.burst, args.recipients, args.batch_size)
+        else:
+            emails = sorted({event['email'] for batch in batches for event in batch
+                             if isinstance(event, dict) and isinstance(event.get('email'), str)
+                             and not event['email'].endswith('.net')})
+        campaign_id = seed_sent_campaign(app, emails)
+
+        client = app.test_client()
+        responses = []
+        started = time.perf_counter()
+        for batch in batches:
+            response = client.post('/webhooks/sendgrid', json=batch)
+            if response.status_code != 200:
+                raise SystemExit(f"❌ {response.status_code}: {response.get_data(as_text=True)}")
+            responses.append(response.get_json())
+        ack_seconds = time.perf_counter() - started
+        get_buffer(app).flush()
+        total_seconds = time.perf_counter() - started
+
+        with app.app_context():
+            by_status = dict(db.session.query(Recipient.status, db.func.count(Recipient.id)).filter_by(
+                campaign_id=campaign_id).group_by(Recipient.status).all())
+            events = dict(db.session.query(TrackingEvent.type, db.func.count(TrackingEvent.id)).group_by(
+                TrackingEvent.type).all())
+            suppressed = dict(db.session.query(Suppression.reason, db.func.count(Suppression.id)).group_by(
+                Suppression.reason).all())
+
+        received = sum(r['received'] for r in responses)
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'batches': len(batches),
+            'received': received,
+            'accepted': sum(r['accepted'] for r in responses),
+            'ignored': sum(r['ignored'] for r in responses),
+            'invalid': sum(r['invalid'] for r in responses),
+            'ack_seconds': round(ack_seconds, 3),
+            'ack_events_per_sec': round(received / ack_seconds, 1) if ack_seconds else None,
+            'stored_seconds': round(total_seconds, 3),
+            'stored_events_per_sec': round(received / total_seconds, 1) if total_seconds else None,
+            'recipients_by_status': by_status,
+            'tracking_events': events,
+            'suppressions': suppressed,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Replay recorded SendGrid webhook payloads.')
+    parser.add_argument('payloads', nargs='*', default=[DEFAULT_PAYLOAD], help='JSON files with event arrays')
+    parser.add_argument('--url', help='Post to a running /webhooks/sendgrid instead of an in-process app')
+    parser.add_argument('--burst', type=int, default=0, help='Synthesize this many events from the payloads')
+    parser.add_argument('--recipients', type=int, default=5000, help='Distinct addresses in a burst')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Events per POST in a burst')
+    parser.add_argument('--flush-interval', type=float, default=1.0, help='TRACKING_FLUSH_INTERVAL')
+    parser.add_argument('--flush-size', type=int, default=2000, help='TRACKING_FLUSH_SIZE')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    batches = load_payloads(args.payloads)
+    if args.url:
+        return post_remote(args.url, batches)
+
+    report = replay_local(args, batches)
+    print(json.dumps(report, indent=2, default=str))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Local SMTP Sink
+
+Runs an SMTP server that accepts and discards every message, so sends can
+be measured end-to-end without touching a real provider. Point the app at
+it with MAIL_TRANSPORT=sink (SINK_HOST/SINK_PORT, default 127.0.0.1:1025).
+
+Usage:
+    python scripts/smtp_sink.py --port 1025
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.transport import SMTPSinkServer, DEFAULT_SINK_HOST, DEFAULT_SINK_PORT
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a local SMTP sink for load testing.')
+    parser.add_argument('--host', default=DEFAULT_SINK_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_SINK_PORT)
+    parser.add_argument('--stats-interval', type=float, default=5.0)
+    parser.add_argument('--throttle-ratio', type=float, default=0.0,
+                        help='Share of recipients answered with 451 to simulate provider throttling')
+    parser.add_argument('--reject-ratio', type=float, default=0.0,
+                        help='Share of recipients answered with 550 to simulate unknown users')
+    args = parser.parse_args(argv)
+
+    sink = SMTPSinkServer(args.host, args.port, throttle_ratio=args.throttle_ratio,
+                         reject_ratio=args.reject_ratio).start()
+    print(f"📭 SMTP sink listening on {args.host}:{sink.port}")
+
+    last_count = 0
+    last_time = time.monotonic()
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            now = time.monotonic()
+            count = sink.message_count
+            rate = (count - last_count) / (now - last_time)
+            print(f"📊 messages={count} recipients={sink.recipient_count} bytes={sink.byte_count} throttled={sink.throttled_count} rejected={sink.rejected_count} rate={rate:.1f} msg/s")
+            last_count, last_time = count, now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
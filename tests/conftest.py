@@ -0,0 +1,53 @@
+"""
+Shared fixtures: an app on a throwaway SQLite database.
+
+Run from the repository root with `python -m pytest tests`.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """
+    Build an app with a fresh database; keyword arguments are set as
+    environment variables before create_app() reads them.
+    """
+    from app import create_app, db
+
+    created = []
+
+    def make(**env):
+        settings = {
+            'DATABASE_URL': f"sqlite:///{tmp_path / 'test.db'}",
+            'MAIL_TRANSPORT': 'memory',
+            'AUTO_MIGRATE': 'false',
+            'TRACKING_FLUSH_INTERVAL': '0',
+            'SEND_RATE_INITIAL': '0',
+            'ARCHIVE_DIR': str(tmp_path / 'archive'),
+        }
+        settings.update(env)
+        for name, value in settings.items():
+            monkeypatch.setenv(name, str(value))
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+        created.append(app)
+        return app
+
+    yield make
+
+    for app in created:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
@@ -0,0 +1,69 @@
+"""Birthday dispatch claims: crashed or failed sends are not stuck in 'Sending'."""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import birthday_scheduler, db
+from app.birthday_scheduler import dispatch_birthdays
+from app.models import BirthdaySchedule, Campaign, Contact, Recipient
+
+
+@pytest.fixture
+def birthday_app(make_app, monkeypatch):
+    monkeypatch.setenv('BIRTHDAY_SENDER_EMAIL', 'birthdays@example.com')
+    monkeypatch.setenv('BIRTHDAY_SENDER_PASSWORD', 'secret')
+    return make_app()
+
+
+def _schedule(app, rows):
+    """Add one contact per (status, claimed minutes ago) pair with a due birthday row."""
+    now = datetime.now()
+    with app.app_context():
+        campaign = Campaign(name='Birthdays', subject='Hi', body_content='<p>Hi</p>', status='Completed')
+        db.session.add(campaign)
+        db.session.flush()
+        for i, (status, claimed_minutes_ago) in enumerate(rows):
+            contact = Contact(email=f'person{i}@example.com', name=f'Person {i}', dob=date(1990, 1, 1))
+            db.session.add(contact)
+            db.session.flush()
+            db.session.add(Recipient(campaign_id=campaign.id, contact_id=contact.id))
+            claimed_at = now - timedelta(minutes=claimed_minutes_ago) if claimed_minutes_ago is not None else None
+            db.session.add(BirthdaySchedule(contact_id=contact.id, day=now.date(), send_at=now - timedelta(minutes=5),
+                                            status=status, claimed_at=claimed_at))
+        db.session.commit()
+
+
+def _statuses(app):
+    with app.app_context():
+        return [row.status for row in BirthdaySchedule.query.order_by(BirthdaySchedule.contact_id)]
+
+
+def test_stale_claims_are_taken_back_and_sent(birthday_app):
+    # A crash 30 minutes into a claim, a claim from before claimed_at existed, and one in progress
+    _schedule(birthday_app, [('Sending', 30), ('Sending', None), ('Sending', 2), ('Pending', None)])
+
+    with birthday_app.app_context():
+        counts = dispatch_birthdays(claim_timeout_minutes=15)
+
+    assert counts == {'Sent': 3}
+    assert _statuses(birthday_app) == ['Sent', 'Sent', 'Sending', 'Sent']
+
+
+def test_error_during_send_releases_the_claim(birthday_app, monkeypatch):
+    _schedule(birthday_app, [('Pending', None)])
+
+    def explode(*args):
+        raise RuntimeError('template missing')
+
+    send = birthday_scheduler.send_birthday_email
+    monkeypatch.setattr(birthday_scheduler, 'send_birthday_email', explode)
+    with birthday_app.app_context():
+        with pytest.raises(RuntimeError):
+            dispatch_birthdays()
+        row = BirthdaySchedule.query.one()
+        assert (row.status, row.claimed_at) == ('Pending', None)
+
+    monkeypatch.setattr(birthday_scheduler, 'send_birthday_email', send)
+    with birthday_app.app_context():
+        assert dispatch_birthdays() == {'Sent': 1}
@@ -0,0 +1,44 @@
+"""The SQLite writer queue covers the COMMIT itself, not just the statements before it."""
+
+from sqlalchemy import event
+
+from app import db
+from app.models import Contact
+
+
+def test_writer_lock_is_held_through_commit(app):
+    with app.app_context():
+        queue = app.extensions['sqlite_writer_queue']
+        during_commit = []
+        # The engine's commit event fires just before the DBAPI COMMIT
+        event.listen(db.engine, 'commit', lambda conn: during_commit.append(queue.lock._is_owned()))
+
+        db.session.add(Contact(email='first@example.com'))
+        db.session.commit()
+        assert during_commit == [True]
+        assert not queue.lock._is_owned()
+
+        Contact.query.update({'name': 'Renamed'})
+        assert queue.lock._is_owned()
+        db.session.rollback()
+        assert not queue.lock._is_owned()
+
+        with db.engine.begin() as conn:
+            conn.execute(db.text("UPDATE contact SET name = 'Core'"))
+        assert during_commit == [True, True]
+        assert not queue.lock._is_owned()
+
+
+def test_reads_do_not_take_the_writer_lock(app):
+    with app.app_context():
+        queue = app.extensions['sqlite_writer_queue']
+        db.session.add(Contact(email='reader@example.com'))
+        db.session.commit()
+
+        with db.session.no_autoflush:
+            contact = Contact.query.first()
+            contact.name = 'Pending write'
+            Contact.query.count()
+            assert not queue.lock._is_owned()
+        db.session.commit()
+        assert not queue.lock._is_owned()
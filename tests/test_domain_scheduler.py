@@ -0,0 +1,96 @@
+"""Domain batches: streaming from the pending keyset and per-recipient handling of refused RCPTs."""
+
+from collections import Counter
+
+import pytest
+
+from app import db, sender
+from app.domain_scheduler import send_by_domain
+from app.models import Campaign, Contact, Recipient, Suppression
+from app.transport import SMTPSinkServer
+
+RECIPIENTS = 12
+
+
+@pytest.fixture
+def sink():
+    server = SMTPSinkServer(port=0).start()
+    yield server
+    server.stop()
+
+
+def _campaign(app, recipients=RECIPIENTS):
+    """A campaign whose body is the same for every recipient, so domains share one transaction."""
+    with app.app_context():
+        campaign = Campaign(name='Refusals', subject='Hello', body_content='<p>Hi</p>', status='Sending',
+                            batch_size=0, batch_delay=0)
+        db.session.add(campaign)
+        db.session.flush()
+        contacts = [Contact(email=f'user{i}@example{i % 3}.com') for i in range(recipients)]
+        db.session.add_all(contacts)
+        db.session.flush()
+        db.session.add_all([Recipient(campaign_id=campaign.id, contact_id=contact.id) for contact in contacts])
+        db.session.commit()
+        return campaign.id
+
+
+def _send(make_app, sink, recipients=RECIPIENTS, **env):
+    app = make_app(MAIL_TRANSPORT='sink', SINK_PORT=sink.port, TRACK_OPENS='false', DOMAIN_BATCH_SIZE=5,
+                   SEND_BACKOFF_BASE=0.01, **env)
+    campaign_id = _campaign(app, recipients)
+    with app.app_context():
+        send_by_domain(app, campaign_id, 'sender@example.com', 'secret')
+        statuses = Counter(status for (status,) in db.session.query(Recipient.status))
+        suppressed = Suppression.query.count()
+        campaign_status = db.session.get(Campaign, campaign_id).status
+    return statuses, suppressed, campaign_status
+
+
+def test_pending_recipients_are_read_in_chunks_while_sending(make_app, sink, monkeypatch):
+    reads = []  # messages the sink had accepted when each chunk was read
+    iter_pending = sender.iter_pending_recipients
+
+    def spy(campaign_id, chunk_size):
+        for chunk in iter_pending(campaign_id, chunk_size):
+            reads.append((len(chunk), sink.recipient_count))
+            yield chunk
+
+    monkeypatch.setattr(sender, 'iter_pending_recipients', spy)
+    statuses, _, campaign_status = _send(make_app, sink, recipients=100, SEND_CHUNK_SIZE=10)
+
+    assert statuses == {'Sent': 100}
+    assert campaign_status == 'Completed'
+    assert all(size <= 10 for size, _ in reads)
+    assert sum(size for size, _ in reads) == 100
+    # Later chunks are only read once earlier recipients went out
+    assert reads[-1][1] >= 70
+
+
+def test_4xx_refusals_are_retried_until_accepted(make_app, sink):
+    sink.throttle_ratio = 0.5
+    statuses, suppressed, campaign_status = _send(make_app, sink, SEND_MAX_RETRIES=30)
+
+    assert sink.throttled_count > 0
+    assert statuses == {'Sent': RECIPIENTS}
+    assert sink.recipient_count == RECIPIENTS
+    assert suppressed == 0
+    assert campaign_status == 'Completed'
+
+
+def test_4xx_refusals_fail_without_bouncing_once_retries_run_out(make_app, sink):
+    sink.throttle_ratio = 1.0
+    statuses, suppressed, _ = _send(make_app, sink, SEND_MAX_RETRIES=2)
+
+    # Every RCPT refused (SMTPRecipientsRefused): first try plus two retries each
+    assert sink.throttled_count == RECIPIENTS * 3
+    assert statuses == {'Failed': RECIPIENTS}
+    assert suppressed == 0
+
+
+def test_5xx_refusals_bounce_without_retrying(make_app, sink):
+    sink.reject_ratio = 1.0
+    statuses, suppressed, _ = _send(make_app, sink, SEND_MAX_RETRIES=5)
+
+    assert sink.rejected_count == RECIPIENTS
+    assert statuses == {'Bounced': RECIPIENTS}
+    assert suppressed == RECIPIENTS
@@ -0,0 +1,32 @@
+"""Precomputed messages decode to the same headers as email.message builds."""
+
+from email import message_from_bytes, message_from_string, policy
+
+import pytest
+
+from app.mime_template import MessageTemplate
+from app.sender import build_html_message
+
+LONG_SUBJECTS = [
+    'Привет всем участникам нашего большого ежегодного праздника дня рождения компании и друзей',
+    'Grüße aus München – unser großer Jahresrückblick für alle Kundinnen und Kunden überall',
+    '日本語のとても長い件名です 日本語のとても長い件名です 日本語のとても長い件名です',
+    'A plain ASCII subject that is long enough to be folded over more than one header line',
+]
+
+
+@pytest.mark.parametrize('subject', LONG_SUBJECTS)
+def test_long_subject_roundtrip(subject):
+    data = MessageTemplate('Jürgen Müller <sender@example.com>', subject, '<p>Hi</p>').render('to@example.com')
+    message = message_from_bytes(data, policy=policy.default)
+    reference = message_from_string(
+        build_html_message('Jürgen Müller <sender@example.com>', 'to@example.com', subject, '<p>Hi</p>').as_string(),
+        policy=policy.default)
+
+    assert message['Subject'] == subject
+    assert message['Subject'] == reference['Subject']
+    assert message['From'].addresses[0].addr_spec == 'sender@example.com'
+    assert message['From'].addresses[0].display_name == 'Jürgen Müller'
+    head = data.split(b'\r\n\r\n')[0].decode('ascii')
+    folded_subject = head.split('Subject: ', 1)[1].split('\r\nFrom: ')[0]
+    assert all(len(line) <= 78 for line in ('Subject: ' + folded_subject).split('\r\n'))
@@ -0,0 +1,53 @@
+"""Batch pauses in the serial send loop."""
+
+from collections import Counter
+
+import pytest
+
+from app import db
+from app.models import Campaign, Contact, Recipient
+from app.sender import send_async
+
+RECIPIENTS = 5
+
+
+def _campaign(app, batch_size, batch_delay):
+    with app.app_context():
+        campaign = Campaign(name='Batches', subject='Hello', body_content='<p>Hi</p>', status='Sending')
+        db.session.add(campaign)
+        db.session.flush()
+        contacts = [Contact(email=f'user{i}@example.com') for i in range(RECIPIENTS)]
+        db.session.add_all(contacts)
+        db.session.flush()
+        db.session.add_all([Recipient(campaign_id=campaign.id, contact_id=contact.id) for contact in contacts])
+        db.session.commit()
+        # The column defaults fill in 50 / 5 on insert; older rows may hold 0 or NULL
+        campaign.batch_size = batch_size
+        campaign.batch_delay = batch_delay
+        db.session.commit()
+        return campaign.id
+
+
+@pytest.mark.parametrize('batch_size, batch_delay', [(0, 5), (None, None)])
+def test_batch_size_zero_or_none_never_pauses(app, monkeypatch, batch_size, batch_delay):
+    sleeps = []
+    monkeypatch.setattr('app.sender.time.sleep', sleeps.append)
+    campaign_id = _campaign(app, batch_size, batch_delay)
+
+    with app.app_context():
+        send_async(app, campaign_id, 'sender@example.com', 'secret')
+        statuses = Counter(status for (status,) in db.session.query(Recipient.status))
+        assert statuses == {'Sent': RECIPIENTS}
+        assert db.session.get(Campaign, campaign_id).status == 'Completed'
+    assert sleeps == []
+
+
+def test_batch_pause_between_batches_only(app, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('app.sender.time.sleep', sleeps.append)
+    campaign_id = _campaign(app, 2, 1)
+
+    with app.app_context():
+        send_async(app, campaign_id, 'sender@example.com', 'secret')
+        assert Recipient.query.filter_by(status='Sent').count() == RECIPIENTS
+    assert sleeps == [60, 60]
@@ -0,0 +1,46 @@
+"""Tracking retention only deletes events once an operator sets a window."""
+
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import Campaign, Contact, Recipient, TrackingEvent, TrackingRollup
+from app.tracking_storage import run_maintenance
+
+
+def _old_events(app, count=5, days=800):
+    with app.app_context():
+        campaign = Campaign(name='Old', subject='Hello', body_content='<p>Hi</p>', status='Completed')
+        contact = Contact(email='old@example.com')
+        db.session.add_all([campaign, contact])
+        db.session.flush()
+        recipient = Recipient(campaign_id=campaign.id, contact_id=contact.id, status='Sent')
+        db.session.add(recipient)
+        db.session.flush()
+        timestamp = datetime.now() - timedelta(days=days)
+        db.session.add_all([TrackingEvent(recipient_id=recipient.id, type='open', timestamp=timestamp)
+                            for _ in range(count)])
+        db.session.commit()
+
+
+def test_default_config_keeps_every_event(make_app, monkeypatch):
+    monkeypatch.delenv('TRACKING_RETENTION_DAYS', raising=False)
+    app = make_app()
+    assert app.config['TRACKING_RETENTION_DAYS'] == 0
+    _old_events(app)
+
+    run_maintenance(app)
+
+    with app.app_context():
+        assert TrackingEvent.query.count() == 5
+        assert TrackingRollup.query.count() == 0
+
+
+def test_configured_window_rolls_up_old_events(make_app):
+    app = make_app(TRACKING_RETENTION_DAYS=365)
+    _old_events(app)
+
+    run_maintenance(app)
+
+    with app.app_context():
+        assert TrackingEvent.query.count() == 0
+        assert sum(rollup.count for rollup in TrackingRollup.query) == 5
@@ -0,0 +1,57 @@
+"""Signed SendGrid webhook posts: signature and timestamp checks."""
+
+import base64
+import json
+import time
+
+import pytest
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from app.webhooks import SIGNATURE_HEADER, TIMESTAMP_HEADER
+
+PAYLOAD = json.dumps([{'event': 'delivered', 'email': 'user@example.com', 'timestamp': 1700000000}])
+
+
+@pytest.fixture
+def signing_key():
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+@pytest.fixture
+def client(make_app, signing_key):
+    public_key = signing_key.public_key().public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+    app = make_app(SENDGRID_WEBHOOK_PUBLIC_KEY=base64.b64encode(public_key).decode('ascii'))
+    return app.test_client()
+
+
+def _post(client, signing_key, timestamp, body=PAYLOAD):
+    signature = signing_key.sign((str(timestamp) + body).encode('utf-8'), ec.ECDSA(hashes.SHA256()))
+    return client.post('/webhooks/sendgrid', data=body, content_type='application/json', headers={
+        SIGNATURE_HEADER: base64.b64encode(signature).decode('ascii'),
+        TIMESTAMP_HEADER: str(timestamp),
+    })
+
+
+def test_fresh_signed_post_is_accepted(client, signing_key):
+    response = _post(client, signing_key, int(time.time()))
+    assert response.status_code == 200
+    assert response.get_json()['accepted'] == 1
+
+
+@pytest.mark.parametrize('offset', [-301, -86400, 301])
+def test_signed_post_outside_the_window_is_rejected(client, signing_key, offset):
+    response = _post(client, signing_key, int(time.time()) + offset)
+    assert response.status_code == 403
+    assert response.get_json()['error'] == 'stale timestamp'
+
+
+def test_tampered_body_is_rejected(client, signing_key):
+    timestamp = int(time.time())
+    signature = _post(client, signing_key, timestamp).request.headers[SIGNATURE_HEADER]
+    response = client.post('/webhooks/sendgrid', data=PAYLOAD.replace('delivered', 'unsubscribe'),
+                           content_type='application/json',
+                           headers={SIGNATURE_HEADER: signature, TIMESTAMP_HEADER: str(timestamp)})
+    assert response.status_code == 403
+    assert response.get_json()['error'] == 'invalid signature'
@@ -0,0 +1,60 @@
+"""The streaming XLSX reader returns what pandas.read_excel does."""
+
+import io
+from datetime import date, datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+from openpyxl.styles import Font
+
+from app.xlsx_reader import read_columns
+
+
+def _workbook():
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    # Blank and repeated headers, plus data in two columns with no header at all
+    sheet.append(['Email', 'Name', None, 'DOB', 'Score', 'Name'])
+    for i in range(40):
+        sheet.append([
+            f'user{i}@example.com',
+            ['Ann', 'Bob', None, 'Zoë'][i % 4],   # shared strings and blank cells
+            'x' if i % 5 == 0 else None,
+            [datetime(1990, 5, 17), date(1985, 12, 31), datetime(2001, 1, 2, 13, 30), None][i % 4],
+            [3, 2.5, 'n/a', None, 'NA', True][i % 6],
+            'Second' if i % 2 else '',
+            'stray' if i == 7 else None,
+            None,
+            'far' if i == 30 else None,
+        ])
+    # A skipped row in the middle, then a styled but empty cell that pandas trims as a trailing row
+    sheet.cell(row=45, column=1, value='late@example.com')
+    sheet.cell(row=60, column=2).font = Font(bold=True)
+    stream = io.BytesIO()
+    workbook.save(stream)
+    return stream
+
+
+def _normalise(value):
+    if value is None or value != value:  # None, NaN, NaT
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+@pytest.mark.parametrize('workers, block_bytes', [(1, 8 * 1024 * 1024), (1, 400), (2, 400)])
+def test_matches_pandas_read_excel(workers, block_bytes):
+    stream = _workbook()
+    expected = pd.read_excel(stream)
+    stream.seek(0)
+
+    header, data = read_columns(stream, lambda columns: list(columns), workers=workers, block_bytes=block_bytes)
+
+    assert header == list(expected.columns)
+    assert header == ['Email', 'Name', 'Unnamed: 2', 'DOB', 'Score', 'Name.1', 'Unnamed: 6', 'Unnamed: 7', 'Unnamed: 8']
+    for name, values in data.items():
+        assert values == [_normalise(value) for value in expected[name].tolist()], name
+    assert data['Email'][-1] == 'late@example.com'
+    assert data['Email'][-2] is None
@@ -0,0 +1,8 @@
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+from app.tracking_app import create_tracking_app
+
+app = create_tracking_app()